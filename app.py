@@ -15,19 +15,31 @@ if 'db_initialized' not in st.session_state:
     init_db()
     st.session_state.db_initialized = True
 
+# Metrics exporter (no-op unless SUPERPOLL_METRICS_PORT is set or serve.py already started it)
+from core import metrics_server
+metrics_server.ensure_started()
+
 # Router Logic
 params = st.query_params
 poll_id = params.get("poll")
 
 # Main Routing
-if poll_id:
-    # --- VOTER MODE ---
-    from views.voter_ui import render_voter_app
-    try:
-        render_voter_app(int(poll_id))
-    except ValueError:
-        st.error("Invalid Poll ID")
-else:
-    # --- ADMIN MODE ---
-    from views.admin_ui import render_admin_page
-    render_admin_page()
+from views import render_profiler
+render_profiler.begin("voter" if poll_id else "admin")
+completed = False
+try:
+    if poll_id:
+        # --- VOTER MODE ---
+        from views.voter_ui import render_voter_app
+        try:
+            render_voter_app(int(poll_id))
+        except ValueError:
+            st.error("Invalid Poll ID")
+    else:
+        # --- ADMIN MODE ---
+        from views.admin_ui import render_admin_page
+        render_admin_page()
+    completed = True
+finally:
+    # st.rerun()/st.stop() abort via BaseException: record the run, skip drawing
+    render_profiler.finish(render=completed)
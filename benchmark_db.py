@@ -0,0 +1,278 @@
+"""
+Micro-benchmarks for every public core/database.py function (but the
+connection helpers get_connection, write_ballots and sweep_orphans, which
+the others exercise).
+
+Builds synthetic campaigns at several sizes (default 1k/10k/100k responses,
+add 1m with --sizes), times each database function against them and writes
+the numbers to JSON so runs can be compared.
+
+Everything runs offline against throwaway SQLite files in bench_data/.
+
+Usage:
+    python benchmark_db.py                                  # 1k, 10k, 100k
+    python benchmark_db.py --sizes 1k,10k,100k,1m --out bench.json
+    python benchmark_db.py --compare bench_baseline.json    # exit 1 on regression
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import generate_dataset
+from core import database
+
+BENCH_DIR = "bench_data"
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+
+# --- Synthetic data ---
+def use_db(path):
+    database.DB_DIR = os.path.dirname(path) or '.'
+    database.DB_PATH = path
+
+
+def build_campaign(path, n_responses, seed=42):
+    """Create a DB at path holding one synthetic campaign with n_responses ballots"""
+    if os.path.exists(path):
+        os.remove(path)
+    use_db(path)
+    database.init_db()
+    campaign_id = generate_dataset.create_sample_campaign(generate_dataset.DEFAULT_CONFIG)
+    generate_dataset.generate(campaign_id, n_responses, seed=seed, progress=False)
+    return campaign_id
+
+
+def prepare(size_label, rebuild=False):
+    """Return (path, campaign_id) for a cached dataset, building it if needed"""
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    path = os.path.join(BENCH_DIR, f"bench_{size_label}.db")
+    if not rebuild and os.path.exists(path):
+        use_db(path)
+        database.init_db()
+        campaigns = database.get_all_campaigns()
+        if campaigns:
+            return path, campaigns[0]['id']
+    start = time.perf_counter()
+    campaign_id = build_campaign(path, SIZES[size_label])
+    print(f"   🏗️  built {size_label} in {time.perf_counter() - start:.1f}s")
+    return path, campaign_id
+
+
+# --- Timing ---
+def time_call(fn, repeat, budget_s):
+    """Run fn up to `repeat` times (fewer if one call exceeds budget_s)"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+        if timings[-1] > budget_s:
+            break
+    return {
+        "runs": len(timings),
+        "min_ms": round(min(timings) * 1000, 3),
+        "median_ms": round(statistics.median(timings) * 1000, 3),
+        "mean_ms": round(statistics.mean(timings) * 1000, 3),
+    }
+
+
+def read_benchmarks(campaign_id, question_id, option_ids):
+    return {
+        "get_all_campaigns": lambda: database.get_all_campaigns(),
+        "get_campaign_summaries": lambda: database.get_campaign_summaries(),
+        "get_campaign": lambda: database.get_campaign(campaign_id),
+        "get_questions": lambda: database.get_questions(campaign_id),
+        "get_response_count": lambda: database.get_response_count(campaign_id),
+        "get_data_stamp": lambda: database.get_data_stamp(campaign_id),
+        "get_option_tallies": lambda: database.get_option_tallies(campaign_id),
+        "get_results": lambda: database.get_results(campaign_id),
+        "get_vote_statistics": lambda: database.get_vote_statistics(campaign_id),
+        "get_demographic_breakdown": lambda: database.get_demographic_breakdown(campaign_id, "อำเภอ"),
+        "get_voter_logs": lambda: database.get_voter_logs(campaign_id),
+        "get_submission_clusters": lambda: database.get_submission_clusters(campaign_id),
+        "export_responses_data": lambda: database.export_responses_data(campaign_id),
+        # A field device's sync checks a batch worth of keys (mostly unknown)
+        "get_stored_keys": lambda: database.get_stored_keys(campaign_id, [f"bench-key-{i}" for i in range(100)]),
+        "get_archive_info": lambda: database.get_archive_info(campaign_id),
+        "get_archives": lambda: database.get_archives(),
+        "get_pending_deletes": lambda: database.get_pending_deletes(),
+    }
+
+
+def write_benchmarks(campaign_id, question_id, option_ids):
+    counter = {"n": 0}
+
+    def submit():
+        counter["n"] += 1
+        database.submit_response(campaign_id, {"อำเภอ": "กะปง"}, {question_id: [option_ids[0]]},
+                                 ip_address=f"172.16.0.{counter['n'] % 250}", user_agent="bench",
+                                 device_token=f"bench-{counter['n']}")
+
+    def batch():
+        counter["n"] += 1
+        items = [{"key": f"bench-batch-{counter['n']}-{i}", "demographic_data": {"อำเภอ": "กะปง"},
+                  "answers": {question_id: [option_ids[i % len(option_ids)]]}, "collected_at": None}
+                 for i in range(20)]
+        database.submit_batch(campaign_id, items, ip_address=f"172.17.{counter['n'] // 250 % 250}.{counter['n'] % 250}",
+                              user_agent="bench", device_token=f"bench-device-{counter['n']}")
+
+    def question_order():
+        ids = [q['id'] for q in database.get_questions(campaign_id)]
+        database.set_question_order(campaign_id, ids[::-1])
+        database.set_question_order(campaign_id, ids)
+
+    def question_move():
+        database.reorder_question(question_id, 'down')
+        database.reorder_question(question_id, 'up')
+
+    def question_cycle():
+        database.create_question(campaign_id, "bench tmp", 'single', 1, ["a", "b"])
+        q = database.get_questions(campaign_id)[-1]
+        database.update_question(q['id'], "bench tmp 2", 'single', 1, ["a", "b", "c"])
+        database.delete_question(q['id'])
+
+    def campaign_cycle():
+        new_id = database.create_campaign("bench tmp", "")
+        database.update_campaign(new_id, "bench tmp 2", "")
+        database.toggle_campaign_status(new_id)
+        database.delete_campaign(new_id)
+
+    return {
+        "submit_response": submit,
+        "submit_batch_20": batch,
+        "set_question_order_twice": question_order,
+        "reorder_question_down_up": question_move,
+        "create_update_delete_question": question_cycle,
+        "create_update_toggle_delete_campaign": campaign_cycle,
+    }
+
+
+def run_size(size_label, args):
+    print(f"\n📦 {size_label} ({SIZES[size_label]:,} responses)")
+    path, campaign_id = prepare(size_label, args.rebuild)
+
+    # Work on a copy so write benchmarks never drift the cached dataset
+    work = os.path.join(BENCH_DIR, f"work_{size_label}.db")
+    shutil.copyfile(path, work)
+    use_db(work)
+
+    questions = database.get_questions(campaign_id)
+    q = questions[0]
+    option_ids = [o['id'] for o in q['options']]
+
+    results = {}
+    for name, fn in read_benchmarks(campaign_id, q['id'], option_ids).items():
+        results[name] = time_call(fn, args.repeat, args.budget)
+        print(f"   {name:<40} {results[name]['median_ms']:>12.3f} ms")
+    for name, fn in write_benchmarks(campaign_id, q['id'], option_ids).items():
+        results[name] = time_call(fn, args.repeat, args.budget)
+        print(f"   {name:<40} {results[name]['median_ms']:>12.3f} ms")
+
+    # Destructive, single shot: reset, then VACUUM the pages it freed
+    for name, fn in (("reset_responses", lambda: database.reset_responses(campaign_id)),
+                     ("vacuum", database.vacuum)):
+        results[name] = time_call(fn, 1, args.budget)
+        print(f"   {name:<40} {results[name]['median_ms']:>12.3f} ms")
+    os.remove(work)
+
+    # The background delete path on a fresh copy: delete_campaign purges one chunk,
+    # purge_deletes (core.cascade) the rest
+    work = os.path.join(BENCH_DIR, f"work_purge_{size_label}.db")
+    shutil.copyfile(path, work)
+    use_db(work)
+    database.delete_campaign(campaign_id)
+    results["purge_deletes"] = time_call(database.purge_deletes, 1, args.budget)
+    print(f"   {'purge_deletes':<40} {results['purge_deletes']['median_ms']:>12.3f} ms")
+    os.remove(work)
+    return results
+
+
+# --- Comparison ---
+def compare(current, baseline, threshold, min_delta_ms):
+    """Print per-function ratios; return list of regressions"""
+    regressions = []
+    print(f"\n🔍 Compare vs baseline ({baseline['meta'].get('timestamp')}), threshold x{threshold}")
+    for size, funcs in current["results"].items():
+        base_funcs = baseline["results"].get(size, {})
+        for name, stats in funcs.items():
+            base = base_funcs.get(name)
+            if not base or not base["median_ms"]:
+                continue
+            ratio = stats["median_ms"] / base["median_ms"]
+            # Sub-millisecond jitter is not a regression
+            slower = ratio > threshold and stats["median_ms"] - base["median_ms"] > min_delta_ms
+            mark = "🔴" if slower else "🟢" if ratio < 1 / threshold else "  "
+            print(f"   {mark} {size:>4} {name:<40} {base['median_ms']:>10.3f} → {stats['median_ms']:>10.3f} ms  x{ratio:.2f}")
+            if slower:
+                regressions.append((size, name, ratio))
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark core/database.py functions")
+    parser.add_argument("--sizes", default="1k,10k,100k", help="Comma list from: " + ",".join(SIZES))
+    parser.add_argument("--repeat", type=int, default=5, help="Calls per function")
+    parser.add_argument("--budget", type=float, default=2.0, help="Stop repeating once a call exceeds this many seconds")
+    parser.add_argument("--rebuild", action="store_true", help="Regenerate cached datasets")
+    parser.add_argument("--out", default=None, help="Results JSON path (default bench_data/results_<time>.json)")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Slowdown ratio that counts as regression")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="Ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    sizes = [s.strip().lower() for s in args.sizes.split(',') if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"unknown sizes: {unknown}")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec='seconds'),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": {},
+    }
+    for size in sizes:
+        report["results"][size] = run_size(size, args)
+
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    out = args.out or os.path.join(BENCH_DIR, f"results_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 Saved results to {out}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s)")
+            sys.exit(1)
+        print("\n✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
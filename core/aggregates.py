@@ -0,0 +1,111 @@
+"""
+Cached dashboard aggregates.
+
+The admin dashboard recomputes vote statistics, demographic breakdowns
+and voter logs on every rerun, although they only change when a ballot
+arrives or the questions are edited. `get` keeps each aggregate per
+(campaign, function, args) together with the data stamp it was computed
+at (database.get_data_stamp: ballot_version, response count, last
+response id) and recomputes only when the part of the stamp it depends
+on moves. Aggregates of the responses alone (demographic breakdowns,
+voter logs, clusters) go through `get` and are keyed on (count, last id),
+so a question edit keeps them; only `vote_statistics` also keys on the
+ballot_version.
+
+    stamp = aggregates.data_stamp(campaign_id)       # one indexed query
+    areas = aggregates.get(stamp, database.get_demographic_breakdown, "อำเภอ")
+    stats = aggregates.vote_statistics(stamp)
+
+Vote counts are kept apart from the ballot: `tallies` holds the answers
+per option id and only looks at responses, reading just the ones that
+arrived after its cached last id (a reset or purge recounts). Option ids
+survive update_question, so `vote_statistics` after a ballot edit
+relabels the cached tallies instead of recounting.
+
+Sections of the dashboard that are not on screen never call `get`, so
+their aggregates are computed on demand, the first time they are shown.
+For archived campaigns (core.archive) `get` serves the final aggregates
+stored at archive time, or None for ones that need the raw rows.
+"""
+
+import threading
+from collections import namedtuple
+
+from core import archive, database, metrics
+
+Stamp = namedtuple("Stamp", "campaign_id ballot_version count last_id archived")
+
+_lock = threading.Lock()
+_results = {}  # (campaign_id, function name, args) -> (stamp version, result)
+_tallies = {}  # campaign_id -> (responses counted, last id counted, tallies)
+
+
+def data_stamp(campaign_id):
+    """Current Stamp of a campaign's results"""
+    return Stamp(campaign_id, *database.get_data_stamp(campaign_id))
+
+
+def _cached(stamp, name, args, compute, ballot=False):
+    key = (stamp.campaign_id, name, args)
+    version = (stamp.count, stamp.last_id, stamp.archived, stamp.ballot_version if ballot else None)
+    with _lock:
+        cached = _results.get(key)
+    if cached and cached[0] == version:
+        metrics.inc("superpoll_cache_requests_total", cache="aggregates", result="hit")
+        return cached[1]
+    metrics.inc("superpoll_cache_requests_total", cache="aggregates", result="miss")
+    if stamp.archived:
+        result = archive.aggregate(stamp.campaign_id, name, args)
+    else:
+        result = compute()
+    with _lock:
+        _results[key] = (version, result)
+    return result
+
+
+def get(stamp, fn, *args):
+    """fn(campaign_id, *args) of the responses only, reused until a response arrives or goes"""
+    return _cached(stamp, fn.__name__, args, lambda: fn(stamp.campaign_id, *args))
+
+
+def tallies(stamp):
+    """{question_id: {option_id: answers}} of the responses up to stamp.last_id"""
+    campaign_id = stamp.campaign_id
+    with _lock:
+        cached = _tallies.get(campaign_id)
+    if cached and cached[:2] == (stamp.count, stamp.last_id):
+        metrics.inc("superpoll_cache_requests_total", cache="tallies", result="hit")
+        return cached[2]
+
+    counted = None
+    if cached and stamp.last_id > cached[1]:
+        new, responses = database.get_option_tallies(campaign_id, after_id=cached[1], upto_id=stamp.last_id)
+        # Only valid if nothing below the cached last id was deleted meanwhile
+        if cached[0] + responses == stamp.count:
+            merged = {q_id: dict(counts) for q_id, counts in cached[2].items()}
+            for q_id, counts in new.items():
+                bucket = merged.setdefault(q_id, {})
+                for opt_id, count in counts.items():
+                    bucket[opt_id] = bucket.get(opt_id, 0) + count
+            counted = (stamp.count, merged)
+            metrics.inc("superpoll_cache_requests_total", cache="tallies", result="incremental")
+    if counted is None:
+        result, responses = database.get_option_tallies(campaign_id, upto_id=stamp.last_id)
+        counted = (responses, result)
+        metrics.inc("superpoll_cache_requests_total", cache="tallies", result="miss")
+
+    with _lock:
+        _tallies[campaign_id] = (counted[0], stamp.last_id, counted[1])
+    return counted[1]
+
+
+def vote_statistics(stamp):
+    """get_vote_statistics on tallies(stamp): a ballot edit relabels, it does not recount"""
+    return _cached(stamp, "get_vote_statistics", (),
+                   lambda: database.get_vote_statistics(stamp.campaign_id, tallies(stamp)), ballot=True)
+
+
+def clear():
+    with _lock:
+        _results.clear()
+        _tallies.clear()
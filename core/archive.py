@@ -0,0 +1,224 @@
+"""
+Cold storage for closed campaigns.
+
+Raw responses and response_details of a finished campaign only weigh on
+the live tables and their indexes. `archive_campaign` moves them into a
+gzip-compressed per-campaign SQLite file (ARCHIVE_DIR/campaign-<id>.db.gz)
+and keeps the final aggregates in the live DB (campaign_archives.summary),
+so the dashboard still shows results, counts and quota gauges.
+`restore_campaign` puts the rows back (same ids) when someone needs the
+voter logs or a CSV again.
+
+    python -m core.archive archive 3 [--vacuum]
+    python -m core.archive restore 3
+    python -m core.archive list
+
+Archiving reads a snapshot without holding the write lock, then, in one
+short BEGIN IMMEDIATE transaction, checks that nothing arrived in between
+(otherwise ArchiveError: retry) and marks the campaign archived. From then
+on the dashboard reads the stored summary, and the copied live rows are
+deleted in chunks by database.reset_responses, so voters of other
+campaigns never wait out one long delete. Only closed campaigns can be
+archived; their questions cannot be edited until they are restored (the
+summary is labelled with them). A restore after a chunked delete cut
+short skips the rows still live.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import shutil
+from datetime import datetime
+
+from core import database, fraud
+
+ARCHIVE_DIR = os.path.join(database.DB_DIR, 'archive')
+
+# Aggregates the dashboard reads, kept per archived campaign (see aggregate())
+BREAKDOWN_FIELDS = ("อำเภอ", "พื้นที่", "Gen", "เพศ")
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def archive_path(campaign_id):
+    return os.path.join(ARCHIVE_DIR, f"campaign-{campaign_id}.db.gz")
+
+
+def _summary_key(name, args):
+    return ":".join([name] + [str(a) for a in args])
+
+
+def final_summary(campaign_id):
+    """The aggregates an archived campaign keeps, keyed as aggregate() looks them up"""
+    summary = {
+        _summary_key("get_response_count", ()): database.get_response_count(campaign_id),
+        _summary_key("get_vote_statistics", ()): database.get_vote_statistics(campaign_id),
+    }
+    for field in BREAKDOWN_FIELDS:
+        summary[_summary_key("get_demographic_breakdown", (field,))] = \
+            database.get_demographic_breakdown(campaign_id, field)
+    return summary
+
+
+def aggregate(campaign_id, name, args=()):
+    """A stored aggregate of an archived campaign, or None if it was not kept"""
+    info = database.get_archive_info(campaign_id)
+    if not info:
+        return None
+    return info['summary'].get(_summary_key(name, args))
+
+
+def _columns(c, schema, table):
+    c.execute(f"PRAGMA {schema}.table_info({table})")
+    return [row[1] for row in c.fetchall()]
+
+
+def archive_campaign(campaign_id, vacuum=False):
+    """
+    Move a closed campaign's raw rows to cold storage.
+
+    Returns {'responses', 'details', 'bytes', 'path'}. Raises ArchiveError
+    if the campaign is missing, still open, already archived, or received
+    responses while the archive was written.
+    """
+    campaign = database.get_campaign(campaign_id)
+    if not campaign:
+        raise ArchiveError(f"campaign {campaign_id} not found")
+    if campaign['is_active']:
+        raise ArchiveError("close the campaign before archiving it")
+    if database.get_archive_info(campaign_id):
+        raise ArchiveError("campaign is already archived")
+
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    path = archive_path(campaign_id)
+    raw_path = path[:-len('.gz')] + '.tmp'
+    if os.path.exists(raw_path):
+        os.remove(raw_path)
+
+    summary = final_summary(campaign_id)
+    conn = database.get_connection()
+    c = conn.cursor()
+    try:
+        # 1. Snapshot into a fresh SQLite file (reads only on the live DB)
+        c.execute("ATTACH DATABASE ? AS arc", (raw_path,))
+        c.execute("BEGIN")
+        c.execute("CREATE TABLE arc.responses AS SELECT * FROM main.responses WHERE campaign_id = ?", (campaign_id,))
+        c.execute("""CREATE TABLE arc.response_details AS SELECT d.* FROM main.response_details d
+                     JOIN main.responses r ON r.id = d.response_id WHERE r.campaign_id = ?""", (campaign_id,))
+        c.execute("CREATE TABLE arc.archive_meta (key TEXT PRIMARY KEY, value TEXT)")
+        c.executemany("INSERT INTO arc.archive_meta VALUES (?, ?)", [
+            ("campaign", json.dumps(campaign, ensure_ascii=False, default=str)),
+            ("summary", json.dumps(summary, ensure_ascii=False)),
+            ("archived_at", datetime.now().isoformat(timespec='seconds')),
+        ])
+        c.execute("SELECT COUNT(*), COALESCE(MAX(id), 0), MAX(created_at) FROM arc.responses")
+        copied, last_id, last_response_at = c.fetchone()
+        c.execute("SELECT COUNT(*) FROM arc.response_details")
+        details = c.fetchone()[0]
+        conn.commit()
+        c.execute("DETACH DATABASE arc")
+
+        with open(raw_path, 'rb') as src, gzip.open(path, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(raw_path)
+
+        # 2. Mark it archived, unless something arrived since the snapshot
+        database._begin_immediate(c, "archive_campaign")
+        c.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM responses WHERE campaign_id = ?", (campaign_id,))
+        if tuple(c.fetchone()) != (copied, last_id):
+            conn.rollback()
+            os.remove(path)
+            raise ArchiveError("new responses arrived while archiving; try again")
+        c.execute("""INSERT INTO campaign_archives (campaign_id, path, response_count, last_response_at, bytes, summary)
+                     VALUES (?, ?, ?, ?, ?, ?)""",
+                  (campaign_id, path, copied, last_response_at, os.path.getsize(path),
+                   json.dumps(summary, ensure_ascii=False)))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        if os.path.exists(raw_path):
+            os.remove(raw_path)
+        raise
+    finally:
+        conn.close()
+
+    # 3. Drop the copied live rows, a chunk per transaction (also forgets the fraud state)
+    database.reset_responses(campaign_id, upto_id=last_id)
+    if vacuum:
+        database.vacuum()
+    return {"responses": copied, "details": details, "bytes": os.path.getsize(path), "path": path}
+
+
+def restore_campaign(campaign_id):
+    """Put an archived campaign's rows back into the live DB; returns the response count"""
+    info = database.get_archive_info(campaign_id)
+    if not info:
+        raise ArchiveError("campaign is not archived")
+    path = info['path']
+    if not os.path.exists(path):
+        raise ArchiveError(f"archive file missing: {path}")
+
+    raw_path = path[:-len('.gz')] + '.restore'
+    with gzip.open(path, 'rb') as src, open(raw_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+
+    conn = database.get_connection()
+    c = conn.cursor()
+    try:
+        c.execute("ATTACH DATABASE ? AS arc", (raw_path,))
+        database._begin_immediate(c, "restore_campaign")
+        for table in ("responses", "response_details"):
+            # Columns added to the live schema after archiving stay NULL; rows
+            # an interrupted archive left live are already there
+            live = set(_columns(c, "main", table))
+            cols = ", ".join(col for col in _columns(c, "arc", table) if col in live)
+            c.execute(f"INSERT OR IGNORE INTO main.{table} ({cols}) SELECT {cols} FROM arc.{table}")
+        c.execute("SELECT COUNT(*) FROM arc.responses")
+        restored = c.fetchone()[0]
+        c.execute("DELETE FROM campaign_archives WHERE campaign_id = ?", (campaign_id,))
+        conn.commit()
+        c.execute("DETACH DATABASE arc")
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+        os.remove(raw_path)
+
+    os.remove(path)
+    fraud.screen.forget_campaign(campaign_id)
+    return restored
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive closed campaigns to cold storage")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_archive = sub.add_parser("archive", help="Move a closed campaign's responses to an archive file")
+    p_archive.add_argument("campaign_id", type=int)
+    p_archive.add_argument("--vacuum", action="store_true", help="VACUUM the live DB afterwards (locks it)")
+    p_restore = sub.add_parser("restore", help="Put an archived campaign's responses back")
+    p_restore.add_argument("campaign_id", type=int)
+    sub.add_parser("list", help="Archived campaigns")
+    args = parser.parse_args()
+
+    database.init_db()
+    try:
+        if args.command == "archive":
+            result = archive_campaign(args.campaign_id, vacuum=args.vacuum)
+            print(f"Archived {result['responses']} responses ({result['details']} answers) "
+                  f"to {result['path']} ({result['bytes'] / 1024:.1f} KB)")
+        elif args.command == "restore":
+            print(f"Restored {restore_campaign(args.campaign_id)} responses")
+        else:
+            for info in database.get_archives():
+                print(f"{info['campaign_id']:6} {info['archived_at']}  {info['response_count']:8} responses  "
+                      f"{info['bytes'] / 1024:8.1f} KB  {info['path']}")
+    except ArchiveError as e:
+        parser.exit(1, f"error: {e}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Online snapshots of the poll database with the sqlite3 backup API.
+
+    python -m core.backup                  one snapshot now
+    python -m core.backup --every 3600     scheduler (docker-compose service `backup`)
+    python -m core.backup --list
+    python -m core.backup --check 7200     exit 1 unless a snapshot succeeded in the last 2 h
+
+Retention is SUPERPOLL_BACKUP_KEEP for every caller (the scheduler and the
+admin "backup now" button), so one run never prunes what the other keeps.
+
+Pages are copied PAGES_PER_STEP at a time with a PAUSE between steps, so
+the read lock is held for milliseconds at a time and voters keep
+writing. SQLite restarts a backup whenever another connection writes
+to the source mid-way; after MAX_RESTARTS the rest is copied in one pass
+(one read lock for the copy time, well under a second for poll-sized
+databases). Either way the snapshot is a consistent image of one moment.
+
+Snapshots are written as <name>.tmp, checked with PRAGMA quick_check and
+renamed; then all but the newest KEEP are deleted. Every run records its
+duration and size in BACKUP_DIR/last.json, which the metrics exporter
+publishes (superpoll_backup_*). Archive files (core.archive) are
+immutable and not part of the snapshot; back up data/archive/ once.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+from core import database
+
+BACKUP_DIR = os.environ.get('SUPERPOLL_BACKUP_DIR', os.path.join(database.DB_DIR, 'backups'))
+KEEP = int(os.environ.get('SUPERPOLL_BACKUP_KEEP', '24'))
+PAGES_PER_STEP = 256   # 1 MB at the default 4 KB page size
+PAUSE = 0.02
+MAX_RESTARTS = 3
+STATUS_FILE = "last.json"
+PREFIX = "quickpoll-"
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def _incremental(src, dst, pages, pause):
+    """Copy with pauses between steps; returns the number of restarts seen"""
+    state = {"remaining": None, "restarts": 0}
+
+    def progress(status, remaining, total):
+        # A restart shows up as the remaining page count going back up
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            state["restarts"] += 1
+            if state["restarts"] > MAX_RESTARTS:
+                raise _TooManyRestarts()
+        state["remaining"] = remaining
+        if remaining:
+            time.sleep(pause)
+
+    src.backup(dst, pages=pages, progress=progress)
+    return state["restarts"]
+
+
+def snapshot(dest_dir=None, pages=PAGES_PER_STEP, pause=PAUSE):
+    """
+    Write one consistent snapshot of the live DB into dest_dir.
+
+    Returns {'path', 'bytes', 'seconds', 'restarts', 'mode'}; mode is
+    'incremental', or 'single_pass' when writes kept restarting the copy.
+    """
+    dest_dir = dest_dir or BACKUP_DIR
+    os.makedirs(dest_dir, exist_ok=True)
+    stem = os.path.join(dest_dir, f"{PREFIX}{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+    path, n = stem + ".db", 1
+    while os.path.exists(path):
+        path, n = f"{stem}-{n}.db", n + 1
+    tmp_path = path + ".tmp"
+    start = time.perf_counter()
+
+    src = database.get_connection()
+    dst = sqlite3.connect(tmp_path)
+    try:
+        mode = "incremental"
+        try:
+            restarts = _incremental(src, dst, pages, pause)
+        except _TooManyRestarts:
+            restarts = MAX_RESTARTS + 1
+            mode = "single_pass"
+            src.backup(dst)
+        check = dst.execute("PRAGMA quick_check").fetchone()[0]
+        if check != "ok":
+            raise sqlite3.DatabaseError(f"snapshot failed quick_check: {check}")
+    except BaseException:
+        dst.close()
+        os.remove(tmp_path)
+        raise
+    finally:
+        src.close()
+    dst.close()
+    os.replace(tmp_path, path)
+
+    return {
+        "path": path,
+        "bytes": os.path.getsize(path),
+        "seconds": round(time.perf_counter() - start, 3),
+        "restarts": restarts,
+        "mode": mode,
+    }
+
+
+def list_snapshots(dest_dir=None):
+    """[{'path', 'bytes', 'created'}] newest first"""
+    dest_dir = dest_dir or BACKUP_DIR
+    if not os.path.isdir(dest_dir):
+        return []
+    paths = [os.path.join(dest_dir, n) for n in os.listdir(dest_dir) if n.startswith(PREFIX) and n.endswith(".db")]
+    paths.sort(key=lambda p: (os.path.getmtime(p), p), reverse=True)
+    return [{"path": path, "bytes": os.path.getsize(path),
+             "created": datetime.fromtimestamp(os.path.getmtime(path)).isoformat(timespec='seconds')}
+            for path in paths]
+
+
+def prune(dest_dir=None, keep=KEEP):
+    """Delete all but the newest `keep` snapshots; returns the deleted paths"""
+    removed = [s["path"] for s in list_snapshots(dest_dir)[keep:]]
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def last_status(dest_dir=None):
+    """The last run's record from last.json, or None"""
+    try:
+        with open(os.path.join(dest_dir or BACKUP_DIR, STATUS_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_status(dest_dir, status):
+    path = os.path.join(dest_dir, STATUS_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(status, f)
+    os.replace(path + ".tmp", path)
+
+
+def run_once(dest_dir=None, keep=KEEP):
+    """Snapshot + prune, recorded in last.json; returns the status dict"""
+    dest_dir = dest_dir or BACKUP_DIR
+    os.makedirs(dest_dir, exist_ok=True)
+    previous = last_status(dest_dir) or {}
+    status = {"finished_at": time.time(), "last_success_at": previous.get("last_success_at")}
+    try:
+        result = snapshot(dest_dir)
+    except (sqlite3.Error, OSError) as e:
+        status.update(ok=False, error=str(e))
+    else:
+        status.update(result, ok=True, last_success_at=status["finished_at"],
+                      pruned=len(prune(dest_dir, keep)))
+    _write_status(dest_dir, status)
+    return status
+
+
+def run_scheduled(every, dest_dir=None, keep=KEEP):
+    """Snapshot every `every` seconds until interrupted"""
+    while True:
+        started = time.monotonic()
+        print(_describe(run_once(dest_dir, keep)), flush=True)
+        time.sleep(max(0.0, every - (time.monotonic() - started)))
+
+
+def _describe(status):
+    if not status["ok"]:
+        return f"Backup failed: {status['error']}"
+    return (f"Backup {status['path']}: {status['bytes'] / 1024 / 1024:.1f} MB in {status['seconds']:.2f}s "
+            f"({status['mode']}, {status['restarts']} restart(s), {status['pruned']} old removed)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Online snapshots of the poll database")
+    parser.add_argument("--dir", default=None, help=f"Backup directory (default {BACKUP_DIR})")
+    parser.add_argument("--keep", type=int, default=KEEP, help="Snapshots to retain")
+    parser.add_argument("--every", type=float, default=0, help="Repeat every N seconds")
+    parser.add_argument("--list", action="store_true", help="List snapshots and exit")
+    parser.add_argument("--check", type=float, default=0, metavar="SECONDS",
+                        help="Health check: exit 1 unless the last success is newer than this")
+    args = parser.parse_args()
+
+    if args.check > 0:
+        status = last_status(args.dir) or {}
+        if time.time() - (status.get("last_success_at") or 0) > args.check:
+            raise SystemExit(1)
+        return
+    if args.list:
+        for s in list_snapshots(args.dir):
+            print(f"{s['created']}  {s['bytes'] / 1024 / 1024:8.1f} MB  {s['path']}")
+        return
+    if args.every > 0:
+        run_scheduled(args.every, args.dir, args.keep)
+    status = run_once(args.dir, args.keep)
+    print(_describe(status))
+    if not status["ok"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Ballot rules shared by every voter front end (Streamlit page and the
+standalone voter service): demographic sections, card ids, selection
+parsing and validation. Nothing here imports Streamlit.
+"""
+
+import re
+from datetime import datetime, timezone
+
+from core.config import PROXY_HOPS, TRUST_PROXY
+
+# Offline ballots older than this are stored with the sync time instead
+MAX_OFFLINE_AGE = 30 * 24 * 3600
+_IDEMPOTENCY_KEY = re.compile(r"^[A-Za-z0-9:_-]{8,64}$")
+# Partner keys are stored under this prefix and the partner name (partner_key)
+PARTNER_KEY_PREFIX = "partner:"
+
+# (label, demographic key, options) shown as cards before the questions
+DEMO_SECTIONS = [
+    ("1. อำเภอหลักที่ท่านมีสิทธิเลือกตั้ง", "อำเภอ", ["ตะกั่วป่า", "ท้ายเหมือง", "คุระบุรี", "กะปง"]),
+    ("2. พื้นที่อยู่อาศัย", "พื้นที่", ["ในเขตเทศบาล", "นอกเขตเทศบาล"]),
+    ("3. ช่วงอายุ (Generation)", "Gen", ["Gen Z (18-25)", "Gen Y (26-45)", "Gen X (46-60)", "Baby Boomer (60+)"]),
+]
+
+MESSAGES = {
+    "submit": "ส่งคำตอบ",
+    "sending": "กำลังส่ง...",
+    "demo_missing": "กรุณากรอกข้อมูลทั่วไป (อำเภอ/พื้นที่/ช่วงอายุ) ให้ครบถ้วน",
+    "questions_missing": "กรุณาตอบคำถามให้ครบทุกข้อ",
+    "rate_limited": "⛔ มีการส่งคำตอบจำนวนมากในขณะนี้ กรุณารอสักครู่แล้วลองใหม่",
+    "device_rejected": "⛔ ส่งคำตอบถี่เกินไปจากอุปกรณ์นี้ กรุณารอสักครู่แล้วลองใหม่",
+    "closed": "⚠️ ไม่พบแบบสอบถาม หรือ ปิดรับความคิดเห็นแล้ว",
+    "finished": "✅ บันทึกคะแนนโหวตเรียบร้อยแล้ว! ขอบคุณที่ร่วมแสดงความคิดเห็น",
+    "again": "<< โหวตใหม่อีกครั้ง",
+    "network_error": "⚠️ ส่งคำตอบไม่สำเร็จ กรุณาตรวจสอบอินเทอร์เน็ตแล้วลองใหม่",
+    "queued": "📶 ยังไม่มีอินเทอร์เน็ต: เก็บคำตอบไว้ในเครื่องแล้ว จะส่งให้อัตโนมัติเมื่อออนไลน์",
+    "saved": "💾 บันทึกไว้ในเครื่องแล้ว จะซิงค์ขึ้นเซิร์ฟเวอร์เมื่อมีอินเทอร์เน็ต",
+    "pending": "📤 รอส่ง {n} รายการ",
+    "sync_now": "ส่งตอนนี้",
+}
+
+# Messages the ballot component shows itself (client mode)
+CLIENT_MESSAGES = {k: MESSAGES[k] for k in ("submit", "sending", "demo_missing", "questions_missing")}
+
+
+def demo_section_key(key):
+    return f"demo:{key}"
+
+
+def demo_card_id(key, index):
+    return f"demo:{key}:{index}"
+
+
+def question_section_key(q_id):
+    return f"q:{q_id}"
+
+
+def demo_value(key, card_id):
+    """Option text behind a demographic card id (None if unknown)"""
+    options = next((opts for _, k, opts in DEMO_SECTIONS if k == key), None)
+    try:
+        return options[int(str(card_id).rsplit(':', 1)[1])]
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def parse_selection(questions, selected):
+    """
+    Turn a component selection ({section key: [card ids]}) into
+    (demographic_data, answers), dropping anything invalid and enforcing
+    single choice / max_selections.
+    """
+    demo_data = {}
+    for _, key, _ in DEMO_SECTIONS:
+        picked = selected.get(demo_section_key(key)) or []
+        demo_data[key] = demo_value(key, picked[0]) if picked else None
+
+    answers = {}
+    for q in questions:
+        valid = {o['id'] for o in q['options']}
+        picked = []
+        for card_id in selected.get(question_section_key(q['id'])) or []:
+            try:
+                opt_id = int(card_id)
+            except (TypeError, ValueError):
+                continue
+            if opt_id in valid and opt_id not in picked:
+                picked.append(opt_id)
+        limit = 1 if q['question_type'] == 'single' else q['max_selections']
+        if picked:
+            answers[q['id']] = picked[:limit]
+    return demo_data, answers
+
+
+def parse_answers(questions, demographics, answers):
+    """
+    Check a ballot given as data rather than card ids (ingest API):
+    demographics {key: option text}, answers {question id: [option ids]}.
+    Returns (demographic_data, answers, error message or None); nothing
+    is silently dropped, any unknown value is an error.
+    """
+    if not isinstance(demographics, dict) or not isinstance(answers, dict):
+        return None, None, "demographics and answers must be objects"
+    demo_data = {}
+    for _, key, options in DEMO_SECTIONS:
+        if demographics.get(key) not in options:
+            return None, None, f"demographics.{key} must be one of {options}"
+        demo_data[key] = demographics[key]
+
+    by_id = {q['id']: q for q in questions}
+    parsed = {}
+    for q_id, option_ids in answers.items():
+        try:
+            q = by_id[int(q_id)]
+        except (KeyError, TypeError, ValueError):
+            return None, None, f"unknown question {q_id}"
+        if not isinstance(option_ids, list):
+            option_ids = [option_ids]
+        valid = {o['id'] for o in q['options']}
+        try:
+            picked = list(dict.fromkeys(int(o) for o in option_ids))
+        except (TypeError, ValueError):
+            return None, None, f"question {q_id}: option ids must be integers"
+        if not picked or not set(picked) <= valid:
+            return None, None, f"question {q_id}: unknown option"
+        limit = 1 if q['question_type'] == 'single' else q['max_selections']
+        if len(picked) > limit:
+            return None, None, f"question {q_id}: at most {limit} option(s)"
+        parsed[q['id']] = picked
+    missing = [q['id'] for q in questions if q['id'] not in parsed]
+    if missing:
+        return None, None, f"missing answers for questions {missing}"
+    return demo_data, parsed, None
+
+
+def validate(questions, demo_data, answers):
+    """Error message for an incomplete ballot, or None"""
+    if not all(v is not None for v in demo_data.values()):
+        return MESSAGES["demo_missing"]
+    if not all(answers.get(q['id']) for q in questions):
+        return MESSAGES["questions_missing"]
+    return None
+
+
+def location_info(ip_data):
+    """Subset of a GeoIP answer stored with each response"""
+    return {
+        "city": ip_data.get('city'),
+        "region": ip_data.get('regionName'),
+        "country": ip_data.get('country'),
+        "isp": ip_data.get('isp'),
+        "lat": ip_data.get('lat'),
+        "lon": ip_data.get('lon')
+    }
+
+
+def client_ip(forwarded_for, peer, trust_proxy=TRUST_PROXY, hops=PROXY_HOPS):
+    """
+    The voter's IP for rate limits, fraud rules and responses.ip_address.
+
+    Without a trusted proxy this is the socket peer. Behind `hops` trusted
+    proxies, each appends the address it saw to X-Forwarded-For, so the
+    client is the hops-th entry from the right; anything left of it was
+    sent by the client and is ignored.
+    """
+    if not trust_proxy or not forwarded_for:
+        return peer
+    hops_seen = [part.strip() for part in forwarded_for.split(',')]
+    if len(hops_seen) < hops or not hops_seen[-hops]:
+        return peer
+    return hops_seen[-hops]
+
+
+def valid_key(key, partner=False):
+    """
+    Client idempotency keys: 8-64 characters of [A-Za-z0-9:_-]. Voter keys
+    (partner=False) may not claim the partner namespace.
+    """
+    if not isinstance(key, str) or not _IDEMPOTENCY_KEY.match(key):
+        return False
+    return partner or not key.startswith(PARTNER_KEY_PREFIX)
+
+
+def partner_key(partner, key):
+    """
+    The stored idempotency key of a partner's key: one namespace per
+    partner, so a key another partner (or a phone) already used neither
+    drops the ballot as a duplicate nor hands out that response's id.
+    """
+    return f"{PARTNER_KEY_PREFIX}{partner}:{key}"
+
+
+def parse_collected_at(value, now):
+    """
+    When an offline ballot was filled in (epoch milliseconds, or an ISO 8601
+    string; naive times are UTC), as a UTC 'YYYY-MM-DD HH:MM:SS' like
+    CURRENT_TIMESTAMP. Missing, future or implausibly old values fall back
+    to `now` (epoch seconds).
+    """
+    try:
+        if isinstance(value, str) and not value.replace('.', '', 1).isdigit():
+            parsed = datetime.fromisoformat(value)
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            ts = parsed.timestamp()
+        else:
+            ts = float(value) / 1000
+    except (TypeError, ValueError):
+        ts = now
+    if not now - MAX_OFFLINE_AGE <= ts <= now:
+        ts = now
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
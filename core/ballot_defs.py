@@ -0,0 +1,63 @@
+"""
+Cached ballot definitions for the write paths outside Streamlit.
+
+Campaign rows (is_active, ballot_version) are re-read at most every
+CAMPAIGN_TTL seconds; questions are kept until the campaign's
+ballot_version changes (core.database bumps it on every question or
+option edit). Validation therefore costs a dict lookup, not a query.
+"""
+
+import threading
+import time
+
+from core import database, metrics
+
+CAMPAIGN_TTL = 2.0
+
+_lock = threading.Lock()
+_campaigns = {}  # campaign_id -> (expires, campaign); only ids that exist
+_questions = {}  # campaign_id -> (ballot_version, questions)
+
+
+def get_campaign(campaign_id):
+    """
+    Campaign row (None if missing), at most CAMPAIGN_TTL seconds old.
+    Misses are not cached: ids come from clients, and caching every one
+    asked for would grow without bound.
+    """
+    now = time.monotonic()
+    with _lock:
+        cached = _campaigns.get(campaign_id)
+    if cached and cached[0] > now:
+        return cached[1]
+    campaign = database.get_campaign(campaign_id)
+    with _lock:
+        if campaign:
+            _campaigns[campaign_id] = (now + CAMPAIGN_TTL, campaign)
+        else:
+            # Deleted since: forget its ballot too
+            _campaigns.pop(campaign_id, None)
+            _questions.pop(campaign_id, None)
+    return campaign
+
+
+def get_questions(campaign):
+    """Questions of the campaign's current ballot_version"""
+    campaign_id = campaign['id']
+    version = campaign.get('ballot_version') or 0
+    with _lock:
+        cached = _questions.get(campaign_id)
+    if cached and cached[0] == version:
+        metrics.inc("superpoll_cache_requests_total", cache="ballot_defs", result="hit")
+        return cached[1]
+    metrics.inc("superpoll_cache_requests_total", cache="ballot_defs", result="miss")
+    questions = database.get_questions(campaign_id)
+    with _lock:
+        _questions[campaign_id] = (version, questions)
+    return questions
+
+
+def clear():
+    with _lock:
+        _campaigns.clear()
+        _questions.clear()
@@ -0,0 +1,71 @@
+"""
+Background worker for deletes too big for one transaction.
+
+delete_campaign / delete_question queue their work in pending_deletes
+and finish it inline when it fits in one chunk. A campaign with 100k
+responses (or a question answered 100k times) is left to this worker,
+which calls database.purge_deletes: RESET_CHUNK rows per transaction
+with RESET_PAUSE between them, so voters get the write lock between
+chunks instead of waiting out one long cascade.
+
+    cascade.worker.kick()      after a delete that returned False
+    python -m core.cascade     work off the queue and exit
+
+The queue lives in the DB: a purge cut short by a restart resumes on the
+next kick() (the first one in a process always checks the queue).
+"""
+
+import sqlite3
+import threading
+import time
+
+from core import database
+
+RETRY_AFTER = 5.0
+
+
+class CascadeWorker:
+    """One daemon thread that runs purge_deletes whenever it is kicked"""
+
+    def __init__(self):
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.finished = 0
+        self.last_error = None
+
+    def kick(self):
+        """Start the thread if needed and make it check the queue"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="cascade-purge", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            try:
+                self.finished += database.purge_deletes()
+                self.last_error = None
+            except sqlite3.Error as e:
+                # Locked out for too long or similar: keep the queue and retry
+                self.last_error = str(e)
+                time.sleep(RETRY_AFTER)
+                self._wake.set()
+
+
+worker = CascadeWorker()
+
+
+def main():
+    database.init_db()
+    pending = database.get_pending_deletes()
+    print(f"Purging {len(pending)} queued delete(s)")
+    database.purge_deletes()
+    print("Done")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Per-install settings kept in config.json (edited from the admin Settings page)"""
+
+import json
+import os
+
+CONFIG_PATH = 'config.json'
+
+DEFAULTS = {
+    "base_url": "http://localhost:8501",
+    # "tap": every card tap is a server rerun; "client": the browser keeps
+    # the ballot and the server only sees the final submission
+    "voter_mode": "tap",
+}
+
+VOTER_MODES = ("tap", "client")
+
+# Reverse proxies in front of the voter pages (deployment settings, from the
+# environment). X-Forwarded-For is written by the client, so it is only read
+# when SUPERPOLL_TRUST_PROXY is on, and then only the entry appended by the
+# outermost of SUPERPOLL_PROXY_HOPS trusted proxies (see core.ballot.client_ip).
+TRUST_PROXY = os.environ.get('SUPERPOLL_TRUST_PROXY', '').lower() in ('1', 'true', 'yes')
+PROXY_HOPS = max(1, int(os.environ.get('SUPERPOLL_PROXY_HOPS', '1')))
+
+
+def load_config():
+    config = dict(DEFAULTS)
+    if os.path.exists(CONFIG_PATH):
+        try:
+            with open(CONFIG_PATH) as f:
+                config.update(json.load(f))
+        except Exception:
+            pass
+    return config
+
+
+def save_config(config):
+    with open(CONFIG_PATH, 'w') as f:
+        json.dump(config, f)
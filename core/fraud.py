@@ -0,0 +1,259 @@
+"""
+Fraud screening for vote submissions.
+
+Keeps in-memory sliding-window counters keyed by device fingerprint, IP and
+cookie token so every submit can be screened with O(1) dict lookups. The
+durable side (which devices already voted in a campaign) is warmed lazily
+from the indexed `responses.device_hash` column, for the last
+KNOWN_DEVICE_CAMPAIGNS campaigns used.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Rule set applied at submit time.
+# action: 'reject' blocks the vote, 'flag' stores it with a reason for review.
+# Repeat votes from one device are only flagged because enumerators hand a
+# single phone to several voters ("โหวตใหม่อีกครั้ง").
+FRAUD_RULES = {
+    "device_burst": {"window": 60, "limit": 3, "action": "reject"},
+    "ip_burst": {"window": 60, "limit": 20, "action": "flag"},
+    "token_burst": {"window": 600, "limit": 10, "action": "flag"},
+    "device_repeat": {"action": "flag"},
+}
+
+# Campaigns whose voted-device set is kept in memory (the rest reload from the DB)
+KNOWN_DEVICE_CAMPAIGNS = 32
+
+
+def device_fingerprint(ip_address, user_agent, device_token):
+    """Stable hash of (IP, User-Agent, cookie token)"""
+    raw = f"{ip_address or ''}|{user_agent or ''}|{device_token or ''}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def ballot_signature(answers):
+    """Order-independent hash of a ballot's answers"""
+    normalized = {}
+    for q_id, option_ids in answers.items():
+        if not isinstance(option_ids, list):
+            option_ids = [option_ids]
+        normalized[str(int(q_id))] = sorted(int(o) for o in option_ids)
+    raw = json.dumps(normalized, sort_keys=True)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def ip_prefix(ip_address):
+    """Collapse an IPv4 address to its /24 (IPv6 to its /64) for clustering"""
+    if not ip_address:
+        return "Unknown"
+    if ':' in ip_address:
+        return ':'.join(ip_address.split(':')[:4]) + '::/64'
+    parts = ip_address.split('.')
+    if len(parts) != 4:
+        return ip_address
+    return '.'.join(parts[:3]) + '.0/24'
+
+
+class SlidingWindowCounter:
+    """Per-key event timestamps inside a fixed time window"""
+
+    def __init__(self, window):
+        self.window = window
+        self._events = {}
+        self._pruned_at = 0.0
+
+    def _trim(self, key, now):
+        events = self._events.get(key)
+        if events is None:
+            return None
+        cutoff = now - self.window
+        while events and events[0] <= cutoff:
+            events.popleft()
+        if not events:
+            del self._events[key]
+            return None
+        return events
+
+    def count(self, key, now=None):
+        events = self._trim(key, now or time.time())
+        return len(events) if events else 0
+
+    def add(self, key, now=None):
+        now = now or time.time()
+        # Once per window, drop every key whose events have all expired
+        if now - self._pruned_at >= self.window:
+            for stale in list(self._events):
+                self._trim(stale, now)
+            self._pruned_at = now
+        self._trim(key, now)
+        self._events.setdefault(key, deque()).append(now)
+
+    def remove(self, key, at):
+        """Take back the event added at `at`"""
+        events = self._events.get(key)
+        if events and at in events:
+            events.remove(at)
+            if not events:
+                del self._events[key]
+
+    def clear(self, predicate=None):
+        if predicate is None:
+            self._events.clear()
+            return
+        for key in [k for k in self._events if predicate(k)]:
+            del self._events[key]
+
+
+class FraudScreen:
+    """Screens submissions against FRAUD_RULES"""
+
+    def __init__(self, rules=None):
+        self.rules = rules or FRAUD_RULES
+        self._lock = threading.Lock()
+        self._counters = {
+            name: SlidingWindowCounter(rule['window'])
+            for name, rule in self.rules.items() if 'window' in rule
+        }
+        self._known_devices = OrderedDict()  # campaign_id -> set(device_hash), LRU
+
+    def _devices(self, campaign_id, loader):
+        devices = self._known_devices.get(campaign_id)
+        if devices is None:
+            devices = set(loader(campaign_id)) if loader else set()
+            self._known_devices[campaign_id] = devices
+            while len(self._known_devices) > KNOWN_DEVICE_CAMPAIGNS:
+                self._known_devices.popitem(last=False)
+        else:
+            self._known_devices.move_to_end(campaign_id)
+        return devices
+
+    def _keys(self, campaign_id, device_hash, ip_address, device_token):
+        return {
+            "device_burst": (campaign_id, device_hash),
+            "ip_burst": (campaign_id, ip_address),
+            "token_burst": (campaign_id, device_token) if device_token else None,
+        }
+
+    def screen(self, campaign_id, ip_address, user_agent, device_token, loader=None, now=None, record=False,
+               tolerate=()):
+        """
+        Return {'action': 'ok'|'flag'|'reject', 'reasons': [...], 'device_hash': str, ...}.
+
+        With record=True a submission that is not rejected is counted in the
+        same critical section, so concurrent submits from one device cannot
+        all pass device_burst. Call release() if it is not stored after all.
+        Rules named in `tolerate` only flag, whatever their action.
+        """
+        now = now or time.time()
+        device_hash = device_fingerprint(ip_address, user_agent, device_token)
+        reasons = []
+        action = 'ok'
+
+        with self._lock:
+            for name, key in self._keys(campaign_id, device_hash, ip_address, device_token).items():
+                rule = self.rules.get(name)
+                if key is None or not rule:
+                    continue
+                if self._counters[name].count(key, now) >= rule['limit']:
+                    reasons.append(name)
+                    if rule['action'] == 'reject' and name not in tolerate:
+                        action = 'reject'
+                    elif action == 'ok':
+                        action = 'flag'
+
+            repeat_rule = self.rules.get("device_repeat")
+            if repeat_rule and device_hash in self._devices(campaign_id, loader):
+                reasons.append("device_repeat")
+                if repeat_rule['action'] == 'reject' and "device_repeat" not in tolerate:
+                    action = 'reject'
+                elif action == 'ok':
+                    action = 'flag'
+
+            verdict = {"action": action, "reasons": reasons, "device_hash": device_hash}
+            if record and action != 'reject':
+                verdict["new_device"] = self._record(campaign_id, ip_address, device_token, device_hash, now)
+                verdict["recorded_at"] = now
+        return verdict
+
+    def _record(self, campaign_id, ip_address, device_token, device_hash, now):
+        """Count a submission (lock held); True if the device was not known to have voted"""
+        for name, key in self._keys(campaign_id, device_hash, ip_address, device_token).items():
+            if key is not None and name in self._counters:
+                self._counters[name].add(key, now)
+        devices = self._known_devices.get(campaign_id)
+        if devices is not None and device_hash not in devices:
+            devices.add(device_hash)
+            return True
+        return False
+
+    def record(self, campaign_id, ip_address, device_token, device_hash, now=None):
+        """Count an accepted submission"""
+        with self._lock:
+            self._record(campaign_id, ip_address, device_token, device_hash, now or time.time())
+
+    def release(self, campaign_id, ip_address, device_token, verdict):
+        """Undo what screen(record=True) counted for a ballot that was not stored"""
+        if "recorded_at" not in verdict:
+            return
+        device_hash = verdict['device_hash']
+        with self._lock:
+            for name, key in self._keys(campaign_id, device_hash, ip_address, device_token).items():
+                if key is not None and name in self._counters:
+                    self._counters[name].remove(key, verdict['recorded_at'])
+            devices = self._known_devices.get(campaign_id)
+            if verdict.get("new_device") and devices is not None:
+                devices.discard(device_hash)
+
+    def forget_campaign(self, campaign_id):
+        """Drop all state for a campaign (after reset/delete)"""
+        with self._lock:
+            self._known_devices.pop(campaign_id, None)
+            for counter in self._counters.values():
+                counter.clear(lambda k: k[0] == campaign_id)
+
+
+# Process-wide screen shared by every Streamlit session
+screen = FraudScreen()
+
+
+def cluster_submissions(rows, min_size=3):
+    """
+    Group near-identical submissions.
+
+    Two submissions are near-identical when they carry the same answers and
+    demographics and come from the same network prefix.
+
+    Args:
+        rows: Dicts with id, ip_address, device_hash, ballot_signature,
+              demographic_data, created_at, fraud_flags
+        min_size: Smallest cluster worth reporting
+    """
+    clusters = {}
+    for r in rows:
+        if not r.get('ballot_signature'):
+            continue
+        key = (r['ballot_signature'], r.get('demographic_data') or '', ip_prefix(r.get('ip_address')))
+        clusters.setdefault(key, []).append(r)
+
+    report = []
+    for (signature, demo, prefix), members in clusters.items():
+        if len(members) < min_size:
+            continue
+        times = [m['created_at'] for m in members if m.get('created_at')]
+        report.append({
+            "size": len(members),
+            "ip_prefix": prefix,
+            "devices": len({m.get('device_hash') for m in members}),
+            "first_seen": min(times) if times else None,
+            "last_seen": max(times) if times else None,
+            "flagged": sum(1 for m in members if m.get('fraud_flags')),
+            "signature": signature[:10],
+            "demographics": json.loads(demo) if demo else {},
+            "response_ids": [m['id'] for m in members],
+        })
+    report.sort(key=lambda c: c['size'], reverse=True)
+    return report
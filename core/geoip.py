@@ -0,0 +1,67 @@
+"""
+GeoIP lookup for voter logs (ip-api.com) with a small in-process TTL cache.
+
+Voters behind one NAT / mobile carrier share an IP, so a cache spares a
+round trip on most submits. Latency, errors and hit/miss counts are
+published through core.metrics.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+from core import metrics
+
+GEOIP_URL = "http://ip-api.com/json/{ip}"
+GEOIP_TIMEOUT = 5
+CACHE_SIZE = 2048
+CACHE_TTL = 6 * 3600
+
+_lock = threading.Lock()
+_cache = OrderedDict()  # ip -> (expires_at, data)
+
+
+def lookup(ip):
+    """
+    Location data for an IP as returned by ip-api ({} on failure).
+
+    Without an IP, ip-api answers for the server itself, so that case is
+    never cached.
+    """
+    now = time.monotonic()
+    if ip:
+        with _lock:
+            hit = _cache.get(ip)
+            if hit and hit[0] > now:
+                _cache.move_to_end(ip)
+                metrics.inc("superpoll_cache_requests_total", cache="geoip", result="hit")
+                return hit[1]
+    metrics.inc("superpoll_cache_requests_total", cache="geoip", result="miss")
+
+    data = {}
+    start = time.perf_counter()
+    try:
+        res = requests.get(GEOIP_URL.format(ip=ip or ''), timeout=GEOIP_TIMEOUT)
+        if res.status_code == 200:
+            data = res.json()
+    except Exception:
+        pass
+    metrics.observe("superpoll_geoip_duration_seconds", time.perf_counter() - start)
+    if not data or data.get('status') == 'fail':
+        metrics.inc("superpoll_geoip_errors_total")
+        return data if data else {}
+
+    if ip:
+        with _lock:
+            _cache[ip] = (now + CACHE_TTL, data)
+            _cache.move_to_end(ip)
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+    return data
+
+
+def clear():
+    with _lock:
+        _cache.clear()
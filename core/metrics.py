@@ -0,0 +1,432 @@
+"""
+Hot-path instrumentation for the database layer.
+
+- `timed` wraps a core/database.py function and records call count, row
+  count and a latency histogram keyed by (function, campaign_id).
+- `InstrumentedConnection` is a sqlite3 connection factory whose cursors
+  record the same per SQL statement.
+
+Recording is off unless SUPERPOLL_METRICS=1 or `enable()` is called; when
+off, a wrapped call costs one attribute check and connections are plain
+sqlite3 connections.
+
+Service metrics (`inc`, `observe`, `timer`) are separate and always on:
+a handful of counters and histograms (votes, submit latency, lock waits,
+GeoIP, cache hits) that the /metrics exporter publishes. Their histograms
+are cumulative; `recent_histogram` covers only the last RECENT_WINDOW
+seconds (a ring of RECENT_SLOT buckets), for health checks about now.
+"""
+
+import contextlib
+import functools
+import inspect
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+
+# Latency histogram upper bounds in seconds (Prometheus style, +Inf implied)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_state = {"enabled": os.environ.get('SUPERPOLL_METRICS', '0') == '1'}
+_lock = threading.Lock()
+_functions = {}   # (function, campaign) -> Series
+_statements = {}  # normalized sql -> Series
+_service_counters = {}    # (metric, labels) -> float
+_timing = threading.local()  # .active while a timed function runs on this thread
+_service_histograms = {}  # (metric, labels) -> Series
+_recent = {}  # metric -> deque of (slot number, Series), oldest first
+
+# recent_histogram() window, kept as RECENT_WINDOW / RECENT_SLOT time slots
+RECENT_WINDOW = 300.0
+RECENT_SLOT = 30.0
+
+# Always-on service metrics: name -> (type, help)
+SERVICE_METRICS = {
+    "superpoll_votes_total": ("counter", "Ballots by campaign and outcome (accepted / rejected / rate_limited / duplicate)"),
+    "superpoll_submit_duration_seconds": ("histogram", "submit_response latency"),
+    "superpoll_db_lock_wait_seconds": ("histogram", "Time spent waiting for the SQLite write lock"),
+    "superpoll_db_lock_timeouts_total": ("counter", "Writes that gave up with 'database is locked'"),
+    "superpoll_geoip_duration_seconds": ("histogram", "GeoIP lookup latency (cache misses only)"),
+    "superpoll_geoip_errors_total": ("counter", "GeoIP lookups that failed or timed out"),
+    "superpoll_cache_requests_total": ("counter", "Cache lookups by cache and result (hit / miss)"),
+    "superpoll_ratelimit_errors_total": ("counter", "Rate-limit checks whose bucket store failed, by what the vote got (allowed / rejected)"),
+    "superpoll_ingest_items_total": ("counter", "Offline ballots synced, by outcome (accepted / duplicate / invalid / retry)"),
+    "superpoll_ingest_batch_duration_seconds": ("histogram", "submit_batch latency (one transaction per batch)"),
+}
+
+
+class Series:
+    """Calls, rows and latency histogram for one key"""
+
+    __slots__ = ("calls", "rows", "errors", "total", "buckets")
+
+    def __init__(self):
+        self.calls = 0
+        self.rows = 0
+        self.errors = 0
+        self.total = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def observe(self, seconds, rows=0, error=False):
+        self.calls += 1
+        self.rows += rows
+        self.total += seconds
+        if error:
+            self.errors += 1
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def quantile(self, q):
+        """Estimate a latency quantile (seconds) from the histogram"""
+        if not self.calls:
+            return 0.0
+        rank = q * self.calls
+        seen = 0
+        lower = 0.0
+        for i, count in enumerate(self.buckets):
+            upper = LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else LATENCY_BUCKETS[-1]
+            if count and seen + count >= rank:
+                return lower + (upper - lower) * ((rank - seen) / count)
+            seen += count
+            lower = upper
+        return LATENCY_BUCKETS[-1]
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "rows": self.rows,
+            "errors": self.errors,
+            "total_ms": round(self.total * 1000, 3),
+            "mean_ms": round(self.total / self.calls * 1000, 3) if self.calls else 0,
+            "p50_ms": round(self.quantile(0.5) * 1000, 3),
+            "p95_ms": round(self.quantile(0.95) * 1000, 3),
+            "p99_ms": round(self.quantile(0.99) * 1000, 3),
+            "buckets": dict(zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], self.buckets)),
+        }
+
+
+def is_enabled():
+    return _state["enabled"]
+
+
+def enable():
+    _state["enabled"] = True
+
+
+def disable():
+    _state["enabled"] = False
+
+
+def reset():
+    with _lock:
+        _functions.clear()
+        _statements.clear()
+
+
+# --- Service metrics (always on) ---
+def _labels_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(metric, amount=1, **labels):
+    key = (metric, _labels_key(labels))
+    with _lock:
+        _service_counters[key] = _service_counters.get(key, 0) + amount
+
+
+def observe(metric, seconds, **labels):
+    key = (metric, _labels_key(labels))
+    with _lock:
+        series = _service_histograms.get(key)
+        if series is None:
+            series = _service_histograms[key] = Series()
+        series.observe(seconds)
+        slot = int(time.monotonic() // RECENT_SLOT)
+        ring = _recent.setdefault(metric, deque())
+        if not ring or ring[-1][0] != slot:
+            ring.append((slot, Series()))
+            while ring[0][0] <= slot - RECENT_WINDOW / RECENT_SLOT:
+                ring.popleft()
+        ring[-1][1].observe(seconds)
+
+
+@contextlib.contextmanager
+def timer(metric, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(metric, time.perf_counter() - start, **labels)
+
+
+def counter_value(metric, **labels):
+    """Sum of a service counter over every label set matching `labels`"""
+    wanted = set(_labels_key(labels))
+    with _lock:
+        return sum(v for (m, key), v in _service_counters.items() if m == metric and wanted <= set(key))
+
+
+def histogram(metric, **labels):
+    """Merged Series of a service histogram over every label set matching `labels`"""
+    wanted = set(_labels_key(labels))
+    merged = Series()
+    with _lock:
+        for (m, key), s in _service_histograms.items():
+            if m == metric and wanted <= set(key):
+                merged.calls += s.calls
+                merged.total += s.total
+                merged.buckets = [a + b for a, b in zip(merged.buckets, s.buckets)]
+    return merged
+
+
+def recent_histogram(metric):
+    """Series of a service histogram (all labels) over the last RECENT_WINDOW seconds"""
+    oldest = int(time.monotonic() // RECENT_SLOT) - RECENT_WINDOW / RECENT_SLOT
+    merged = Series()
+    with _lock:
+        for slot, s in _recent.get(metric, ()):
+            if slot > oldest:
+                merged.calls += s.calls
+                merged.total += s.total
+                merged.buckets = [a + b for a, b in zip(merged.buckets, s.buckets)]
+    return merged
+
+
+def _row_count(result):
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    if isinstance(result, dict):
+        return len(result.get('data') or result.get('questions') or []) or 1
+    return 1 if result is not None else 0
+
+
+def record_function(name, campaign_id, seconds, rows=0, error=False):
+    key = (name, str(campaign_id) if campaign_id is not None else "")
+    with _lock:
+        series = _functions.get(key)
+        if series is None:
+            series = _functions[key] = Series()
+        series.observe(seconds, rows, error)
+
+
+def record_statement(sql, seconds, rows=0, error=False):
+    key = normalize_sql(sql)
+    with _lock:
+        series = _statements.get(key)
+        if series is None:
+            series = _statements[key] = Series()
+        series.observe(seconds, rows, error)
+
+
+_IN_LIST = re.compile(r"\(\s*\?(\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    """Collapse whitespace and variable-length IN lists so statements group"""
+    sql = _SPACES.sub(" ", sql).strip()
+    return _IN_LIST.sub("(?, ...)", sql)
+
+
+def timed(fn):
+    """
+    Decorator: record calls/rows/latency of a database function.
+    Only the outermost timed call on a thread is recorded (get_vote_statistics,
+    not the get_results and get_questions inside it), so no time counts twice.
+    """
+    params = list(inspect.signature(fn).parameters)
+    campaign_pos = params.index('campaign_id') if 'campaign_id' in params else None
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _state["enabled"] or getattr(_timing, "active", False):
+            return fn(*args, **kwargs)
+        campaign_id = kwargs.get('campaign_id')
+        if campaign_id is None and campaign_pos is not None and campaign_pos < len(args):
+            campaign_id = args[campaign_pos]
+        start = time.perf_counter()
+        _timing.active = True
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            record_function(name, campaign_id, time.perf_counter() - start, error=True)
+            raise
+        finally:
+            _timing.active = False
+        record_function(name, campaign_id, time.perf_counter() - start, _row_count(result))
+        return result
+
+    return wrapper
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that times execute/executemany and counts fetched rows"""
+
+    _last_sql = None
+
+    def _timed(self, method, sql, *args):
+        start = time.perf_counter()
+        try:
+            result = method(sql, *args)
+        except Exception:
+            record_statement(sql, time.perf_counter() - start, error=True)
+            raise
+        rows = self.rowcount if self.rowcount and self.rowcount > 0 else 0
+        record_statement(sql, time.perf_counter() - start, rows)
+        self._last_sql = sql
+        return result
+
+    def execute(self, sql, parameters=()):
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(super().executemany, sql, seq_of_parameters)
+
+    def _count_fetched(self, rows):
+        if self._last_sql and rows:
+            key = normalize_sql(self._last_sql)
+            with _lock:
+                series = _statements.get(key)
+                if series is not None:
+                    series.rows += rows
+
+    def fetchone(self):
+        row = super().fetchone()
+        self._count_fetched(1 if row is not None else 0)
+        return row
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self._count_fetched(len(rows))
+        return rows
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(size) if size is not None else super().fetchmany()
+        self._count_fetched(len(rows))
+        return rows
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3 connection whose cursors are InstrumentedCursor"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+
+def connect(path, **kwargs):
+    """sqlite3.connect, instrumented only while recording is enabled"""
+    if _state["enabled"]:
+        kwargs.setdefault('factory', InstrumentedConnection)
+    return sqlite3.connect(path, **kwargs)
+
+
+# --- Export ---
+def snapshot():
+    """Plain dict of everything recorded so far"""
+    with _lock:
+        functions = [dict(function=name, campaign=campaign, **series.to_dict())
+                     for (name, campaign), series in _functions.items()]
+        statements = [dict(statement=sql, **series.to_dict()) for sql, series in _statements.items()]
+    functions.sort(key=lambda f: f['total_ms'], reverse=True)
+    statements.sort(key=lambda s: s['total_ms'], reverse=True)
+    return {"enabled": _state["enabled"], "functions": functions, "statements": statements}
+
+
+def to_json():
+    return json.dumps(snapshot(), ensure_ascii=False, indent=2)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+def _histogram_lines(metric, labels, series):
+    lines = []
+    cumulative = 0
+    prefix = f"{labels}," if labels else ""
+    suffix = f"{{{labels}}}" if labels else ""
+    for bound, count in zip(list(LATENCY_BUCKETS) + ["+Inf"], series.buckets):
+        cumulative += count
+        lines.append(f'{metric}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+    lines.append(f'{metric}_sum{suffix} {series.total:.6f}')
+    lines.append(f'{metric}_count{suffix} {series.calls}')
+    return lines
+
+
+def _format_labels(key):
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in key)
+
+
+def service_prometheus():
+    """Prometheus text for the always-on service metrics"""
+    with _lock:
+        counters = sorted(_service_counters.items())
+        histograms = sorted(_service_histograms.items(), key=lambda item: item[0])
+
+    lines = []
+    for metric, (kind, help_text) in SERVICE_METRICS.items():
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+        if kind == "counter":
+            for (m, key), value in counters:
+                if m == metric:
+                    labels = _format_labels(key)
+                    lines.append(f'{metric}{{{labels}}} {value:g}' if labels else f'{metric} {value:g}')
+        else:
+            for (m, key), series in histograms:
+                if m == metric:
+                    lines += _histogram_lines(metric, _format_labels(key), series)
+    return "\n".join(lines) + "\n"
+
+
+def to_prometheus():
+    """Prometheus text exposition format"""
+    with _lock:
+        functions = list(_functions.items())
+        statements = list(_statements.items())
+
+    lines = [
+        "# HELP superpoll_db_function_calls_total Database function calls",
+        "# TYPE superpoll_db_function_calls_total counter",
+    ]
+    for (name, campaign), s in functions:
+        lines.append(f'superpoll_db_function_calls_total{{function="{name}",campaign="{campaign}"}} {s.calls}')
+    lines += [
+        "# HELP superpoll_db_function_rows_total Rows returned by database functions",
+        "# TYPE superpoll_db_function_rows_total counter",
+    ]
+    for (name, campaign), s in functions:
+        lines.append(f'superpoll_db_function_rows_total{{function="{name}",campaign="{campaign}"}} {s.rows}')
+    lines += [
+        "# HELP superpoll_db_function_errors_total Database function calls that raised",
+        "# TYPE superpoll_db_function_errors_total counter",
+    ]
+    for (name, campaign), s in functions:
+        lines.append(f'superpoll_db_function_errors_total{{function="{name}",campaign="{campaign}"}} {s.errors}')
+    lines += [
+        "# HELP superpoll_db_function_duration_seconds Database function latency",
+        "# TYPE superpoll_db_function_duration_seconds histogram",
+    ]
+    for (name, campaign), s in functions:
+        lines += _histogram_lines("superpoll_db_function_duration_seconds", f'function="{name}",campaign="{campaign}"', s)
+
+    lines += [
+        "# HELP superpoll_sql_rows_total Rows read or written per SQL statement",
+        "# TYPE superpoll_sql_rows_total counter",
+    ]
+    for sql, s in statements:
+        lines.append(f'superpoll_sql_rows_total{{statement="{_escape(sql)}"}} {s.rows}')
+    lines += [
+        "# HELP superpoll_sql_duration_seconds SQL statement latency",
+        "# TYPE superpoll_sql_duration_seconds histogram",
+    ]
+    for sql, s in statements:
+        lines += _histogram_lines("superpoll_sql_duration_seconds", f'statement="{_escape(sql)}"', s)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,174 @@
+"""
+Side HTTP endpoint for Prometheus and container health checks.
+
+Runs in a daemon thread next to Streamlit (same process, so it sees the
+in-memory counters):
+
+    GET /metrics   Prometheus text: service metrics, stored responses per
+                   campaign, rate limiter totals, the last backup (core.backup),
+                   and the opt-in per-function DB metrics when recording is enabled
+    GET /healthz   200 {"status": "ok", ...} or 503 when the database cannot
+                   be read or the write lock is starved
+
+Started once per process by `ensure_started()` when SUPERPOLL_METRICS_PORT
+is set (serve.py starts it before Streamlit; app.py calls it as a fallback).
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from core import backup, database, metrics
+from core.ratelimit import limiter
+
+# /healthz fails when a SELECT takes longer than this...
+HEALTH_DB_TIMEOUT = 2.0
+# ...or when p95 write-lock wait over the last metrics.RECENT_WINDOW seconds exceeds this
+HEALTH_LOCK_WAIT_P95 = 1.0
+# Stored-response gauges are re-read at most this often
+COUNTS_TTL = 10.0
+
+_state = {"server": None, "counts": (0.0, [])}
+_start_lock = threading.Lock()
+
+
+def _response_counts():
+    expires, rows = _state["counts"]
+    if time.monotonic() < expires:
+        return rows
+    conn = sqlite3.connect(database.DB_PATH, timeout=HEALTH_DB_TIMEOUT)
+    try:
+        # Trigger-kept counts (as get_campaign_summaries): no scan of responses
+        rows = conn.execute("""SELECT c.id, CASE WHEN a.campaign_id IS NULL THEN COALESCE(c.response_count, 0)
+                                                 ELSE a.response_count END
+                               FROM campaigns c LEFT JOIN campaign_archives a ON a.campaign_id = c.id""").fetchall()
+    finally:
+        conn.close()
+    _state["counts"] = (time.monotonic() + COUNTS_TTL, rows)
+    return rows
+
+
+def render_metrics():
+    lines = [metrics.service_prometheus().rstrip("\n")]
+    lines += [
+        "# HELP superpoll_campaign_responses Responses stored per campaign",
+        "# TYPE superpoll_campaign_responses gauge",
+    ]
+    try:
+        for campaign_id, count in _response_counts():
+            lines.append(f'superpoll_campaign_responses{{campaign="{campaign_id}"}} {count}')
+    except sqlite3.Error:
+        pass
+
+    stats = limiter.stats()
+    lines += [
+        "# HELP superpoll_ratelimit_decisions_total Rate limiter decisions",
+        "# TYPE superpoll_ratelimit_decisions_total counter",
+        f'superpoll_ratelimit_decisions_total{{result="accepted"}} {stats["accepted"]}',
+        f'superpoll_ratelimit_decisions_total{{result="rejected"}} {stats["rejected"]}',
+    ]
+    status = backup.last_status()
+    if status:
+        lines += [
+            "# HELP superpoll_backup_last_ok Whether the last backup run succeeded",
+            "# TYPE superpoll_backup_last_ok gauge",
+            f"superpoll_backup_last_ok {1 if status['ok'] else 0}",
+            "# HELP superpoll_backup_last_success_timestamp_seconds Unix time of the last good snapshot",
+            "# TYPE superpoll_backup_last_success_timestamp_seconds gauge",
+            f"superpoll_backup_last_success_timestamp_seconds {status.get('last_success_at') or 0}",
+        ]
+        if status['ok']:
+            lines += [
+                "# HELP superpoll_backup_duration_seconds Duration of the last snapshot",
+                "# TYPE superpoll_backup_duration_seconds gauge",
+                f"superpoll_backup_duration_seconds {status['seconds']}",
+                "# HELP superpoll_backup_bytes Size of the last snapshot",
+                "# TYPE superpoll_backup_bytes gauge",
+                f"superpoll_backup_bytes {status['bytes']}",
+            ]
+    if metrics.is_enabled():
+        lines.append(metrics.to_prometheus().rstrip("\n"))
+    return "\n".join(lines) + "\n"
+
+
+def health():
+    """(healthy, report) for /healthz"""
+    report = {"status": "ok"}
+    start = time.perf_counter()
+    try:
+        conn = sqlite3.connect(database.DB_PATH, timeout=HEALTH_DB_TIMEOUT)
+        try:
+            conn.execute("SELECT 1 FROM campaigns LIMIT 1").fetchall()
+        finally:
+            conn.close()
+        report["db_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    except sqlite3.Error as e:
+        report.update(status="fail", db_error=str(e))
+        return False, report
+
+    # Recent window: an old burst must not fail the check forever, nor hours of fast writes hide one now
+    lock_p95 = metrics.recent_histogram("superpoll_db_lock_wait_seconds").quantile(0.95)
+    submit = metrics.recent_histogram("superpoll_submit_duration_seconds")
+    hits = metrics.counter_value("superpoll_cache_requests_total", cache="geoip", result="hit")
+    misses = metrics.counter_value("superpoll_cache_requests_total", cache="geoip", result="miss")
+    report.update(
+        window_s=metrics.RECENT_WINDOW,
+        submits=submit.calls,
+        submit_p95_ms=round(submit.quantile(0.95) * 1000, 2),
+        lock_wait_p95_ms=round(lock_p95 * 1000, 2),
+        lock_timeouts=metrics.counter_value("superpoll_db_lock_timeouts_total"),
+        geoip_hit_rate=round(hits / (hits + misses), 3) if hits + misses else None,
+    )
+    if lock_p95 > HEALTH_LOCK_WAIT_P95:
+        report["status"] = "degraded"
+        return False, report
+    return True, report
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/metrics':
+            self._send(200, render_metrics(), "text/plain; version=0.0.4; charset=utf-8")
+        elif path == '/healthz':
+            ok, report = health()
+            self._send(200 if ok else 503, json.dumps(report), "application/json")
+        else:
+            self._send(404, "not found\n", "text/plain")
+
+    def _send(self, status, body, content_type):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass  # scrapes every few seconds would flood the Streamlit log
+
+
+def start(port, host="0.0.0.0"):
+    """Serve /metrics and /healthz from a daemon thread; returns the server"""
+    with _start_lock:
+        if _state["server"] is None:
+            server = ThreadingHTTPServer((host, port), MetricsHandler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+            _state["server"] = server
+        return _state["server"]
+
+
+def ensure_started():
+    """Start the exporter once per process if SUPERPOLL_METRICS_PORT is set"""
+    port = os.environ.get('SUPERPOLL_METRICS_PORT')
+    if not port or _state["server"] is not None:
+        return _state["server"]
+    try:
+        return start(int(port))
+    except OSError:
+        # Port already bound (another process serves it)
+        return None
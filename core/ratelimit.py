@@ -0,0 +1,180 @@
+"""
+Token-bucket rate limiting for vote submissions.
+
+Buckets are keyed by client IP and by campaign. State lives in process
+memory by default; set SUPERPOLL_RATELIMIT_BACKEND=sqlite to share buckets
+between processes through a small side database (kept apart from the poll DB
+so limiter writes never wait on the vote write lock). If that database stays
+locked or fails, the limiter lets the vote through (FAIL_OPEN) and counts it
+in superpoll_ratelimit_errors_total: the fraud screen still applies.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from core import metrics
+
+# (capacity, refill tokens per second)
+# IP limits stay generous because mobile carriers put many phones behind one NAT.
+RATE_LIMITS = {
+    "ip": (30, 0.5),
+    "campaign": (300, 20.0),
+}
+
+RATELIMIT_DB_PATH = os.path.join('data', 'ratelimit.db')
+
+
+def _refill(tokens, updated, capacity, rate, now):
+    return min(capacity, tokens + (now - updated) * rate)
+
+
+class MemoryBucketStore:
+    """Buckets in a dict: key -> (tokens, updated, full_at)"""
+
+    # Buckets that have refilled completely are dropped this often (they equal a missing one)
+    PRUNE_EVERY = 60.0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._pruned_at = 0.0
+
+    def _prune(self, now):
+        for key in [k for k, bucket in self._buckets.items() if bucket[2] <= now]:
+            del self._buckets[key]
+        self._pruned_at = now
+
+    def take(self, requests, now):
+        """
+        Consume one token from every bucket, or none of them.
+
+        Args:
+            requests: List of (key, capacity, rate)
+            now: Current time in seconds
+        """
+        with self._lock:
+            if now - self._pruned_at >= self.PRUNE_EVERY:
+                self._prune(now)
+            levels = []
+            for key, capacity, rate in requests:
+                tokens, updated, _ = self._buckets.get(key, (capacity, now, now))
+                levels.append(_refill(tokens, updated, capacity, rate, now))
+            allowed = all(level >= 1 for level in levels)
+            for (key, capacity, rate), level in zip(requests, levels):
+                if allowed:
+                    level -= 1
+                self._buckets[key] = (level, now, now + (capacity - level) / rate)
+            return allowed
+
+
+class SQLiteBucketStore:
+    """Buckets in a shared SQLite file for multi-process deployments"""
+
+    # As MemoryBucketStore: full buckets are deleted this often (per process)
+    PRUNE_EVERY = 60.0
+
+    def __init__(self, path=RATELIMIT_DB_PATH):
+        self.path = path
+        self._pruned_at = 0.0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute('''CREATE TABLE IF NOT EXISTS rate_buckets (
+            key TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated REAL NOT NULL,
+            full_at REAL NOT NULL DEFAULT 0
+        )''')
+        # Files created before full_at was kept: their rows go at the first prune
+        if 'full_at' not in [row[1] for row in conn.execute("PRAGMA table_info(rate_buckets)")]:
+            conn.execute("ALTER TABLE rate_buckets ADD COLUMN full_at REAL NOT NULL DEFAULT 0")
+        conn.commit()
+        conn.close()
+
+    def take(self, requests, now):
+        conn = sqlite3.connect(self.path, timeout=2, isolation_level=None)
+        try:
+            c = conn.cursor()
+            c.execute("BEGIN IMMEDIATE")
+            levels = []
+            for key, capacity, rate in requests:
+                c.execute("SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,))
+                row = c.fetchone()
+                tokens, updated = row if row else (capacity, now)
+                levels.append(_refill(tokens, updated, capacity, rate, now))
+            allowed = all(level >= 1 for level in levels)
+            for (key, capacity, rate), level in zip(requests, levels):
+                if allowed:
+                    level -= 1
+                c.execute("INSERT OR REPLACE INTO rate_buckets (key, tokens, updated, full_at) VALUES (?, ?, ?, ?)",
+                          (key, level, now, now + (capacity - level) / rate))
+            if now - self._pruned_at >= self.PRUNE_EVERY:
+                c.execute("DELETE FROM rate_buckets WHERE full_at <= ?", (now,))
+                self._pruned_at = now
+            c.execute("COMMIT")
+            return allowed
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+
+class RateLimiter:
+    """Per-IP and per-campaign token buckets with accept/reject counters"""
+
+    # A store that fails (the SQLite side DB stayed locked) lets the vote through
+    FAIL_OPEN = True
+
+    def __init__(self, store=None, limits=None):
+        self.store = store or MemoryBucketStore()
+        self.limits = limits or RATE_LIMITS
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.rejected = 0
+        self.rejected_by_campaign = {}
+
+    def allow(self, campaign_id, ip_address=None, now=None):
+        """Return True and consume tokens if the submission may proceed"""
+        now = now or time.time()
+        ip_cap, ip_rate = self.limits["ip"]
+        camp_cap, camp_rate = self.limits["campaign"]
+        requests = [(f"campaign:{campaign_id}", camp_cap, camp_rate)]
+        if ip_address:
+            requests.append((f"ip:{ip_address}", ip_cap, ip_rate))
+
+        try:
+            allowed = self.store.take(requests, now)
+        except sqlite3.Error:
+            metrics.inc("superpoll_ratelimit_errors_total", result="allowed" if self.FAIL_OPEN else "rejected")
+            allowed = self.FAIL_OPEN
+        with self._lock:
+            if allowed:
+                self.accepted += 1
+            else:
+                self.rejected += 1
+                self.rejected_by_campaign[campaign_id] = self.rejected_by_campaign.get(campaign_id, 0) + 1
+        if not allowed:
+            metrics.inc("superpoll_votes_total", campaign=campaign_id, result="rate_limited")
+        return allowed
+
+    def stats(self):
+        with self._lock:
+            return {
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "rejected_by_campaign": dict(self.rejected_by_campaign),
+            }
+
+
+def _default_store():
+    if os.environ.get('SUPERPOLL_RATELIMIT_BACKEND', 'memory').lower() == 'sqlite':
+        return SQLiteBucketStore(os.environ.get('SUPERPOLL_RATELIMIT_DB', RATELIMIT_DB_PATH))
+    return MemoryBucketStore()
+
+
+# Process-wide limiter shared by every Streamlit session
+limiter = RateLimiter(_default_store())
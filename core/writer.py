@@ -0,0 +1,112 @@
+"""
+Single-writer queue for the ingest API.
+
+SQLite allows one writer at a time, so instead of every request opening a
+connection and fighting over the write lock, requests hand their ballots
+to one thread that owns one connection. The thread drains whatever is
+queued (up to MAX_GROUP ballots) and stores it in a single transaction
+(group commit): under load one fsync covers many requests.
+
+    writer = BallotWriter().start()
+    future = writer.submit(items)          # concurrent.futures.Future
+    results = await asyncio.wrap_future(future)
+
+submit() raises WriterBusy when MAX_PENDING jobs are already waiting, so
+callers can shed load (HTTP 503) instead of queueing without bound.
+"""
+
+import concurrent.futures
+import queue
+import threading
+import time
+
+from core import database, metrics
+
+MAX_GROUP = 500
+MAX_PENDING = 1000
+
+
+class WriterBusy(Exception):
+    pass
+
+
+class BallotWriter:
+    """One thread and one connection for every queued ballot write"""
+
+    def __init__(self, max_group=MAX_GROUP, max_pending=MAX_PENDING):
+        self.max_group = max_group
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self.groups = 0
+        self.written = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ballot-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def depth(self):
+        """Jobs waiting for the writer"""
+        return self._queue.qsize()
+
+    def submit(self, items):
+        """
+        Queue ballots (see database.write_ballots for the item format).
+        The future resolves to [(status, response_id)] in item order.
+        """
+        future = concurrent.futures.Future()
+        try:
+            self._queue.put_nowait((items, future))
+        except queue.Full:
+            raise WriterBusy()
+        return future
+
+    def _run(self):
+        conn = database.get_connection()
+        try:
+            while True:
+                job = self._queue.get()
+                if job is None:
+                    return
+                jobs, count = [job], len(job[0])
+                while count < self.max_group:
+                    try:
+                        job = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if job is None:
+                        self._write(conn, jobs)
+                        return
+                    jobs.append(job)
+                    count += len(job[0])
+                self._write(conn, jobs)
+        finally:
+            conn.close()
+
+    def _write(self, conn, jobs):
+        items = [item for job_items, _ in jobs for item in job_items]
+        start = time.perf_counter()
+        try:
+            results = database.write_ballots(conn, items, "ingest_writer")
+        except Exception as e:
+            if len(jobs) == 1:
+                jobs[0][1].set_exception(e)
+                return
+            # One bad item or a lock timeout must not fail every request of the group
+            for job in jobs:
+                self._write(conn, [job])
+            return
+        metrics.observe("superpoll_ingest_batch_duration_seconds", time.perf_counter() - start, source="writer")
+        self.groups += 1
+        self.written += len(items)
+        offset = 0
+        for job_items, future in jobs:
+            future.set_result(results[offset:offset + len(job_items)])
+            offset += len(job_items)
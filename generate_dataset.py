@@ -0,0 +1,316 @@
+"""
+Synthetic dataset generator for large campaigns.
+
+Samples millions of ballots in one pass with NumPy: demographics come from
+marginal weights, and the main vote question from a joint
+district × Gen × vote distribution (base vote weights scaled by per-district
+and per-generation multipliers). Multi-select questions get 1..max_selections
+distinct options each; questions without options are left blank. Rows are
+written with executemany inside large transactions. The same seed always
+produces the same campaign.
+
+Usage:
+    python generate_dataset.py --responses 1000000 --db /tmp/big.db
+    python generate_dataset.py --responses 200000 --campaign 3 --seed 7
+    python generate_dataset.py --responses 50000 --config my_distribution.json
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core import database, fraud
+
+# Weights are relative; they do not need to sum to 1.
+DEFAULT_CONFIG = {
+    "demographics": {
+        "อำเภอ": {"ตะกั่วป่า": 127, "ท้ายเหมือง": 124, "คุระบุรี": 72, "กะปง": 37},
+        "พื้นที่": {"ในเขตเทศบาล": 60, "นอกเขตเทศบาล": 300},
+        "Gen": {"Gen Z (18-25)": 18, "Gen Y (26-45)": 35, "Gen X (46-60)": 30, "Baby Boomer (60+)": 15},
+    },
+    "vote_question": "🗳️ หากวันนี้เป็นวันเลือกตั้ง ท่านจะกาคะแนนให้ใคร?",
+    "vote_weights": {
+        "เบอร์ 1 น.ส.พิจิกา - พรรคเพื่อไทย": 15,
+        "เบอร์ 2 นายสมควร - พรรคกล้าธรรม": 8,
+        "เบอร์ 3 นายฉกาจ - พรรคภูมิใจไทย": 35,
+        "เบอร์ 4 นายกุศล - พรรคประชาธิปัตย์": 25,
+        "เบอร์ 5 นายธีรุตม์ - พรรคประชาชน": 12,
+        "ยังไม่ตัดสินใจ": 5,
+    },
+    # Multipliers on vote_weights (option text fragment -> factor)
+    "vote_by_district": {
+        "ตะกั่วป่า": {"เบอร์ 3": 1.2},
+        "ท้ายเหมือง": {"เบอร์ 4": 1.4},
+        "คุระบุรี": {"เบอร์ 1": 1.3},
+        "กะปง": {"เบอร์ 4": 1.5, "เบอร์ 3": 0.8},
+    },
+    "vote_by_gen": {
+        "Gen Z (18-25)": {"เบอร์ 5": 2.5, "ยังไม่ตัดสินใจ": 1.5},
+        "Gen Y (26-45)": {"เบอร์ 5": 1.4},
+        "Baby Boomer (60+)": {"เบอร์ 4": 1.3, "เบอร์ 5": 0.5},
+    },
+    # Remaining questions: option text -> weight (uniform when missing)
+    "other_questions": {
+        "📋 เหตุผลหลักที่ท่านเลือกหมายเลขนี้?": {
+            "เลือกที่ \"ตัวบุคคล\" (ผลงาน/ความดี/คนพื้นที่)": 45,
+            "เลือกที่ \"พรรคการเมือง\" (นโยบาย/หัวหน้าพรรค)": 35,
+            "ต้องการ \"ความเปลี่ยนแปลง\"": 20,
+        },
+    },
+    # Field day over which created_at is spread
+    "field_start": "2026-02-08 07:00:00",
+    "field_hours": 10,
+}
+
+CHUNK = 100_000
+
+
+def load_config(path):
+    config = json.loads(json.dumps(DEFAULT_CONFIG))
+    if path:
+        with open(path, encoding='utf-8') as f:
+            config.update(json.load(f))
+    return config
+
+
+def normalize(weights):
+    """Weights -> probabilities; all-zero (or negative-only) weights fall back to uniform"""
+    w = np.clip(np.asarray(weights, dtype=np.float64), 0, None)
+    total = w.sum()
+    return w / total if total > 0 else np.full(len(w), 1.0 / len(w))
+
+
+def sample_categorical(rng, probs, n):
+    """Vectorized draw of n indices from one categorical distribution"""
+    return np.searchsorted(np.cumsum(probs), rng.random(n), side='right').clip(max=len(probs) - 1)
+
+
+def sample_conditional(rng, cell_probs, cells):
+    """Draw one index per row, row i from the distribution cell_probs[cells[i]]"""
+    cdf = np.cumsum(cell_probs, axis=1)[cells]
+    u = rng.random(len(cells))[:, None]
+    return (cdf < u).sum(axis=1).clip(max=cell_probs.shape[1] - 1)
+
+
+def sample_multi(rng, probs, max_k, n):
+    """
+    (n, len(options)) boolean selections for a multi-select question: each row
+    picks 1..max_k distinct options, weighted without replacement by probs
+    (a vector, or one row of probabilities per draw). Exponential race: the k
+    options with the smallest Exp(1) / p keys are a weighted sample of size k.
+    """
+    probs = np.broadcast_to(probs, (n, np.shape(probs)[-1]))
+    with np.errstate(divide='ignore'):
+        keys = rng.exponential(size=probs.shape) / probs
+    ranks = np.empty(probs.shape, dtype=np.int64)
+    np.put_along_axis(ranks, np.argsort(keys, axis=1), np.arange(probs.shape[1]), axis=1)
+    counts = np.minimum(rng.integers(1, max_k + 1, n), (probs > 0).sum(axis=1))
+    return ranks < counts[:, None]
+
+
+def selection_limit(question):
+    """Most options a respondent may tick (1 for single-choice questions)"""
+    if question['question_type'] == 'single':
+        return 1
+    return max(1, min(question['max_selections'] or 1, len(question['options'])))
+
+
+def one_hot(indices, width):
+    """(len(indices), width) boolean selections with one option per row"""
+    selected = np.zeros((len(indices), width), dtype=bool)
+    selected[np.arange(len(indices)), indices] = True
+    return selected
+
+
+def selected_rows(ids, option_ids, selected):
+    """(response_id, option_id) pairs for every ticked cell of a selection matrix"""
+    rows, cols = np.nonzero(selected)
+    return zip(ids[rows].tolist(), option_ids[cols].tolist())
+
+
+def factor_for(option_text, multipliers):
+    factor = 1.0
+    for fragment, m in (multipliers or {}).items():
+        if fragment in option_text:
+            factor *= m
+    return factor
+
+
+def joint_vote_probs(config, districts, gens, vote_options):
+    """(len(districts) * len(gens), len(vote_options)) matrix of P(vote | district, gen)"""
+    base = np.array([config["vote_weights"].get(o, 1) for o in vote_options], dtype=np.float64)
+    probs = np.empty((len(districts) * len(gens), len(vote_options)))
+    for di, d in enumerate(districts):
+        for gi, g in enumerate(gens):
+            w = base * np.array([factor_for(o, config["vote_by_district"].get(d)) *
+                                 factor_for(o, config["vote_by_gen"].get(g)) for o in vote_options])
+            probs[di * len(gens) + gi] = normalize(w)
+    return probs
+
+
+def create_sample_campaign(config):
+    campaign_id = database.create_campaign("🗳️ Synthetic campaign", "generated by generate_dataset.py")
+    database.create_question(campaign_id, config["vote_question"], 'single', 1, list(config["vote_weights"].keys()))
+    for text, weights in config["other_questions"].items():
+        database.create_question(campaign_id, text, 'single', 1, list(weights.keys()))
+    return campaign_id
+
+
+def generate(campaign_id, n_responses, config=None, seed=42, progress=True):
+    """
+    Append n_responses synthetic ballots to a campaign in the current DB.
+
+    Args:
+        campaign_id: Target campaign (its questions must already exist)
+        n_responses: Number of responses to create
+        config: Distribution config (DEFAULT_CONFIG when None)
+        seed: RNG seed; identical inputs give identical rows
+    """
+    config = config or DEFAULT_CONFIG
+    rng = np.random.default_rng(seed)
+    # Questions without options cannot be answered; leave them blank
+    questions = [q for q in database.get_questions(campaign_id) if q['options']]
+    if not questions:
+        raise ValueError(f"campaign {campaign_id} has no questions with options")
+
+    demo_keys = list(config["demographics"].keys())
+    demo_values = [list(config["demographics"][k].keys()) for k in demo_keys]
+    demo_probs = [normalize(list(config["demographics"][k].values())) for k in demo_keys]
+
+    # Pre-serialized demographic JSON for every combination (a few dozen strings)
+    radices = [len(v) for v in demo_values]
+    demo_json = []
+    for code in range(int(np.prod(radices))):
+        combo, rest = {}, code
+        for key, values, radix in zip(reversed(demo_keys), reversed(demo_values), reversed(radices)):
+            combo[key] = values[rest % radix]
+            rest //= radix
+        demo_json.append(json.dumps({k: combo[k] for k in demo_keys}))
+
+    vote_q = next((q for q in questions if q['question_text'] == config.get("vote_question")), questions[0])
+    vote_options = [o['option_text'] for o in vote_q['options']]
+    district_idx = demo_keys.index("อำเภอ") if "อำเภอ" in demo_keys else None
+    gen_idx = demo_keys.index("Gen") if "Gen" in demo_keys else None
+    if district_idx is not None and gen_idx is not None:
+        vote_cells = joint_vote_probs(config, demo_values[district_idx], demo_values[gen_idx], vote_options)
+    else:
+        vote_cells = joint_vote_probs(config, [""], [""], vote_options)
+
+    other_probs = {}
+    for q in questions:
+        if q['id'] == vote_q['id']:
+            continue
+        weights = config["other_questions"].get(q['question_text'], {})
+        other_probs[q['id']] = normalize([weights.get(o['option_text'], 1) for o in q['options']])
+
+    conn = sqlite3.connect(database.DB_PATH)
+    conn.execute("PRAGMA synchronous = OFF")
+    c = conn.cursor()
+    c.execute("SELECT COALESCE(MAX(id), 0) FROM responses")
+    next_id = c.fetchone()[0] + 1
+    start_time = datetime.strptime(config.get("field_start", DEFAULT_CONFIG["field_start"]), '%Y-%m-%d %H:%M:%S')
+    field_seconds = config.get("field_hours", 10) * 3600
+    q_order = [q['id'] for q in questions]
+    opt_ids = {q['id']: np.array([o['id'] for o in q['options']]) for q in questions}
+    limits = {q['id']: selection_limit(q) for q in questions}
+
+    started = time.perf_counter()
+    done = 0
+    while done < n_responses:
+        n = min(CHUNK, n_responses - done)
+
+        # Demographics (marginals), packed into one mixed-radix code
+        codes = np.zeros(n, dtype=np.int64)
+        draws = []
+        for probs, radix in zip(demo_probs, radices):
+            d = sample_categorical(rng, probs, n)
+            draws.append(d)
+            codes = codes * radix + d
+
+        # Vote conditioned on (district, Gen)
+        if district_idx is not None and gen_idx is not None:
+            cells = draws[district_idx] * radices[gen_idx] + draws[gen_idx]
+        else:
+            cells = np.zeros(n, dtype=np.int64)
+        # answers[q_id]: (n, len(options)) boolean selections
+        answers = {}
+        if limits[vote_q['id']] > 1:
+            answers[vote_q['id']] = sample_multi(rng, vote_cells[cells], limits[vote_q['id']], n)
+        else:
+            answers[vote_q['id']] = one_hot(sample_conditional(rng, vote_cells, cells), len(vote_options))
+        for q_id, probs in other_probs.items():
+            if limits[q_id] > 1:
+                answers[q_id] = sample_multi(rng, probs, limits[q_id], n)
+            else:
+                answers[q_id] = one_hot(sample_categorical(rng, probs, n), len(probs))
+
+        # Ballot signatures: hash each distinct answer combination once
+        stacked = np.concatenate([answers[q_id] for q_id in q_order], axis=1)
+        packed, inverse = np.unique(np.packbits(stacked, axis=1), axis=0, return_inverse=True)
+        combos = np.unpackbits(packed, axis=1, count=stacked.shape[1]).astype(bool)
+        bounds = np.cumsum([0] + [len(opt_ids[q_id]) for q_id in q_order])
+        signatures = [fraud.ballot_signature({q_id: opt_ids[q_id][combo[lo:hi]].tolist()
+                                              for q_id, lo, hi in zip(q_order, bounds[:-1], bounds[1:])})
+                      for combo in combos]
+
+        ids = np.arange(next_id, next_id + n)
+        offsets = np.sort(rng.integers(0, field_seconds, n))
+        ips = rng.integers(0, 2 ** 24, n)
+        timestamps = [(start_time + timedelta(seconds=int(s))).strftime('%Y-%m-%d %H:%M:%S') for s in offsets]
+
+        c.execute("BEGIN")
+        c.executemany(
+            "INSERT INTO responses (id, campaign_id, demographic_data, ip_address, user_agent, location_data, "
+            "device_token, ballot_signature, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            ((int(rid), campaign_id, demo_json[code], f"10.{ip >> 16}.{(ip >> 8) & 255}.{ip & 255}",
+              "synthetic", "{}", f"syn-{rid}", signatures[sig], ts)
+             for rid, code, ip, sig, ts in zip(ids.tolist(), codes.tolist(), ips.tolist(),
+                                               inverse.ravel().tolist(), timestamps)))
+        c.executemany(
+            "INSERT INTO response_details (response_id, question_id, option_id) VALUES (?, ?, ?)",
+            ((rid, q_id, opt) for q_id in q_order
+             for rid, opt in selected_rows(ids, opt_ids[q_id], answers[q_id])))
+        c.execute("COMMIT")
+
+        next_id += n
+        done += n
+        if progress:
+            rate = done / (time.perf_counter() - started)
+            print(f"   ✍️  {done:,}/{n_responses:,} responses ({rate:,.0f}/s)")
+
+    conn.close()
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a large synthetic campaign")
+    parser.add_argument("--responses", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", help="SQLite file (default: data/quickpoll.db)")
+    parser.add_argument("--campaign", type=int, help="Append to an existing campaign instead of creating one")
+    parser.add_argument("--config", help="JSON overriding keys of DEFAULT_CONFIG")
+    args = parser.parse_args()
+
+    if args.db:
+        database.DB_DIR = os.path.dirname(args.db) or '.'
+        database.DB_PATH = args.db
+    database.init_db()
+    config = load_config(args.config)
+
+    campaign_id = args.campaign or create_sample_campaign(config)
+    print(f"📊 Generating {args.responses:,} responses into campaign {campaign_id} ({database.DB_PATH})")
+    start = time.perf_counter()
+    generate(campaign_id, args.responses, config, args.seed)
+    print(f"✅ Done in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Asynchronous JSON ingest API for external collectors (call centers, partner apps).
+
+    SUPERPOLL_INGEST_TOKENS="callcenter-a:s3cret,partner-b:an0ther" python ingest_service.py --port 8503
+
+Runs on asyncio (tornado, already installed with Streamlit). Requests are
+validated against cached ballot definitions (core.ballot_defs) on the
+event loop and handed to one writer thread with one SQLite connection
+(core.writer), which group-commits everything queued.
+
+    POST /v1/responses     Authorization: Bearer <token>
+                           body: one response, a list, or {"responses": [...]}
+                           (gzip bodies are accepted)
+    GET  /healthz          DB health (as /healthz of the metrics exporter)
+                           plus writer queue depth
+
+A response:
+
+    {"campaign_id": 1,
+     "key": "callcenter-a:20261019:000123",      idempotency key, 8-64 chars
+     "demographics": {"อำเภอ": "กะปง", "พื้นที่": "ในเขตเทศบาล", "Gen": "Gen Y (26-45)"},
+     "answers": {"12": [34], "13": [40, 41]},     question id -> option ids
+     "collected_at": "2026-10-19T10:15:00+07:00"} optional, ISO 8601 or epoch ms
+
+Reply (200): {"results": [{"key", "status", "response_id" | "error"}], "accepted": n,
+"duplicate": n, "invalid": n}. 'duplicate' means this partner stored the
+key before and carries the original response_id, so retries are safe.
+Keys are stored per partner (core.ballot.partner_key): partners cannot
+collide with each other or with the phones' keys. 401 without a
+valid token, 413 above MAX_ITEMS, 503 (Retry-After) when the writer queue
+is full or the database stayed locked, 500 when the write failed otherwise
+(nothing of that request was stored).
+
+Partner ballots skip the device fraud screen (one call center legitimately
+submits many) and are flagged 'partner_ingest' with the partner name as
+device token.
+"""
+
+import argparse
+import asyncio
+import hmac
+import json
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import tornado.web
+
+from core import ballot_defs, database, fraud, metrics, metrics_server
+from core.ballot import parse_answers, parse_collected_at, partner_key, valid_key
+from core.writer import BallotWriter, WriterBusy
+
+MAX_ITEMS = 1000
+MAX_BODY = 8 * 1024 * 1024
+
+
+def load_tokens(raw=None):
+    """{token: partner name} from SUPERPOLL_INGEST_TOKENS ("name:token,name:token")"""
+    raw = os.environ.get('SUPERPOLL_INGEST_TOKENS', '') if raw is None else raw
+    tokens = {}
+    for pair in raw.split(','):
+        name, _, token = pair.strip().partition(':')
+        if name and token:
+            tokens[token] = name
+    return tokens
+
+
+def authenticate(header, tokens):
+    """Partner name for 'Bearer <token>', or None"""
+    if not header or not header.startswith('Bearer '):
+        return None
+    given = header[len('Bearer '):].strip()
+    for token, name in tokens.items():
+        if hmac.compare_digest(given, token):
+            return name
+    return None
+
+
+def parse_request(body):
+    """List of response objects from a single object, a list or {"responses": [...]}"""
+    data = json.loads(body or b'null')
+    if isinstance(data, dict) and isinstance(data.get('responses'), list):
+        return data['responses']
+    if isinstance(data, dict):
+        return [data]
+    if isinstance(data, list):
+        return data
+    raise ValueError("expected a response object or a list")
+
+
+def prepare_all(entries, partner, ip_address, user_agent, now):
+    """(results, writer items) for a request; reads ballot definitions, so runs off the event loop"""
+    results, items = [], []
+    for entry in entries:
+        item, error = prepare(entry, partner, ip_address, user_agent, now)
+        key = entry.get('key') if isinstance(entry, dict) else None
+        if error:
+            results.append({"key": key, "status": "invalid", "error": error})
+        else:
+            results.append({"key": key, "status": None})
+            items.append(item)
+    return results, items
+
+
+def prepare(entry, partner, ip_address, user_agent, now):
+    """(writer item, None) or (None, error message) for one response object"""
+    if not isinstance(entry, dict):
+        return None, "response must be an object"
+    if not valid_key(entry.get('key'), partner=True):
+        return None, "key must be 8-64 characters of [A-Za-z0-9:_-]"
+    try:
+        campaign_id = int(entry.get('campaign_id'))
+    except (TypeError, ValueError):
+        return None, "campaign_id must be an integer"
+    campaign = ballot_defs.get_campaign(campaign_id)
+    if not campaign or not campaign['is_active']:
+        return None, f"campaign {campaign_id} not found or closed"
+
+    questions = ballot_defs.get_questions(campaign)
+    demo_data, answers, error = parse_answers(questions, entry.get('demographics'), entry.get('answers'))
+    if error:
+        return None, error
+    device_token = f"partner:{partner}"
+    return {
+        "campaign_id": campaign_id,
+        "key": partner_key(partner, entry['key']),
+        "demographic_data": demo_data,
+        "answers": answers,
+        "collected_at": parse_collected_at(entry.get('collected_at'), now),
+        "ip_address": ip_address,
+        "user_agent": user_agent,
+        "location_data": None,
+        "device_token": device_token,
+        "verdict": {"device_hash": fraud.device_fingerprint(ip_address, user_agent, device_token),
+                    "reasons": ["partner_ingest"]},
+    }, None
+
+
+class ResponsesHandler(tornado.web.RequestHandler):
+    def initialize(self, writer, tokens):
+        self.writer = writer
+        self.tokens = tokens
+
+    async def post(self):
+        partner = authenticate(self.request.headers.get('Authorization'), self.tokens)
+        if partner is None:
+            return self.reply(401, {"error": "invalid or missing bearer token"})
+        try:
+            entries = parse_request(self.request.body)
+        except ValueError as e:
+            return self.reply(400, {"error": f"invalid JSON: {e}"})
+        if len(entries) > MAX_ITEMS:
+            return self.reply(413, {"error": f"at most {MAX_ITEMS} responses per request"})
+
+        ip_address = self.request.remote_ip
+        user_agent = self.request.headers.get('User-Agent', 'Unknown')
+        # Campaign lookups may hit SQLite: keep them off the event loop
+        results, items = await asyncio.get_running_loop().run_in_executor(
+            None, prepare_all, entries, partner, ip_address, user_agent, time.time())
+
+        if items:
+            try:
+                stored = await asyncio.wrap_future(self.writer.submit(items))
+            except (WriterBusy, sqlite3.OperationalError):
+                self.set_header("Retry-After", "1")
+                return self.reply(503, {"error": "ingest queue full or database busy, retry shortly"})
+            except sqlite3.Error as e:
+                return self.reply(500, {"error": f"responses not stored: {e}"})
+            pending = iter(stored)
+            for result in results:
+                if result["status"] is None:
+                    result["status"], result["response_id"] = next(pending)
+                    # Archived while the request was on its way
+                    if result["status"] == "closed":
+                        del result["response_id"]
+                        result.update(status="invalid", error="campaign not found or closed")
+
+        summary = {"results": results}
+        for status in ("accepted", "duplicate", "invalid"):
+            summary[status] = sum(1 for r in results if r["status"] == status)
+            if summary[status]:
+                metrics.inc("superpoll_ingest_items_total", summary[status], source="partner", result=status)
+        self.reply(200, summary)
+
+    def reply(self, status, data):
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json; charset=utf-8")
+        self.finish(json.dumps(data, ensure_ascii=False))
+
+
+class HealthHandler(tornado.web.RequestHandler):
+    def initialize(self, writer):
+        self.writer = writer
+
+    def get(self):
+        ok, report = metrics_server.health()
+        report.update(writer_queue=self.writer.depth(), writer_groups=self.writer.groups,
+                      writer_written=self.writer.written)
+        self.set_status(200 if ok else 503)
+        self.set_header("Content-Type", "application/json")
+        self.finish(json.dumps(report))
+
+
+def make_app(writer, tokens=None):
+    tokens = load_tokens() if tokens is None else tokens
+    return tornado.web.Application([
+        (r"/v1/responses", ResponsesHandler, {"writer": writer, "tokens": tokens}),
+        (r"/healthz", HealthHandler, {"writer": writer}),
+    ], decompress_request=True)
+
+
+async def serve(host, port):
+    tokens = load_tokens()
+    if not tokens:
+        print("⚠️ SUPERPOLL_INGEST_TOKENS is empty: every request will get 401")
+    writer = BallotWriter().start()
+    make_app(writer, tokens).listen(port, address=host, max_body_size=MAX_BODY)
+    print(f"Ingest API on http://{host}:{port}/v1/responses ({len(tokens)} partner token(s))")
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SuperPoll JSON ingest API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8503)
+    args = parser.parse_args()
+
+    database.init_db()
+    metrics_server.ensure_started()
+    asyncio.run(serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
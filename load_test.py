@@ -0,0 +1,543 @@
+"""
+Load-testing harness for the voter flow.
+
+Three targets:
+- db:     N concurrent voters call core.database.submit_response directly
+- http:   N concurrent voters drive the Streamlit voter page over its websocket
+          (/_stcore/stream), sending ballot component taps and pressing submit
+- ingest: N responses are POSTed to ingest_service.py (/v1/responses) in
+          batches of --batch, --concurrency requests in flight
+
+Ballots are drawn from a configurable profile (demographic and vote weights,
+default mirrors the Phang Nga field plan). Reports latency percentiles,
+throughput and error / lock-error rates.
+
+Usage:
+    python load_test.py db --voters 500 --concurrency 20
+    python load_test.py db --db /tmp/load.db --campaign 1 --voters 2000
+    python load_test.py http --url http://localhost:8501 --poll 1 --voters 50 --concurrency 10
+    python load_test.py http --poll 1 --voters 50 --voter-mode client
+    python load_test.py db --profile my_profile.json --json results.json
+    python load_test.py ingest --url http://localhost:8503 --poll 1 --voters 20000 --batch 100 --token s3cret
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core import database
+from core.ballot import DEMO_SECTIONS, MESSAGES, demo_card_id, demo_section_key, question_section_key
+
+# Default voter profile (weights, not percentages)
+DEFAULT_PROFILE = {
+    "demographics": {
+        "อำเภอ": {"ตะกั่วป่า": 127, "ท้ายเหมือง": 124, "คุระบุรี": 72, "กะปง": 37},
+        "พื้นที่": {"ในเขตเทศบาล": 60, "นอกเขตเทศบาล": 300},
+        "Gen": {"Gen Z (18-25)": 18, "Gen Y (26-45)": 35, "Gen X (46-60)": 30, "Baby Boomer (60+)": 15},
+    },
+    # Option text fragment -> weight; options that match nothing get weight 1
+    "votes": {
+        "เบอร์ 1": 15,
+        "เบอร์ 2": 8,
+        "เบอร์ 3": 35,
+        "เบอร์ 4": 25,
+        "เบอร์ 5": 12,
+        "ยังไม่ตัดสินใจ": 5,
+    },
+}
+
+SAMPLE_QUESTIONS = [
+    ("🗳️ หากวันนี้เป็นวันเลือกตั้ง ท่านจะกาคะแนนให้ใคร?", [
+        "เบอร์ 1 น.ส.พิจิกา - พรรคเพื่อไทย",
+        "เบอร์ 2 นายสมควร - พรรคกล้าธรรม",
+        "เบอร์ 3 นายฉกาจ - พรรคภูมิใจไทย",
+        "เบอร์ 4 นายกุศล - พรรคประชาธิปัตย์",
+        "เบอร์ 5 นายธีรุตม์ - พรรคประชาชน",
+        "ยังไม่ตัดสินใจ",
+    ]),
+    ("📋 เหตุผลหลักที่ท่านเลือกหมายเลขนี้?", [
+        "เลือกที่ \"ตัวบุคคล\" (ผลงาน/ความดี/คนพื้นที่)",
+        "เลือกที่ \"พรรคการเมือง\" (นโยบาย/หัวหน้าพรรค)",
+        "ต้องการ \"ความเปลี่ยนแปลง\"",
+    ]),
+]
+
+
+# --- Profile & ballots ---
+def load_profile(path):
+    if not path:
+        return DEFAULT_PROFILE
+    with open(path, encoding='utf-8') as f:
+        profile = json.load(f)
+    return {
+        "demographics": profile.get("demographics", DEFAULT_PROFILE["demographics"]),
+        "votes": profile.get("votes", DEFAULT_PROFILE["votes"]),
+    }
+
+
+def weighted_choice(rng, weights_dict):
+    items = list(weights_dict.keys())
+    return rng.choices(items, weights=list(weights_dict.values()), k=1)[0]
+
+
+def option_weight(option_text, vote_weights):
+    for fragment, weight in vote_weights.items():
+        if fragment in option_text:
+            return weight
+    return 1
+
+
+def build_ballot(rng, questions, profile):
+    """Draw (demographic_data, answers) for one simulated voter"""
+    demo = {key: weighted_choice(rng, weights) for key, weights in profile["demographics"].items()}
+    answers = {}
+    for q in questions:
+        opts = q['options']
+        if not opts:
+            continue
+        weights = [option_weight(o['option_text'], profile["votes"]) for o in opts]
+        k = q['max_selections'] if q['question_type'] == 'multi' else 1
+        picked = []
+        for _ in range(min(k, len(opts))):
+            choice = rng.choices(opts, weights=weights, k=1)[0]
+            if choice['id'] not in picked:
+                picked.append(choice['id'])
+            if q['question_type'] != 'multi':
+                break
+        answers[q['id']] = picked
+    return demo, answers
+
+
+# --- Reporting ---
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[idx]
+
+
+def summarize(mode, latencies, errors, lock_errors, elapsed, attempts):
+    lat = sorted(latencies)
+    ms = lambda v: round(v * 1000, 2)
+    return {
+        "mode": mode,
+        "attempts": attempts,
+        "succeeded": len(latencies),
+        "errors": errors,
+        "lock_errors": lock_errors,
+        "error_rate": round(errors / attempts, 4) if attempts else 0,
+        "lock_error_rate": round(lock_errors / attempts, 4) if attempts else 0,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0,
+        "latency_ms": {
+            "min": ms(lat[0]) if lat else 0,
+            "p50": ms(percentile(lat, 50)),
+            "p90": ms(percentile(lat, 90)),
+            "p95": ms(percentile(lat, 95)),
+            "p99": ms(percentile(lat, 99)),
+            "max": ms(lat[-1]) if lat else 0,
+        },
+    }
+
+
+def print_report(report):
+    print("\n" + "=" * 60)
+    print(f"📈 Load test ({report['mode']})")
+    print(f"   attempts: {report['attempts']}  ok: {report['succeeded']}  errors: {report['errors']}  "
+          f"lock errors: {report['lock_errors']} ({report['lock_error_rate']:.2%})")
+    print(f"   elapsed: {report['elapsed_s']}s  throughput: {report['throughput_per_s']}/s")
+    lat = report['latency_ms']
+    print(f"   latency ms  p50={lat['p50']}  p90={lat['p90']}  p95={lat['p95']}  p99={lat['p99']}  max={lat['max']}")
+    for key, value in report.items():
+        if key.endswith('_latency_ms'):
+            print(f"   {key}: p50={value['p50']} p95={value['p95']} p99={value['p99']}")
+    if 'responses_per_s' in report:
+        print(f"   responses: {report['responses_accepted']} accepted, {report['responses_duplicate']} duplicate, "
+              f"{report['responses_invalid']} invalid in batches of {report['batch_size']}  "
+              f"→ {report['responses_per_s']} responses/s  (503 busy: {report['requests_rejected_busy']})")
+    if 'submits_rate_limited' in report:
+        print(f"   refused submits: {report['submits_rate_limited']} rate limited, "
+              f"{report['submits_rejected']} rejected, {report['submits_invalid']} invalid")
+    if 'deltas_per_rerun' in report:
+        print(f"   reruns per voter: {report['reruns_per_voter']}  "
+              f"per rerun: {report['deltas_per_rerun']} deltas, {report['kb_per_rerun']} KB")
+    print("=" * 60)
+
+
+# --- DB target ---
+def setup_sample_campaign():
+    campaign_id = database.create_campaign("Load test campaign", "generated by load_test.py")
+    for text, options in SAMPLE_QUESTIONS:
+        database.create_question(campaign_id, text, 'single', 1, options)
+    return campaign_id
+
+
+def run_db(args, profile):
+    if args.db:
+        database.DB_PATH = args.db
+        database.DB_DIR = os.path.dirname(args.db) or '.'
+    else:
+        tmp_dir = tempfile.mkdtemp(prefix="superpoll_load_")
+        database.DB_DIR = tmp_dir
+        database.DB_PATH = os.path.join(tmp_dir, "load.db")
+    database.init_db()
+
+    campaign_id = args.campaign or setup_sample_campaign()
+    questions = database.get_questions(campaign_id)
+    if not questions:
+        print(f"❌ Campaign {campaign_id} has no questions")
+        return None
+    print(f"🗄️  DB: {database.DB_PATH}  campaign: {campaign_id}  questions: {len(questions)}")
+
+    rng_lock = threading.Lock()
+    rng = random.Random(args.seed)
+    counters = {"errors": 0, "lock_errors": 0}
+    latencies = []
+
+    def vote(i):
+        with rng_lock:
+            demo, answers = build_ballot(rng, questions, profile)
+        # Distinct fake device per voter so the fraud screen does not reject bursts
+        ip = f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}"
+        start = time.perf_counter()
+        try:
+            ok = database.submit_response(campaign_id, demo, answers, ip_address=ip,
+                                          user_agent="superpoll-load-test", location_data={},
+                                          device_token=f"load-{i}")
+        except sqlite3.OperationalError as e:
+            with rng_lock:
+                counters["errors"] += 1
+                if "locked" in str(e) or "busy" in str(e):
+                    counters["lock_errors"] += 1
+            return
+        except Exception:
+            with rng_lock:
+                counters["errors"] += 1
+            return
+        elapsed = time.perf_counter() - start
+        with rng_lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                counters["errors"] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(vote, range(args.voters)))
+    elapsed = time.perf_counter() - start
+    return summarize("db", latencies, counters["errors"], counters["lock_errors"], elapsed, args.voters)
+
+
+# --- HTTP / websocket target ---
+class StreamlitVoter:
+    """Minimal Streamlit websocket client: reruns the script, taps buttons and components"""
+
+    def __init__(self, base_url, poll_id, voter_mode="tap"):
+        self.ws_url = base_url.replace("http://", "ws://").replace("https://", "wss://").rstrip('/') + "/_stcore/stream"
+        self.query_string = f"poll={poll_id}&mode={voter_mode}"
+        self.conn = None
+        self.buttons = {}     # widget id -> label
+        self.components = {}  # widget id -> component name
+        self.alerts = []      # (Alert.Format, body) of the last script run
+        self.exceptions = 0
+        self.lock_errors = 0  # script exceptions from a locked / busy database
+        self.seq = 0
+        self.reruns = 0
+        self.deltas = 0       # delta messages received, all reruns
+        self.bytes = 0        # websocket bytes received, all reruns
+
+    async def connect(self):
+        from tornado.websocket import websocket_connect
+        self.conn = await websocket_connect(self.ws_url, max_message_size=64 * 1024 * 1024)
+
+    async def rerun(self, trigger_id=None, component=None):
+        """
+        Send a rerun and wait for the final script run.
+
+        trigger_id presses one button; component=(widget id, value) sets a
+        component's JSON value as if the iframe had called setComponentValue.
+        """
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        msg = BackMsg()
+        msg.rerun_script.query_string = self.query_string
+        if trigger_id:
+            widget = msg.rerun_script.widget_states.widgets.add()
+            widget.id = trigger_id
+            widget.trigger_value = True
+        if component:
+            widget = msg.rerun_script.widget_states.widgets.add()
+            widget.id = component[0]
+            widget.json_value = json.dumps(component[1])
+        await self.conn.write_message(msg.SerializeToString(), binary=True)
+
+        self.buttons = {}
+        self.components = {}
+        self.alerts = []
+        self.reruns += 1
+        while True:
+            raw = await self.conn.read_message()
+            if raw is None:
+                raise ConnectionError("websocket closed")
+            self.bytes += len(raw)
+            fwd = ForwardMsg()
+            fwd.ParseFromString(raw)
+            kind = fwd.WhichOneof('type')
+            if kind == 'new_session':
+                # Each script run starts with new_session; st.rerun() starts another
+                self.buttons = {}
+                self.components = {}
+                self.alerts = []
+            if kind == 'delta':
+                self.deltas += 1
+            if kind == 'delta' and fwd.delta.WhichOneof('type') == 'new_element':
+                element = fwd.delta.new_element
+                etype = element.WhichOneof('type')
+                if etype == 'button':
+                    self.buttons[element.button.id] = element.button.label
+                elif etype == 'component_instance':
+                    self.components[element.component_instance.id] = element.component_instance.component_name
+                elif etype == 'alert':
+                    self.alerts.append((element.alert.format, element.alert.body))
+                elif etype == 'exception':
+                    self.exceptions += 1
+                    message = element.exception.message
+                    if "locked" in message or "busy" in message:
+                        self.lock_errors += 1
+            elif kind == 'script_finished' and fwd.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                return
+
+    def find_buttons(self, key):
+        """Widget ids end with '-<user key>'"""
+        return [wid for wid in self.buttons if wid.endswith(f"-{key}")]
+
+    async def send_event(self, component_key, event):
+        """One setComponentValue from the ballot component"""
+        matches = [wid for wid in self.components if wid.endswith(f"-{component_key}")]
+        if not matches:
+            raise RuntimeError(f"component {component_key!r} not found")
+        self.seq += 1
+        await self.rerun(component=(matches[0], dict(event, seq=self.seq)))
+
+    async def tap(self, component_key, section, option):
+        await self.send_event(component_key, {"event": "tap", "section": section, "option": option})
+
+    def submit_outcome(self):
+        """
+        What the page said after a submit: 'ok' (the thank-you message),
+        'rate_limited', 'rejected' (fraud screen) or 'invalid'.
+        """
+        from streamlit.proto.Alert_pb2 import Alert
+
+        errors = [body for fmt, body in self.alerts if fmt == Alert.ERROR and body]
+        if not errors and any(fmt == Alert.SUCCESS for fmt, _ in self.alerts):
+            return "ok"
+        # A leading emoji arrives as the alert's icon, not in its body
+        for outcome, message in (("rate_limited", MESSAGES["rate_limited"]), ("rejected", MESSAGES["device_rejected"])):
+            if any(message.endswith(body) for body in errors):
+                return outcome
+        return "invalid"
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+
+
+async def http_voter(args, rng, questions, profile, stats):
+    voter = StreamlitVoter(args.url, args.poll, args.voter_mode)
+    start_total = time.perf_counter()
+    try:
+        await voter.connect()
+        t = time.perf_counter()
+        await voter.rerun()
+        stats["load"].append(time.perf_counter() - t)
+
+        demo, answers = build_ballot(rng, questions, profile)
+        # (section key, card id) as the voter page lays them out (core.ballot)
+        taps = []
+        for _, key, options in DEMO_SECTIONS:
+            if demo.get(key) in options:
+                taps.append((demo_section_key(key), demo_card_id(key, options.index(demo[key]))))
+        for q_id, option_ids in answers.items():
+            taps.extend((question_section_key(q_id), str(opt_id)) for opt_id in option_ids)
+
+        if args.voter_mode == "client":
+            # Selection stays in the browser: one submit event carries the whole ballot
+            selected = {}
+            for section_key, card_id in taps:
+                selected.setdefault(section_key, []).append(card_id)
+            t = time.perf_counter()
+            await voter.send_event("ballot", {"event": "submit", "selected": selected})
+            stats["submit"].append(time.perf_counter() - t)
+        else:
+            for section_key, card_id in taps:
+                t = time.perf_counter()
+                await voter.tap("ballot", section_key, card_id)
+                stats["tap"].append(time.perf_counter() - t)
+
+            submit = [wid for wid, label in voter.buttons.items() if label == "ส่งคำตอบ"]
+            if not submit:
+                raise RuntimeError("submit button not found")
+            t = time.perf_counter()
+            await voter.rerun(submit[0])
+            stats["submit"].append(time.perf_counter() - t)
+        outcome = voter.submit_outcome()
+        if outcome == "ok":
+            stats["voter"].append(time.perf_counter() - start_total)
+        else:
+            stats[outcome] += 1
+            stats["errors"] += 1
+        stats["exceptions"] += voter.exceptions
+        stats["lock_errors"] += voter.lock_errors
+        stats["reruns"] += voter.reruns
+        stats["deltas"] += voter.deltas
+        stats["bytes"] += voter.bytes
+    except Exception:
+        stats["errors"] += 1
+    finally:
+        voter.close()
+
+
+async def run_http_async(args, profile):
+    # Ballot definitions are read straight from the DB the server uses
+    if args.db:
+        database.DB_PATH = args.db
+    questions = database.get_questions(args.poll)
+    rng = random.Random(args.seed)
+    stats = {"load": [], "tap": [], "submit": [], "voter": [], "errors": 0, "exceptions": 0, "lock_errors": 0,
+             "rate_limited": 0, "rejected": 0, "invalid": 0, "reruns": 0, "deltas": 0, "bytes": 0}
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def one():
+        async with sem:
+            await http_voter(args, rng, questions, profile, stats)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(args.voters)))
+    elapsed = time.perf_counter() - start
+
+    report = summarize("http", stats["voter"], stats["errors"], stats["lock_errors"], elapsed, args.voters)
+    for phase in ("load", "tap", "submit"):
+        if not stats[phase]:
+            continue
+        report[f"{phase}_latency_ms"] = summarize(phase, stats[phase], 0, 0, elapsed, len(stats[phase]))["latency_ms"]
+    report["script_exceptions"] = stats["exceptions"]
+    # Submits the page refused (counted in errors): every voter shares the harness's IP,
+    # so the per-IP rate limit shows up here first
+    report["submits_rate_limited"] = stats["rate_limited"]
+    report["submits_rejected"] = stats["rejected"]
+    report["submits_invalid"] = stats["invalid"]
+    if stats["reruns"]:
+        report["reruns_per_voter"] = round(stats["reruns"] / max(1, len(stats["voter"])), 1)
+        report["deltas_per_rerun"] = round(stats["deltas"] / stats["reruns"], 1)
+        report["kb_per_rerun"] = round(stats["bytes"] / stats["reruns"] / 1024, 1)
+    return report
+
+
+# --- Ingest API target ---
+async def run_ingest_async(args, profile):
+    from tornado.httpclient import AsyncHTTPClient, HTTPClientError
+
+    if args.db:
+        database.DB_PATH = args.db
+    questions = database.get_questions(args.poll)
+    if not questions:
+        print(f"❌ Campaign {args.poll} has no questions")
+        return None
+    rng = random.Random(args.seed)
+    run_id = f"load{int(time.time())}"
+    batches = []
+    for start_i in range(0, args.voters, args.batch):
+        batch = []
+        for i in range(start_i, min(args.voters, start_i + args.batch)):
+            demo, answers = build_ballot(rng, questions, profile)
+            batch.append({"campaign_id": args.poll, "key": f"{run_id}:{i}", "demographics": demo,
+                          "answers": {str(q_id): opts for q_id, opts in answers.items()}})
+        batches.append(json.dumps({"responses": batch}, ensure_ascii=False))
+
+    client = AsyncHTTPClient(max_clients=args.concurrency)
+    url = args.url.rstrip('/') + "/v1/responses"
+    headers = {"Authorization": f"Bearer {args.token}", "Content-Type": "application/json"}
+    sem = asyncio.Semaphore(args.concurrency)
+    latencies, counts = [], {"errors": 0, "busy": 0, "accepted": 0, "duplicate": 0, "invalid": 0}
+
+    async def send(body):
+        async with sem:
+            t = time.perf_counter()
+            try:
+                resp = await client.fetch(url, method="POST", body=body, headers=headers, request_timeout=60)
+            except HTTPClientError as e:
+                counts["busy" if e.code == 503 else "errors"] += 1
+                return
+            except Exception:
+                counts["errors"] += 1
+                return
+            latencies.append(time.perf_counter() - t)
+            result = json.loads(resp.body)
+            for status in ("accepted", "duplicate", "invalid"):
+                counts[status] += result.get(status, 0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(send(body) for body in batches))
+    elapsed = time.perf_counter() - start
+
+    report = summarize("ingest", latencies, counts["errors"] + counts["busy"], 0, elapsed, len(batches))
+    report["batch_size"] = args.batch
+    report["responses_accepted"] = counts["accepted"]
+    report["responses_duplicate"] = counts["duplicate"]
+    report["responses_invalid"] = counts["invalid"]
+    report["requests_rejected_busy"] = counts["busy"]
+    report["responses_per_s"] = round(counts["accepted"] / elapsed, 1) if elapsed > 0 else 0
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SuperPoll load-testing harness")
+    parser.add_argument("mode", choices=["db", "http", "ingest"])
+    parser.add_argument("--voters", type=int, default=200, help="Total simulated voters")
+    parser.add_argument("--concurrency", type=int, default=10, help="Voters in flight at once")
+    parser.add_argument("--db", help="SQLite file (db mode: default is a fresh temp DB)")
+    parser.add_argument("--campaign", type=int, help="Existing campaign id (db mode)")
+    parser.add_argument("--url", help="Streamlit base URL (http mode, default :8501) or ingest API (ingest mode, default :8503)")
+    parser.add_argument("--poll", type=int, default=1, help="Poll id to vote in (http / ingest mode)")
+    parser.add_argument("--voter-mode", choices=["tap", "client"], default="tap",
+                        help="Ballot mode to drive (http mode): a rerun per tap, or one submit")
+    parser.add_argument("--batch", type=int, default=50, help="Responses per request (ingest mode)")
+    parser.add_argument("--token", default="", help="Partner bearer token (ingest mode)")
+    parser.add_argument("--profile", help="JSON file with 'demographics' and 'votes' weights")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="Write the report to this JSON file")
+    args = parser.parse_args()
+
+    profile = load_profile(args.profile)
+    if args.mode == "db":
+        report = run_db(args, profile)
+    elif args.mode == "ingest":
+        args.url = args.url or "http://localhost:8503"
+        report = asyncio.run(run_ingest_async(args, profile))
+    else:
+        args.url = args.url or "http://localhost:8501"
+        report = asyncio.run(run_http_async(args, profile))
+    if not report:
+        sys.exit(1)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 Saved report to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""
+Start Streamlit with the metrics exporter running in the same process.
+
+    SUPERPOLL_METRICS_PORT=9108 python serve.py --server.port=8501
+
+Arguments are passed through to `streamlit run app.py`. Starting the
+exporter here (rather than on the first page view) means /healthz answers
+as soon as the container is up.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core import database, metrics_server
+
+
+def main():
+    database.init_db()
+    metrics_server.ensure_started()
+    from streamlit.web import cli as stcli
+    sys.argv = ["streamlit", "run", "app.py"] + sys.argv[1:]
+    sys.exit(stcli.main())
+
+
+if __name__ == "__main__":
+    main()
@@ -8,32 +8,27 @@ from datetime import datetime
 
 # Core Modules
 from core.database import (
-    create_campaign, get_campaign, get_all_campaigns, update_campaign,
+    create_campaign, get_campaign, get_campaign_summaries, update_campaign,
     delete_campaign, toggle_campaign_status, create_question, get_questions,
-    update_question, delete_question, get_results, get_response_count,
+    update_question, delete_question, reorder_question, set_question_order, get_results, get_response_count,
     export_responses_data, get_vote_statistics, get_demographic_breakdown,
-    reset_responses, get_voter_logs, DEMOGRAPHIC_OPTIONS
+    reset_responses, get_voter_logs, get_submission_clusters, get_archive_info, get_pending_deletes,
+    DEMOGRAPHIC_OPTIONS, QUOTA_TARGETS
 )
 from core.auth import check_login, login_user, logout_user
+from core.config import load_config, save_config, VOTER_MODES
+from core import aggregates, archive, backup, cascade, metrics
+from core.ratelimit import limiter
 
 # Chart Helpers
 from views.charts_helper import (
     create_pie_chart, create_bar_chart, create_demographic_bar_chart,
-    create_live_counter
+    create_gauge_chart, create_live_counter, cached_figure, payload_sizes, LITE_BUILDERS
 )
+from views.render_profiler import section
+from views.static_export import export_zip
 
 # --- Configuration Helpers ---
-def load_config():
-    if os.path.exists('config.json'):
-         try:
-             with open('config.json') as f: return json.load(f)
-         except: pass
-    return {"base_url": "http://localhost:8501"}
-
-def save_config(config):
-    with open('config.json', 'w') as f:
-        json.dump(config, f)
-
 def get_image_options():
     uploads_dir = "static/uploads"
     if not os.path.exists(uploads_dir): return []
@@ -48,12 +43,42 @@ def render_settings():
     with st.form("settings_form"):
         st.info("ℹ️ กำหนด URL หลักของระบบเพื่อใช้ในการสร้าง QR Code")
         base_url = st.text_input("Base URL", value=config.get('base_url', 'http://localhost:8501'))
+        voter_mode = st.radio(
+            "โหมดหน้าโหวต (Voter Mode)", VOTER_MODES,
+            index=VOTER_MODES.index(config['voter_mode']) if config['voter_mode'] in VOTER_MODES else 0,
+            format_func=lambda m: {"tap": "tap — ส่งทุกการแตะไปที่เซิร์ฟเวอร์",
+                                   "client": "client — เลือกในเบราว์เซอร์ ส่งครั้งเดียวตอนกดส่งคำตอบ (แนะนำช่วงคนเยอะ)"}[m],
+        )
         if st.form_submit_button("💾 บันทึก", type="primary"):
             if base_url.endswith('/'): base_url = base_url[:-1]
-            save_config({"base_url": base_url})
+            save_config(dict(config, base_url=base_url, voter_mode=voter_mode))
             st.success("บันทึกเรียบร้อย")
             time.sleep(1)
             st.rerun()
+    render_backups()
+
+def render_backups():
+    st.markdown("### 💾 สำรองข้อมูล (Backup)")
+    st.caption("สำรองแบบออนไลน์ด้วย sqlite3 backup API ระหว่างที่ยังรับโหวตได้ตามปกติ "
+               "ตั้งเวลาอัตโนมัติด้วย `python -m core.backup --every 3600` (service `backup` ใน docker-compose)")
+    status = backup.last_status()
+    if status and status['ok']:
+        st.caption(f"ครั้งล่าสุด: {datetime.fromtimestamp(status['finished_at']):%Y-%m-%d %H:%M:%S} | "
+                   f"{status['bytes'] / 1024 / 1024:,.1f} MB | {status['seconds']:.2f} วินาที | {status['mode']}")
+    elif status:
+        st.error(f"สำรองข้อมูลครั้งล่าสุดล้มเหลว: {status['error']}")
+    if st.button("💾 สำรองข้อมูลตอนนี้"):
+        with st.spinner("กำลังสำรองข้อมูล..."):
+            status = backup.run_once()
+        if status['ok']:
+            st.success(f"✅ {status['path']} ({status['bytes'] / 1024 / 1024:,.1f} MB, {status['seconds']:.2f} วินาที)")
+        else:
+            st.error(status['error'])
+    snapshots = backup.list_snapshots()
+    if snapshots:
+        st.dataframe(pd.DataFrame([{"ไฟล์": os.path.basename(s['path']), "เวลา": s['created'],
+                                    "ขนาด (MB)": round(s['bytes'] / 1024 / 1024, 2)} for s in snapshots]),
+                     use_container_width=True, hide_index=True)
 
 def render_media_gallery():
     st.markdown("## 🖼️ คลังรูปภาพ")
@@ -87,8 +112,58 @@ def render_media_gallery():
                     st.image(images[i+j], use_container_width=True)
                     st.text_input("Path", value=images[i+j], key=f"img_{i+j}", label_visibility="collapsed")
 
+def render_performance():
+    st.markdown("## ⏱️ Performance")
+    
+    c1, c2 = st.columns([3, 1])
+    enabled = c1.toggle("บันทึกเวลาการทำงานของฐานข้อมูล (Instrumentation)", value=metrics.is_enabled())
+    if enabled != metrics.is_enabled():
+        metrics.enable() if enabled else metrics.disable()
+        st.rerun()
+    if c2.button("🧹 ล้างสถิติ", use_container_width=True):
+        metrics.reset()
+        st.rerun()
+    
+    if not enabled:
+        st.info("ℹ️ ปิดอยู่ (ไม่มีค่าใช้จ่ายด้านประสิทธิภาพ) — เปิดเพื่อเริ่มเก็บสถิติ หรือตั้งค่า SUPERPOLL_METRICS=1")
+    
+    # Rate limiter counters
+    rl = limiter.stats()
+    m1, m2 = st.columns(2)
+    m1.metric("Submit ที่ผ่าน Rate Limit", f"{rl['accepted']:,}")
+    m2.metric("Submit ที่ถูกปฏิเสธ", f"{rl['rejected']:,}")
+    
+    snap = metrics.snapshot()
+    cols = ["calls", "rows", "errors", "total_ms", "mean_ms", "p50_ms", "p95_ms", "p99_ms"]
+    
+    st.markdown("### 🧮 Database Functions")
+    if snap['functions']:
+        st.dataframe(pd.DataFrame(snap['functions'])[["function", "campaign"] + cols], use_container_width=True)
+    else:
+        st.caption("ยังไม่มีข้อมูล")
+    
+    st.markdown("### 🗄️ SQL Statements")
+    if snap['statements']:
+        st.dataframe(pd.DataFrame(snap['statements'])[["statement"] + cols], use_container_width=True)
+    else:
+        st.caption("ยังไม่มีข้อมูล")
+    
+    d1, d2 = st.columns(2)
+    d1.download_button("📥 Prometheus (.txt)", metrics.to_prometheus().encode('utf-8'), "superpoll_metrics.txt", "text/plain", use_container_width=True)
+    d2.download_button("📥 JSON", metrics.to_json().encode('utf-8'), "superpoll_metrics.json", "application/json", use_container_width=True)
+
 # --- Campaign Detail Views ---
 def render_question_builder(campaign_id):
+    # Archived results are labelled with the questions as they were: read-only until restored
+    with section("db", "get_archive_info"):
+        archived = get_archive_info(campaign_id) is not None
+    if archived:
+        st.info("🗄️ แคมเปญนี้อยู่ในคลัง แก้ไขคำถามไม่ได้จนกว่าจะกู้คืน (แท็บผลลัพธ์)")
+        for i, q in enumerate(get_questions(campaign_id)):
+            st.markdown(f"**{i+1}. {q['question_text']}**")
+            st.caption(" | ".join(o['option_text'] for o in q['options']))
+        return
+
     # State for Editing
     if 'edit_q_id' not in st.session_state: st.session_state.edit_q_id = None
     
@@ -125,6 +200,7 @@ def render_question_builder(campaign_id):
                 d_opts_adv = []
                 for o in current_q['options']:
                     d_opts_adv.append({
+                        "id": o['id'],
                         "text": o['option_text'],
                         "image_url": o.get('image_url'),
                         "bg_color": o.get('bg_color') or "#ffffff"
@@ -191,6 +267,8 @@ def render_question_builder(campaign_id):
                     st.image(img, width=100)
 
             final_opts_data.append({
+                # Keeps the option's id (and its votes) through update_question
+                "id": d_opts_adv[i].get('id') if i < len(d_opts_adv) else None,
                 "text": txt,
                 "image_url": img if img else None,
                 "bg_color": col
@@ -245,7 +323,8 @@ def render_question_builder(campaign_id):
     # --- 2. Question List ---
     st.markdown("---")
     st.markdown("### 📋 รายการคำถามปัจจุบัน")
-    qs = get_questions(campaign_id)
+    with section("db", "get_questions"):
+        qs = get_questions(campaign_id)
     if not qs:
         st.info("ยังไม่มีแคมเปญคำถาม")
     else:
@@ -269,7 +348,7 @@ def render_question_builder(campaign_id):
                 """, unsafe_allow_html=True)
                 
                 # Inline actions
-                c1, c2, c3 = st.columns([8, 1, 1])
+                c1, c_up, c_down, c2, c3 = st.columns([6, 1, 1, 1, 1])
                 
                 with c1:
                     opt_previews = []
@@ -278,22 +357,87 @@ def render_question_builder(campaign_id):
                         opt_previews.append(f"{dot}{o['option_text']}")
                     st.caption(" | ".join(opt_previews), unsafe_allow_html=True)
 
+                if c_up.button("⬆️", key=f"up_ql_{q['id']}", help="เลื่อนขึ้น", disabled=i == 0):
+                    reorder_question(q['id'], 'up')
+                    st.rerun()
+                if c_down.button("⬇️", key=f"down_ql_{q['id']}", help="เลื่อนลง", disabled=i == len(qs) - 1):
+                    reorder_question(q['id'], 'down')
+                    st.rerun()
+
                 if c2.button("✏️", key=f"edit_ql_{q['id']}", help="แก้ไข"):
                     st.session_state.edit_q_id = q['id']
                     st.rerun()
                 
                 if c3.button("🗑️", key=f"del_ql_{q['id']}", help="ลบ"):
-                    delete_question(q['id'])
+                    if not delete_question(q['id']):
+                        cascade.worker.kick()
                     if st.session_state.get('edit_q_id') == q['id']: st.session_state.edit_q_id = None
                     st.rerun()
                 
                 st.markdown("<br>", unsafe_allow_html=True)
 
+        if len(qs) > 2:
+            render_question_order(campaign_id, qs)
+
+def render_question_order(campaign_id, qs):
+    """Reorder many questions at once: edit the numbers, saved in one transaction"""
+    with st.expander("↕️ จัดลำดับหลายข้อพร้อมกัน"):
+        df = pd.DataFrame({"ลำดับ": range(1, len(qs) + 1), "คำถาม": [q['question_text'] for q in qs],
+                           "id": [q['id'] for q in qs]})
+        # Keyed on the current order, so saved edits are not replayed onto the new one
+        order_key = "-".join(str(q['id']) for q in qs)
+        edited = st.data_editor(df, key=f"q_order_{campaign_id}_{order_key}", hide_index=True, disabled=["คำถาม", "id"],
+                                column_config={"id": None})
+        if st.button("💾 บันทึกลำดับ", key=f"save_q_order_{campaign_id}"):
+            # Ties keep the current order
+            order = edited.sort_values("ลำดับ", kind="stable")["id"].tolist()
+            if set_question_order(campaign_id, order):
+                st.toast("✅ บันทึกลำดับแล้ว")
+            st.rerun()
+
+def show_chart(build, *args):
+    """
+    Build (or reuse) a Plotly figure and draw it, timing both halves for the profiler.
+    In lite mode (per session) the chart is drawn as HTML/SVG instead.
+    """
+    if st.session_state.get('payload_sizes') is not None:
+        st.session_state.payload_sizes.append(payload_sizes(build, *args))
+    if st.session_state.get('lite_charts'):
+        lite = LITE_BUILDERS[build]
+        with section("chart", lite.__name__):
+            chart_html = lite(*args)
+        with section("widget", "markdown"):
+            st.markdown(chart_html, unsafe_allow_html=True)
+        return
+    with section("chart", build.__name__):
+        fig = cached_figure(build, *args)
+    with section("widget", "plotly_chart"):
+        st.plotly_chart(fig, use_container_width=True)
+
+def show_payload_comparison():
+    """Bytes sent for the charts of this rerun, Plotly vs lite"""
+    sizes = st.session_state.get('payload_sizes') or []
+    plotly_bytes = sum(p for p, _ in sizes)
+    lite_bytes = sum(l for _, l in sizes)
+    st.caption(f"📦 กราฟ {len(sizes)} รูป: Plotly {plotly_bytes / 1024:,.1f} KB "
+               f"(ไม่รวม plotly.js ~4.5 MB ที่เบราว์เซอร์ต้องโหลดครั้งแรก) | "
+               f"โหมดเบา {lite_bytes / 1024:,.1f} KB"
+               + (f" (เล็กกว่า {plotly_bytes / lite_bytes:,.0f} เท่า)" if lite_bytes else ""))
+
 def render_results(campaign_id):
-    count = get_response_count(campaign_id)
+    with section("db", "get_data_stamp"):
+        stamp = aggregates.data_stamp(campaign_id)
+    count = aggregates.get(stamp, get_response_count) if stamp.archived else stamp.count
     
     # 1. Executive Summary
     st.markdown("## 📈 สรุปผลการปฏิบัติงาน (Executive Dashboard)")
+    if stamp.archived:
+        st.info("🗄️ แคมเปญนี้ถูกเก็บเข้าคลังแล้ว: แสดงผลสรุปสุดท้าย (กู้คืนได้ที่ด้านล่าง)")
+    c_lite, c_cmp = st.columns(2)
+    c_lite.toggle("📱 โหมดกราฟเบา (มือถือสเปกต่ำ)", key="lite_charts",
+                  help="วาดกราฟเป็น HTML/SVG แทน Plotly: โหลดเร็วกว่าและใช้ข้อมูลน้อยกว่ามาก")
+    compare = c_cmp.checkbox("เทียบขนาดข้อมูลกราฟ", key="compare_payload")
+    st.session_state.payload_sizes = [] if compare else None
     st.markdown(create_live_counter(count), unsafe_allow_html=True)
     
     # 2. Quota Tracking (Based on Field Action Plan)
@@ -301,73 +445,121 @@ def render_results(campaign_id):
     st.markdown("### 🎯 การติดตามเป้าหมายรายอำเภอ (Quota Tracking)")
     
     # Targets from Action Plan
-    targets = {
-        "ทั้งหมด": 360,
-        "ตะกั่วป่า": 127,
-        "ท้ายเหมือง": 124,
-        "คุระบุรี": 72,
-        "กะปง": 37,
-        "ในเขตเทศบาล": 60,
-        "นอกเขตเทศบาล": 300
-    }
+    targets = QUOTA_TARGETS
     
     # Get Current Stats
-    district_data = get_demographic_breakdown(campaign_id, "อำเภอ")['data']
-    area_data = get_demographic_breakdown(campaign_id, "พื้นที่")['data']
-    gen_data = get_demographic_breakdown(campaign_id, "Gen")['data']
-    gender_data = get_demographic_breakdown(campaign_id, "เพศ")['data']
+    with section("db", "get_demographic_breakdown"):
+        district_data = aggregates.get(stamp, get_demographic_breakdown, "อำเภอ")['data']
+        area_data = aggregates.get(stamp, get_demographic_breakdown, "พื้นที่")['data']
     
     def get_count(data, val):
         return next((d['count'] for d in data if d['value'] == val), 0)
 
     # Display Gauges
     c1, c2, c3 = st.columns(3)
-    with c1: st.plotly_chart(create_gauge_chart("ความคืบหน้ารวม", count, targets["ทั้งหมด"]), use_container_width=True)
-    with c2: st.plotly_chart(create_gauge_chart("ตะกั่วป่า", get_count(district_data, "ตะกั่วป่า"), targets["ตะกั่วป่า"]), use_container_width=True)
-    with c3: st.plotly_chart(create_gauge_chart("ท้ายเหมือง", get_count(district_data, "ท้ายเหมือง"), targets["ท้ายเหมือง"]), use_container_width=True)
+    with c1: show_chart(create_gauge_chart, "ความคืบหน้ารวม", count, targets["ทั้งหมด"])
+    with c2: show_chart(create_gauge_chart, "ตะกั่วป่า", get_count(district_data, "ตะกั่วป่า"), targets["ตะกั่วป่า"])
+    with c3: show_chart(create_gauge_chart, "ท้ายเหมือง", get_count(district_data, "ท้ายเหมือง"), targets["ท้ายเหมือง"])
     
     c4, c5, c6 = st.columns(3)
-    with c4: st.plotly_chart(create_gauge_chart("คุระบุรี/กะปง", get_count(district_data, "คุระบุรี") + get_count(district_data, "กะปง"), targets["คุระบุรี"] + targets["กะปง"]), use_container_width=True)
-    with c5: st.plotly_chart(create_gauge_chart("ในเขตเทศบาล", get_count(area_data, "ในเขตเทศบาล"), targets["ในเขตเทศบาล"]), use_container_width=True)
-    with c6: st.plotly_chart(create_gauge_chart("นอกเขตเทศบาล", get_count(area_data, "นอกเขตเทศบาล"), targets["นอกเขตเทศบาล"]), use_container_width=True)
+    with c4: show_chart(create_gauge_chart, "คุระบุรี/กะปง", get_count(district_data, "คุระบุรี") + get_count(district_data, "กะปง"), targets["คุระบุรี"] + targets["กะปง"])
+    with c5: show_chart(create_gauge_chart, "ในเขตเทศบาล", get_count(area_data, "ในเขตเทศบาล"), targets["ในเขตเทศบาล"])
+    with c6: show_chart(create_gauge_chart, "นอกเขตเทศบาล", get_count(area_data, "นอกเขตเทศบาล"), targets["นอกเขตเทศบาล"])
 
-    # 3. Detailed Analysis Tabs
-    tab_res, tab_demo = st.tabs(["📊 ผลการสำรวจรายข้อ", "👥 การวิเคราะห์ประชากร"])
+    # 3. Detailed Analysis (only the selected view is queried and drawn)
+    view = st.radio("มุมมอง", ["📊 ผลการสำรวจรายข้อ", "👥 การวิเคราะห์ประชากร"],
+                    horizontal=True, label_visibility="collapsed", key="results_view")
     
-    with tab_res:
-        stats = get_vote_statistics(campaign_id)
+    if view == "📊 ผลการสำรวจรายข้อ":
+        with section("db", "get_vote_statistics"):
+            stats = aggregates.vote_statistics(stamp)
         if not stats['questions']:
             st.info("ยังไม่มีข้อมูลผลการสำรวจ")
         else:
             for q in stats['questions']:
                 st.markdown(f"#### {q['text']}")
-                st.plotly_chart(create_bar_chart(q['text'], q['options']), use_container_width=True)
+                show_chart(create_bar_chart, q['text'], q['options'])
+                if q.get('removed'):
+                    st.caption(f"ไม่รวม {q['removed']:,} คำตอบของตัวเลือกที่ถูกลบไปแล้ว")
                 st.markdown("<br>", unsafe_allow_html=True)
                 
-    with tab_demo:
+    else:
+        with section("db", "get_demographic_breakdown"):
+            gen_data = aggregates.get(stamp, get_demographic_breakdown, "Gen")['data']
+            gender_data = aggregates.get(stamp, get_demographic_breakdown, "เพศ")['data']
         st.markdown("#### 🔍 ข้อมูลเชิงลึกประชากร (Demographic Breakdown)")
         col_a, col_b = st.columns(2)
         with col_a:
-            st.plotly_chart(create_demographic_bar_chart("ช่วงอายุ (Generation)", gen_data), use_container_width=True)
+            show_chart(create_demographic_bar_chart, "ช่วงอายุ (Generation)", gen_data)
         with col_b:
-            st.plotly_chart(create_demographic_bar_chart("เพศ (Gender)", gender_data), use_container_width=True)
+            show_chart(create_demographic_bar_chart, "เพศ (Gender)", gender_data)
         
         st.markdown("#### 🗺️ ฐานเสียงรายพื้นที่ (Area Analysis)")
-        st.plotly_chart(create_demographic_bar_chart("ประเภทพื้นที่", area_data), use_container_width=True)
+        show_chart(create_demographic_bar_chart, "ประเภทพื้นที่", area_data)
+
+    if compare:
+        show_payload_comparison()
 
     st.markdown("---")
+    render_archive(campaign_id, stamp.archived)
     with st.expander("🚨 โซนอันตราย (Danger Zone)"):
         st.warning("การล้างข้อมูลจะลบผลโหวตทั้งหมดของแคมเปญนี้ และไม่สามารถย้อนกลับได้")
         confirm = st.checkbox("ยืนยันว่าต้องการลบข้อมูลทั้งหมด")
         if st.button("🔥 ล้างข้อมูลและเริ่มเก็บใหม่", type="primary", disabled=not confirm):
-            reset_responses(campaign_id)
-            st.toast("✅ ล้างข้อมูลเรียบร้อยแล้ว")
+            bar = st.progress(0.0, text="กำลังล้างข้อมูล...")
+            deleted = reset_responses(campaign_id, progress=lambda done, total: bar.progress(
+                done / total, text=f"ลบแล้ว {done:,} / {total:,} คำตอบ"))
+            st.toast(f"✅ ล้างข้อมูลเรียบร้อยแล้ว ({deleted:,} คำตอบ)")
             time.sleep(1)
             st.rerun()
+        st.divider()
+        st.warning("การลบแคมเปญจะลบคำถาม ผลโหวต และไฟล์คลังข้อมูลทั้งหมด")
+        confirm_delete = st.checkbox("ยืนยันว่าต้องการลบแคมเปญนี้")
+        if st.button("🗑️ ลบแคมเปญ", disabled=not confirm_delete):
+            if delete_campaign(campaign_id):
+                st.toast("✅ ลบแคมเปญแล้ว")
+            else:
+                cascade.worker.kick()
+                st.toast("🧹 กำลังลบข้อมูลในเบื้องหลัง")
+            st.query_params.clear()
+            st.rerun()
+
+def render_archive(campaign_id, archived):
+    with st.expander("🗄️ คลังข้อมูล (Archive)"):
+        if archived:
+            info = get_archive_info(campaign_id)
+            st.caption(f"เก็บเมื่อ {info['archived_at']} | {info['response_count']:,} คำตอบ | "
+                       f"{info['bytes'] / 1024:,.1f} KB | {info['path']}")
+            if st.button("♻️ กู้คืนข้อมูลดิบกลับสู่ฐานข้อมูลหลัก"):
+                with st.spinner("กำลังกู้คืน..."):
+                    restored = archive.restore_campaign(campaign_id)
+                st.toast(f"✅ กู้คืน {restored:,} คำตอบแล้ว")
+                st.rerun()
+            return
+        st.caption("ย้ายคำตอบดิบของแคมเปญที่ปิดแล้วไปเก็บเป็นไฟล์บีบอัด ฐานข้อมูลหลักเล็กลง "
+                   "ผลสรุปยังดูได้ตามเดิม (ดู Voter Logs / CSV ได้หลังกู้คืน)")
+        camp = get_campaign(campaign_id)
+        vacuum = st.checkbox("VACUUM ฐานข้อมูลหลังย้าย (ล็อกฐานข้อมูลชั่วคราว)", key="archive_vacuum")
+        if st.button("🗄️ เก็บเข้าคลัง", disabled=bool(camp['is_active']),
+                     help="ต้องปิดรับคำตอบก่อน" if camp['is_active'] else None):
+            try:
+                with st.spinner("กำลังเก็บเข้าคลัง..."):
+                    result = archive.archive_campaign(campaign_id, vacuum=vacuum)
+            except archive.ArchiveError as e:
+                st.error(str(e))
+            else:
+                st.toast(f"✅ ย้าย {result['responses']:,} คำตอบ ({result['bytes'] / 1024:,.1f} KB)")
+                st.rerun()
 
 def render_voter_logs(campaign_id):
     st.markdown("### 🕵️ รายละเอียดคนโหวต (Voter Logs)")
-    logs = get_voter_logs(campaign_id)
+    with section("db", "get_data_stamp"):
+        stamp = aggregates.data_stamp(campaign_id)
+    if stamp.archived:
+        st.info("🗄️ แคมเปญนี้ถูกเก็บเข้าคลังแล้ว กู้คืนข้อมูลดิบ (แท็บผลลัพธ์) เพื่อดูรายละเอียดคนโหวต")
+        return
+    with section("db", "get_voter_logs"):
+        logs = aggregates.get(stamp, get_voter_logs)
     
     if not logs:
         st.info("ยังไม่มีข้อมูลการโหวต")
@@ -396,7 +588,8 @@ def render_voter_logs(campaign_id):
             "ที่อยู่/จังหวัด": loc_str,
             "ISP/เครือข่าย": isp,
             "เบราว์เซอร์": browser,
-            "พิกัด": f"https://www.google.com/maps?q={loc.get('lat')},{loc.get('lon')}" if loc.get('lat') else "N/A"
+            "พิกัด": f"https://www.google.com/maps?q={loc.get('lat')},{loc.get('lon')}" if loc.get('lat') else "N/A",
+            "🚩": ", ".join(l.get('flags', []))
         })
         
     df = pd.DataFrame(data)
@@ -408,17 +601,43 @@ def render_voter_logs(campaign_id):
         use_container_width=True
     )
     st.caption("ข้อมูลพิกัดเป็นการประมาณการจาก IP Address เพื่อความปลอดภัยและความเป็นส่วนตัว")
+    
+    # Ballot-stuffing review
+    with st.expander("🚩 กลุ่มคำตอบที่น่าสงสัย (Near-identical Clusters)"):
+        min_size = st.number_input("ขนาดกลุ่มขั้นต่ำ", 2, 50, 3, key="cluster_min_size")
+        with section("db", "get_submission_clusters"):
+            clusters = aggregates.get(stamp, get_submission_clusters, min_size)
+        if not clusters:
+            st.success("ไม่พบกลุ่มคำตอบที่ซ้ำกันผิดปกติ")
+        else:
+            st.dataframe(pd.DataFrame([{
+                "จำนวน": cl['size'],
+                "เครือข่าย (IP)": cl['ip_prefix'],
+                "อุปกรณ์": cl['devices'],
+                "ถูกตั้งธง": cl['flagged'],
+                "ครั้งแรก": cl['first_seen'],
+                "ล่าสุด": cl['last_seen'],
+                "ข้อมูลประชากร": " / ".join(str(v) for v in cl['demographics'].values()),
+                "Response IDs": ", ".join(str(i) for i in cl['response_ids'][:20])
+            } for cl in clusters]), use_container_width=True)
+            st.caption("กลุ่ม = คำตอบและข้อมูลประชากรเหมือนกันทุกข้อ จากเครือข่าย /24 เดียวกัน")
 
 def render_campaign_detail(campaign_id):
-    camp = get_campaign(campaign_id)
+    with section("db", "get_campaign"):
+        camp = get_campaign(campaign_id)
     if not camp: return
     
     st.markdown(f"## 📊 {camp['title']}")
     
+    with section("db", "get_archive_info"):
+        archived = get_archive_info(campaign_id) is not None
+
     # Actions
     c1, c2, c3, c4 = st.columns(4)
     with c1:
-        if st.button("🔴 ปิดรับ" if camp['is_active'] else "🟢 เปิดรับ", use_container_width=True):
+        # An archived campaign answers from its stored summary: restore it before reopening
+        if st.button("🔴 ปิดรับ" if camp['is_active'] else "🟢 เปิดรับ", use_container_width=True, disabled=archived,
+                     help="กู้คืนจากคลังก่อนเปิดรับ" if archived else None):
             toggle_campaign_status(campaign_id)
             st.rerun()
     with c2:
@@ -441,16 +660,29 @@ def render_campaign_detail(campaign_id):
         cfg = load_config()
         url = f"{cfg.get('base_url')}/?poll={campaign_id}"
         st.code(url)
+        st.caption(f"เก็บข้อมูลภาคสนาม (ออฟไลน์ได้, ผ่าน voter service): {cfg.get('base_url')}/collect/{campaign_id}")
         st.image(f"https://api.qrserver.com/v1/create-qr-code/?size=200x200&data={url}", width=150)
+        with st.expander("📦 Static ballot (CDN / ออฟไลน์)"):
+            st.caption("ไฟล์ HTML/JS สำหรับวางบน CDN หรือเปิดในเครื่อง ส่งคำตอบไปที่ voter service (เก็บไว้ในเครื่องเมื่อออฟไลน์) ต้อง export ใหม่หลังแก้ไขคำถาม")
+            ingest_url = st.text_input("Ingest URL (voter_service.py)", value=cfg.get('base_url'), key="export_ingest_url")
+            collect = st.checkbox("โหมดเก็บข้อมูลภาคสนาม (ออฟไลน์ก่อน แล้วซิงค์เป็นชุด)", key="export_collect")
+            if st.button("สร้างไฟล์ .zip"):
+                bundle = export_zip(campaign_id, ingest_url, collect)
+                if bundle:
+                    st.download_button("Download", bundle, f"superpoll-ballot-{campaign_id}.zip", "application/zip")
         if st.button("ปิด"):
             st.session_state.show_share = False
             st.rerun()
         st.markdown("---")
 
-    t1, t2, t3 = st.tabs(["📝 คำถาม", "📊 ผลลัพธ์", "🕵️ ข้อมูลเชิงลึก"])
-    with t1: render_question_builder(campaign_id)
-    with t2: render_results(campaign_id)
-    with t3: render_voter_logs(campaign_id)
+    # st.tabs runs every tab body on each rerun; a selector runs only the visible one
+    views = {
+        "📝 คำถาม": render_question_builder,
+        "📊 ผลลัพธ์": render_results,
+        "🕵️ ข้อมูลเชิงลึก": render_voter_logs,
+    }
+    view = st.radio("แท็บ", list(views), horizontal=True, label_visibility="collapsed", key="detail_view")
+    views[view](campaign_id)
 
 # --- Main Admin Page ---
 def render_login_page():
@@ -481,8 +713,8 @@ def render_admin_page():
         return
         
     # Dashboard
-    view = st.sidebar.radio("Menu", ["polls", "media", "settings"], 
-         format_func=lambda x: {"polls":"📊 Polls", "media":"🖼️ Media", "settings":"⚙️ Settings"}[x])
+    view = st.sidebar.radio("Menu", ["polls", "media", "performance", "settings"], 
+         format_func=lambda x: {"polls":"📊 Polls", "media":"🖼️ Media", "performance":"⏱️ Performance", "settings":"⚙️ Settings"}[x])
          
     if view == "polls":
         # Create
@@ -494,8 +726,14 @@ def render_admin_page():
                     create_campaign(t, d)
                     st.rerun()
         
-        # List
-        camps = get_all_campaigns()
+        # List (keyset pages: cursors of the pages seen so far, for "back")
+        cursors = st.session_state.setdefault('poll_cursors', [None])
+        camps, next_cursor = get_campaign_summaries(after=cursors[-1])
+        pending = get_pending_deletes()
+        if pending:
+            # Also resumes a purge cut short by a restart
+            cascade.worker.kick()
+            st.caption(f"🧹 กำลังลบในเบื้องหลัง {len(pending)} รายการ")
         for c in camps:
             with st.container():
                 st.markdown(f"### {c['title']}")
@@ -503,9 +741,23 @@ def render_admin_page():
                 if c1.button("Manage", key=f"m_{c['id']}"):
                     st.query_params['campaign_id'] = c['id']
                     st.rerun()
+                status = "🗄️ ในคลัง" if c['archived'] else "🟢 เปิดรับ" if c['is_active'] else "🔴 ปิดรับ"
+                last = c['last_response_at'] or "-"
+                c2.caption(f"{status} | 👥 {c['response_count']:,} คน | ล่าสุด: {last} | เป้าหมาย {c['quota_pct']}%")
+                c2.progress(min(c['quota_pct'] / 100, 1.0))
             st.divider()
 
+        p1, p2 = st.columns(2)
+        if len(cursors) > 1 and p1.button("⬅️ ก่อนหน้า"):
+            cursors.pop()
+            st.rerun()
+        if next_cursor and p2.button("ถัดไป ➡️"):
+            cursors.append(next_cursor)
+            st.rerun()
+
     elif view == "media":
         render_media_gallery()
+    elif view == "performance":
+        render_performance()
     elif view == "settings":
         render_settings()
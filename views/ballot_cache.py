@@ -0,0 +1,253 @@
+"""
+Ballot card HTML, pre-rendered once per campaign version.
+
+Building a card means reading and base64-encoding its image and then
+minifying a large f-string. Only `is_selected` changes between reruns,
+so `ballot_fragments` renders both variants of every option once per
+(campaign, ballot_version) and reruns just pick a string. The campaign's
+ballot_version is bumped by every question/option change in
+core.database, which retires the old entry.
+
+Nothing here imports Streamlit, so non-Streamlit voter front ends can
+reuse the same markup.
+"""
+
+import base64
+import os
+import threading
+
+from core import metrics
+from core.ballot import DEMO_SECTIONS, demo_card_id, demo_section_key, question_section_key
+
+_lock = threading.Lock()
+_ballots = {}  # campaign_id -> (ballot_version, {option_id: (unselected, selected, card_type)})
+_demo = {}     # option text -> (unselected, selected)
+_layouts = {}  # campaign_id -> (ballot_version, sections, cards)
+
+
+def get_img_base64(path):
+    """Convert local image to base64 string for embedding"""
+    if not os.path.exists(path): return ""
+    with open(path, "rb") as image_file:
+        encoded_string = base64.b64encode(image_file.read()).decode()
+    
+    # Determine mime type
+    ext = path.split('.')[-1].lower()
+    mime = "image/jpeg" if ext in ['jpg', 'jpeg'] else "image/png"
+    return f"data:{mime};base64,{encoded_string}"
+
+
+def render_card_html(opt, is_selected, q_type, image_loader=get_img_base64):
+    """Render HTML for Option Card (image_loader turns image_url into a data URI)"""
+    
+    # Styles config
+    border = "3px solid #22c55e" if is_selected else "1px solid #e2e8f0"
+    shadow = "0 10px 15px -3px rgba(0,0,0,0.1)" if is_selected else "0 1px 3px 0 rgba(0,0,0,0.1)"
+    transform = "transform: scale(1.02);" if is_selected else ""
+    
+    # Check if candidate card (has image)
+    raw_img = opt.get('image_url')
+    has_image = bool(raw_img)
+    bg_style = f"background: {opt.get('bg_color', '#ffffff')};" if opt.get('bg_color') else "background: white;"
+    
+    # Check text color (simple logic: dark bg -> white text)
+    is_dark_bg = (opt.get('bg_color') or '').startswith('#') and opt.get('bg_color') != '#ffffff'
+    text_color = "white" if is_dark_bg else "#0f172a"
+    sub_text_color = "rgba(255,255,255,0.8)" if is_dark_bg else "#64748b"
+
+    # Convert Image to Base64
+    img_src = ""
+    if has_image:
+        img_src = image_loader(raw_img)
+
+    # Prepare Indicator
+    indicator = ""
+    if is_selected:
+        indicator = f"""
+        <div style="
+            background: #22c55e; color: white; width: 28px; height: 28px; 
+            border-radius: 50%; display: flex; align-items: center; justify-content: center;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.2);
+        ">✓</div>
+        """
+
+    html_content = ""
+    card_key = ""
+
+    if has_image and img_src:
+        # --- CANDIDATE CARD (LARGE) ---
+        html_content = f"""
+        <div style="
+            {bg_style} border-radius: 16px; padding: 16px; margin-bottom: 0px;
+            display: flex; align-items: center; gap: 16px; position: relative;
+            border: {border}; box-shadow: {shadow}; {transform} transition: all 0.2s;
+            height: 100px;
+        ">
+            <div style="
+                width: 70px; height: 70px; border-radius: 50%; 
+                background-image: url('{img_src}'); background-size: cover; background-position: center;
+                border: 2px solid white; box-shadow: 0 2px 4px rgba(0,0,0,0.1); flex-shrink: 0;
+            "></div>
+            
+            <div style="flex: 1; min-width: 0;">
+                <div style="
+                    font-weight: 700; font-size: 1rem; color: {text_color}; 
+                    line-height: 1.3;
+                    display: -webkit-box; -webkit-line-clamp: 3; -webkit-box-orient: vertical;
+                    overflow: hidden; white-space: normal;
+                ">{opt['option_text']}</div>
+            </div>
+            
+            <div style="flex-shrink: 0;">{indicator}</div>
+        </div>
+        """
+        card_key = "large"
+    else:
+        # --- SIMPLE CARD (SMALL) ---
+        html_content = f"""
+        <div style="
+            background: white; border-radius: 12px; padding: 12px 16px; margin-bottom: 0px;
+            display: flex; align-items: center; gap: 12px; position: relative;
+            border: {border}; box-shadow: {shadow}; {transform} transition: all 0.2s;
+            min-height: 48px; /* Changed to min-height */
+        ">
+            <div style="
+                flex: 1; font-weight: 500; color: #334155;
+                font-size: 1rem; line-height: 1.3;
+                word-wrap: break-word;
+            ">{opt['option_text']}</div>
+            <div style="flex-shrink: 0;">{indicator}</div>
+        </div>
+        """
+        card_key = "small"
+
+    return minify(html_content), card_key
+
+
+def render_demo_card_html(opt_text, is_selected):
+    """Render HTML for Demographic Card (same style as small voting cards)"""
+    border = "3px solid #22c55e" if is_selected else "1px solid #e2e8f0"
+    shadow = "0 10px 15px -3px rgba(0,0,0,0.1)" if is_selected else "0 1px 3px 0 rgba(0,0,0,0.1)"
+    transform = "transform: scale(1.02);" if is_selected else ""
+    
+    indicator = ""
+    if is_selected:
+        indicator = f"""
+        <div style="background: #22c55e; color: white; width: 24px; height: 24px; 
+            border-radius: 50%; display: flex; align-items: center; justify-content: center;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.2); font-size: 14px;">✓</div>
+        """
+    
+    return f"""
+    <div style="
+        background: white; border-radius: 12px; padding: 12px 16px; margin-bottom: 0px;
+        display: flex; align-items: center; gap: 12px; position: relative;
+        border: {border}; box-shadow: {shadow}; {transform} transition: all 0.2s;
+        min-height: 48px;
+    ">
+        <div style="flex: 1; font-weight: 500; color: #334155; font-size: 1rem;">{opt_text}</div>
+        <div style="flex-shrink: 0;">{indicator}</div>
+    </div>
+    """
+
+
+def minify(html):
+    # CRITICAL: one line, so Markdown never reads indented HTML as a code block
+    return html.replace('\n', ' ').replace('    ', ' ').strip()
+
+
+def render_fragments(questions, image_loader=get_img_base64):
+    """Uncached {option_id: (unselected_html, selected_html, card_type)}"""
+    fragments = {}
+    for q in questions:
+        for opt in q['options']:
+            off, card_type = render_card_html(opt, False, q['question_type'], image_loader)
+            on, _ = render_card_html(opt, True, q['question_type'], image_loader)
+            fragments[opt['id']] = (off, on, card_type)
+    return fragments
+
+
+def ballot_fragments(campaign, questions):
+    """{option_id: (unselected_html, selected_html, card_type)} for a campaign's current version"""
+    campaign_id = campaign['id']
+    version = campaign.get('ballot_version') or 0
+    with _lock:
+        cached = _ballots.get(campaign_id)
+    if cached and cached[0] == version:
+        metrics.inc("superpoll_cache_requests_total", cache="ballot", result="hit")
+        return cached[1]
+
+    metrics.inc("superpoll_cache_requests_total", cache="ballot", result="miss")
+    fragments = render_fragments(questions)
+    with _lock:
+        _ballots[campaign_id] = (version, fragments)
+    return fragments
+
+
+def demo_fragment(opt_text, is_selected):
+    """Minified demographic card, rendered once per option text"""
+    pair = _demo.get(opt_text)
+    if pair is None:
+        pair = (minify(render_demo_card_html(opt_text, False)), minify(render_demo_card_html(opt_text, True)))
+        with _lock:
+            _demo[opt_text] = pair
+    return pair[1] if is_selected else pair[0]
+
+
+def card_section(key, title, card_ids, q_type='single', max_selections=1, caption=None, divider=False):
+    """One block of cards; `key` is echoed back in tap events"""
+    return {
+        "key": key,
+        "title": title,
+        "caption": caption,
+        "type": q_type,
+        "max": max_selections,
+        "options": list(card_ids),
+        "divider": divider,
+    }
+
+
+def build_layout(questions, fragments):
+    """Uncached (sections, cards) from option fragments (see render_fragments)"""
+    sections, cards = [], {}
+    for n, (label, key, options) in enumerate(DEMO_SECTIONS):
+        card_ids = [demo_card_id(key, i) for i in range(len(options))]
+        for card_id, opt_text in zip(card_ids, options):
+            cards[card_id] = {"off": demo_fragment(opt_text, False), "on": demo_fragment(opt_text, True)}
+        sections.append(card_section(demo_section_key(key), label, card_ids, divider=(n == len(DEMO_SECTIONS) - 1)))
+
+    for q in questions:
+        card_ids = [str(opt['id']) for opt in q['options']]
+        for opt in q['options']:
+            unselected_html, selected_html, _ = fragments[opt['id']]
+            cards[str(opt['id'])] = {"off": unselected_html, "on": selected_html}
+        caption = f"(เลือกได้สูงสุด {q['max_selections']} ข้อ)" if q['question_type'] == 'multi' else None
+        sections.append(card_section(question_section_key(q['id']), q['question_text'], card_ids,
+                                     q['question_type'], q['max_selections'], caption, divider=True))
+    return sections, cards
+
+
+def ballot_layout(campaign, questions):
+    """
+    (sections, cards) for the ballot component: demographic sections first,
+    then one section per question. Card ids are "demo:<key>:<index>" and
+    str(option id). Cached per (campaign, ballot_version) like the fragments.
+    """
+    campaign_id = campaign['id']
+    version = campaign.get('ballot_version') or 0
+    with _lock:
+        cached = _layouts.get(campaign_id)
+    if cached and cached[0] == version:
+        return cached[1], cached[2]
+
+    sections, cards = build_layout(questions, ballot_fragments(campaign, questions))
+    with _lock:
+        _layouts[campaign_id] = (version, sections, cards)
+    return sections, cards
+
+
+def clear():
+    with _lock:
+        _ballots.clear()
+        _demo.clear()
+        _layouts.clear()
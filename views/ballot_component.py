@@ -0,0 +1,67 @@
+"""
+Whole-ballot Streamlit component.
+
+One iframe renders every demographic and question card (pre-rendered HTML
+from views.ballot_cache) and reports taps back, replacing the old
+card markdown + marker div + invisible st.button per option.
+
+Card HTML is sent once per session and ballot version. Later reruns send
+only the section layout and the current selection. If the iframe was
+remounted and lost its cards, it asks for them again with a "resync"
+event.
+
+Modes:
+    tap     every tap is reported and applied by the server (one rerun each)
+    client  taps, max_selections and completeness checks stay in the
+            browser; the server only receives the final submit event
+
+Events returned by the component (each carries a unique `seq`):
+    {"event": "tap", "section": <section key>, "option": <card id>}
+    {"event": "submit", "selected": {<section key>: [<card id>, ...]}}
+    {"event": "resync"}
+"""
+
+import os
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+from core.ballot import CLIENT_MESSAGES
+
+_ballot = components.declare_component(
+    "ballot", path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "ballot"))
+
+
+def ballot(sections, cards, selected, version, mode="tap", reset_token=0, key="ballot", on_change=None):
+    """
+    Render the ballot component.
+
+    Args:
+        sections: Section dicts (views.ballot_cache.card_section), in display order
+        cards: {card_id: {"off": html, "on": html}} for every card in sections
+        selected: {section key: [card ids]} (client mode keeps its own)
+        version: Identifies the card set (campaign id + ballot_version)
+        mode: "tap" or "client"
+        reset_token: Client mode clears its selection when this changes
+    """
+    sent_key = f"_{key}_cards_sent"
+    send_cards = st.session_state.get(sent_key) != version
+    value = _ballot(
+        sections=sections,
+        cards=cards if send_cards else None,
+        selected=selected,
+        version=version,
+        mode=mode,
+        reset_token=reset_token,
+        messages=CLIENT_MESSAGES if mode == "client" else None,
+        key=key,
+        default=None,
+        on_change=on_change,
+    )
+    st.session_state[sent_key] = version
+    return value
+
+
+def forget_cards(key="ballot"):
+    """Make the next render resend card HTML (the iframe asked for a resync)"""
+    st.session_state.pop(f"_{key}_cards_sent", None)
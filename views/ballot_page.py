@@ -0,0 +1,92 @@
+"""
+Full HTML page around the ballot renderer, for front ends without
+Streamlit: the standalone voter service and static exports.
+
+The page loads ballot.css, ballot.js and standalone.js from
+`asset_prefix` and inlines the ballot args, so it needs no further
+requests until the voter submits.
+"""
+
+import html
+import json
+
+from core.ballot import CLIENT_MESSAGES, MESSAGES
+
+ASSETS = ("ballot.css", "ballot.js", "standalone.js")
+
+PAGE = """<!DOCTYPE html>
+<html lang="th">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<link rel="stylesheet" href="{asset_prefix}ballot.css">
+<style>
+body {{ max-width: 640px; margin: 0 auto; padding: 0 12px 40px; background: #f8fafc; }}
+header {{ text-align: center; padding: 20px 0; }}
+header h2 {{ margin: 0; }}
+header p {{ color: #64748b; }}
+.done {{ text-align: center; padding: 40px 0; }}
+.done .note {{ color: #64748b; }}
+.done button {{ margin-top: 16px; padding: 10px 20px; border-radius: 8px; border: 1px solid #e2e8f0; background: white; }}
+.sync {{ position: sticky; top: 0; display: flex; justify-content: space-between; align-items: center;
+        padding: 8px 12px; background: #fef9c3; border-radius: 0 0 8px 8px; font-size: 0.9rem; z-index: 1; }}
+.sync button {{ padding: 4px 12px; border-radius: 6px; border: 1px solid #e2e8f0; background: white; }}
+</style>
+</head>
+<body>
+<div id="sync" class="sync" hidden><span></span><button></button></div>
+<header><h2>{title}</h2><p>{description}</p></header>
+<h4>📝 ข้อมูลทั่วไปก่อนเริ่มโหวต</h4>
+<div id="root"></div>
+<div id="done" class="done" hidden><p>{finished}</p><p id="done-note" class="note"></p><button>{again}</button></div>
+<script src="{asset_prefix}ballot.js"></script>
+<script src="{asset_prefix}standalone.js"></script>
+<script>
+mountStandalone({config});
+</script>
+</body>
+</html>
+"""
+
+
+def ballot_args(campaign, sections, cards):
+    """Args for ballot.js in client mode"""
+    return {
+        "sections": sections,
+        "cards": cards,
+        "selected": {},
+        "version": f"{campaign['id']}:{campaign.get('ballot_version') or 0}",
+        "mode": "client",
+        "reset_token": 0,
+        "messages": CLIENT_MESSAGES,
+    }
+
+
+def render_page(campaign, sections, cards, submit_url, asset_prefix="/static/", queue=False, batch_url=None):
+    """
+    Ballot page as UTF-8 bytes.
+
+    Args:
+        submit_url: Where the submit POST goes (may be another origin)
+        asset_prefix: URL prefix of ballot.css / ballot.js / standalone.js
+        queue: Keep ballots in localStorage while offline and retry later
+        batch_url: Offline-first collection: queue every ballot and sync
+            batches to this ingest URL
+    """
+    config = {
+        "args": ballot_args(campaign, sections, cards),
+        "submitUrl": submit_url,
+        "batchUrl": batch_url,
+        "queue": queue,
+        "messages": {k: MESSAGES[k] for k in ("queued", "saved", "pending", "sync_now", "network_error")},
+    }
+    return PAGE.format(
+        title=html.escape(campaign['title']),
+        description=html.escape(campaign.get('description') or ''),
+        finished=html.escape(MESSAGES["finished"]),
+        again=html.escape(MESSAGES["again"]),
+        asset_prefix=asset_prefix,
+        # "</" would end the inline script early
+        config=json.dumps(config, ensure_ascii=False).replace("</", "<\\/"),
+    ).encode('utf-8')
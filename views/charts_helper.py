@@ -1,13 +1,32 @@
 """
 QuickPoll Charts Module
 Chart generation utilities using Plotly
+
+Building a figure costs several milliseconds of Plotly validation, and the
+dashboard draws ten or more on every rerun. `cached_figure` memoizes the
+builders on a hash of their input (labels and counts), so a refresh with
+no new votes reuses the figures instead of rebuilding them. Their JSON is
+only serialized (once) when something asks for it: the payload comparison.
+
+The lite_* functions draw the same charts as plain HTML/SVG strings
+straight from the aggregate dicts, without Plotly on either side: for
+coordinators on low-end phones (see LITE_BUILDERS).
 """
 
+import hashlib
+import html
+import json
+import math
+import threading
+from collections import OrderedDict
+
 import plotly.express as px
 import plotly.graph_objects as go
 from typing import Dict, List, Any
 import pandas as pd
 
+from core import metrics
+
 
 # Thai-friendly color palette
 CHART_COLORS = [
@@ -215,9 +234,6 @@ def create_cross_tab_chart(question_text: str, demographic_label: str,
     return fig
 
 
-    return fig
-
-
 def create_gauge_chart(label: str, current: int, target: int) -> go.Figure:
     """
     Create a gauge chart for quota tracking
@@ -252,6 +268,159 @@ def create_gauge_chart(label: str, current: int, target: int) -> go.Figure:
     return fig
 
 
+# Enough for every chart of a few dashboards; older counts fall out first
+FIGURE_CACHE_SIZE = 256
+
+_lock = threading.Lock()
+_figures = OrderedDict()  # input hash -> [figure, figure JSON or None until asked for]
+
+
+def figure_key(build, *args) -> str:
+    """Hash of a builder and its input data"""
+    raw = json.dumps([build.__name__, args], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _cached(build, args):
+    key = figure_key(build, *args)
+    with _lock:
+        hit = _figures.get(key)
+        if hit:
+            _figures.move_to_end(key)
+    if hit:
+        metrics.inc("superpoll_cache_requests_total", cache="charts", result="hit")
+        return hit
+    metrics.inc("superpoll_cache_requests_total", cache="charts", result="miss")
+
+    fig = build(*args)
+    entry = [fig, None]
+    with _lock:
+        _figures[key] = entry
+        while len(_figures) > FIGURE_CACHE_SIZE:
+            _figures.popitem(last=False)
+    return entry
+
+
+def cached_figure(build, *args) -> go.Figure:
+    """
+    build(*args), memoized on the input data.
+
+    The figure is shared between reruns and sessions: draw it, don't
+    mutate it.
+    """
+    return _cached(build, args)[0]
+
+
+def figure_json(build, *args) -> str:
+    """Serialized JSON of build(*args), memoized with the figure on first use"""
+    entry = _cached(build, args)
+    if entry[1] is None:
+        # Racing sessions may both serialize; they store the same string
+        entry[1] = entry[0].to_json()
+    return entry[1]
+
+
+def clear():
+    with _lock:
+        _figures.clear()
+
+
+# --- Lite renderer (HTML/SVG, no Plotly) ---
+
+def _lite_card(title: str, body: str) -> str:
+    # One line: indented HTML would turn into a Markdown code block
+    return (f'<div style="background:white;border:1px solid #e2e8f0;border-radius:12px;padding:12px 14px;margin-bottom:12px;">'
+            f'<div style="font-weight:600;text-align:center;margin-bottom:8px;">{title}</div>{body}</div>')
+
+
+def _lite_rows(rows: List[tuple]) -> str:
+    """Horizontal bars for (label, count, percentage) rows, scaled to the largest count"""
+    top = max((count for _, count, _ in rows), default=0) or 1
+    out = []
+    for i, (label, count, pct) in enumerate(rows):
+        width = round(count / top * 100, 1)
+        out.append(
+            f'<div style="margin:6px 0;font-size:0.85rem;">'
+            f'<div style="display:flex;justify-content:space-between;gap:8px;">'
+            f'<span>{html.escape(str(label))}</span><span style="color:#64748b;white-space:nowrap;">{count:,} ({pct}%)</span></div>'
+            f'<div style="background:#f1f5f9;border-radius:4px;height:10px;">'
+            f'<div style="width:{width}%;height:10px;border-radius:4px;background:{CHART_COLORS[i % len(CHART_COLORS)]};"></div>'
+            f'</div></div>')
+    return "".join(out)
+
+
+def lite_bar_chart(question_text: str, options_data: List[Dict[str, Any]],
+                   horizontal: bool = True) -> str:
+    """HTML counterpart of create_bar_chart (always horizontal: labels stay readable on phones)"""
+    rows = [(opt['text'], opt['count'], opt['percentage']) for opt in options_data]
+    return _lite_card(html.escape(question_text), _lite_rows(rows))
+
+
+def lite_demographic_bar_chart(demographic_label: str, data: List[Dict[str, Any]]) -> str:
+    """HTML counterpart of create_demographic_bar_chart"""
+    total = sum(d['count'] for d in data)
+    rows = [(d['value'], d['count'], round(d['count'] / total * 100, 1) if total > 0 else 0) for d in data]
+    return _lite_card(f"การกระจายตาม{html.escape(demographic_label)}", _lite_rows(rows))
+
+
+def lite_pie_chart(question_text: str, options_data: List[Dict[str, Any]],
+                   show_percentage: bool = True) -> str:
+    """SVG donut counterpart of create_pie_chart"""
+    total = sum(opt['count'] for opt in options_data)
+    radius = 40
+    circumference = 2 * math.pi * radius
+    offset = 0.0
+    arcs = [f'<circle r="{radius}" cx="60" cy="60" fill="none" stroke="#f1f5f9" stroke-width="20"/>']
+    legend = []
+    for i, opt in enumerate(options_data):
+        color = CHART_COLORS[i % len(CHART_COLORS)]
+        if total:
+            length = opt['count'] / total * circumference
+            arcs.append(f'<circle r="{radius}" cx="60" cy="60" fill="none" stroke="{color}" stroke-width="20" '
+                        f'stroke-dasharray="{length:.2f} {circumference:.2f}" stroke-dashoffset="{-offset:.2f}" '
+                        f'transform="rotate(-90 60 60)"/>')
+            offset += length
+        share = f" ({opt.get('percentage', 0)}%)" if show_percentage else ""
+        legend.append(f'<div><span style="color:{color};">●</span> {html.escape(opt["text"])} '
+                      f'<span style="color:#64748b;">{opt["count"]:,}{share}</span></div>')
+    svg = (f'<svg viewBox="0 0 120 120" width="140" height="140" style="flex-shrink:0;">{"".join(arcs)}'
+           f'<text x="60" y="65" text-anchor="middle" font-size="16" font-weight="700">{total:,}</text></svg>')
+    body = (f'<div style="display:flex;align-items:center;gap:12px;flex-wrap:wrap;justify-content:center;">'
+            f'{svg}<div style="font-size:0.85rem;">{"".join(legend)}</div></div>')
+    return _lite_card(html.escape(question_text), body)
+
+
+def lite_gauge_chart(label: str, current: int, target: int) -> str:
+    """SVG half-circle counterpart of create_gauge_chart"""
+    ratio = min(current / target, 1) if target > 0 else 0
+    # Same bands as the Plotly gauge steps: <50% red, <80% amber, else green
+    color = "#ef4444" if ratio < 0.5 else "#f59e0b" if ratio < 0.8 else "#22c55e"
+    length = math.pi * 50
+    arc = 'M 10 60 A 50 50 0 0 1 110 60'
+    svg = (f'<svg viewBox="0 0 120 70" width="100%" style="max-width:220px;display:block;margin:0 auto;">'
+           f'<path d="{arc}" fill="none" stroke="#e2e8f0" stroke-width="12"/>'
+           f'<path d="{arc}" fill="none" stroke="{color}" stroke-width="12" '
+           f'stroke-dasharray="{ratio * length:.2f} {length:.2f}"/>'
+           f'<text x="60" y="56" text-anchor="middle" font-size="18" font-weight="700">{current:,}</text></svg>')
+    caption = f'<div style="text-align:center;color:#64748b;font-size:0.8rem;">เป้าหมาย: {target:,} ({ratio * 100:.0f}%)</div>'
+    return _lite_card(html.escape(label), svg + caption)
+
+
+# Plotly builder -> lite renderer taking the same arguments
+LITE_BUILDERS = {
+    create_bar_chart: lite_bar_chart,
+    create_demographic_bar_chart: lite_demographic_bar_chart,
+    create_pie_chart: lite_pie_chart,
+    create_gauge_chart: lite_gauge_chart,
+}
+
+
+def payload_sizes(build, *args) -> tuple:
+    """(Plotly figure JSON bytes, lite HTML bytes) of one chart"""
+    return (len(figure_json(build, *args).encode('utf-8')),
+            len(LITE_BUILDERS[build](*args).encode('utf-8')))
+
+
 def create_live_counter(count: int, label: str = "ผู้ตอบทั้งหมด") -> str:
     """
     Create HTML for live counter display
@@ -0,0 +1,187 @@
+// Ballot renderer shared by the Streamlit component (index.html) and the
+// standalone voter page (voter_service.py). No build step, no dependencies.
+//
+// createBallot(root, hooks) -> {update(args)}
+//   hooks.emit(value)  send an event ({event: "tap" | "submit" | "resync", ...})
+//   hooks.resize()     content height changed
+//
+// args: {sections, cards, selected, version, mode, reset_token, messages, error}
+// (see views/ballot_component.py for their meaning)
+
+function createBallot(root, hooks) {
+    const state = {
+        version: null,
+        cardsVersion: null,
+        cards: null,       // card id -> {off, on}
+        sections: [],
+        selected: {},      // section key -> [card ids]
+        mode: "tap",
+        messages: {},
+        resetToken: null,
+        submitting: false,
+        error: null,
+        seq: Date.now(),
+    };
+
+    function emit(value) {
+        state.seq += 1;
+        value.seq = state.seq;
+        hooks.emit(value);
+    }
+
+    // Client mode keeps the ballot across iframe remounts and page reloads
+    function storageKey() {
+        return "superpoll:ballot:" + state.version;
+    }
+
+    function saveSelection() {
+        try {
+            sessionStorage.setItem(storageKey(), JSON.stringify({token: state.resetToken, selected: state.selected}));
+        } catch (e) {}
+    }
+
+    function loadSelection() {
+        try {
+            const saved = JSON.parse(sessionStorage.getItem(storageKey()) || "null");
+            if (saved && saved.token === state.resetToken) return saved.selected || {};
+        } catch (e) {}
+        return {};
+    }
+
+    function cardHtml(cardId, isSelected) {
+        const card = state.cards[cardId];
+        return card ? (isSelected ? card.on : card.off) : "";
+    }
+
+    function render() {
+        root.innerHTML = "";
+        for (const section of state.sections) {
+            const block = document.createElement("div");
+            block.className = "section";
+            if (section.title) {
+                const h = document.createElement("h4");
+                h.textContent = section.title;
+                block.appendChild(h);
+            }
+            if (section.caption) {
+                const c = document.createElement("div");
+                c.className = "caption";
+                c.textContent = section.caption;
+                block.appendChild(c);
+            }
+            const chosen = state.selected[section.key] || [];
+            for (const cardId of section.options) {
+                const el = document.createElement("div");
+                el.className = "card";
+                el.dataset.section = section.key;
+                el.dataset.card = cardId;
+                el.innerHTML = cardHtml(cardId, chosen.includes(cardId));
+                el.addEventListener("click", onTap);
+                block.appendChild(el);
+            }
+            if (section.divider) {
+                block.appendChild(document.createElement("hr"));
+            }
+            root.appendChild(block);
+        }
+        if (state.mode === "client") {
+            root.appendChild(submitBar());
+        }
+        hooks.resize();
+    }
+
+    function submitBar() {
+        const bar = document.createElement("div");
+        bar.className = "submit-bar";
+        const button = document.createElement("button");
+        button.textContent = state.submitting ? state.messages.sending : state.messages.submit;
+        button.disabled = state.submitting;
+        button.addEventListener("click", onSubmit);
+        bar.appendChild(button);
+        if (state.error) {
+            const error = document.createElement("div");
+            error.className = "error";
+            error.textContent = state.error;
+            bar.appendChild(error);
+        }
+        return bar;
+    }
+
+    // Same rules as the server: single replaces, multi toggles up to max
+    function applyTap(section, cardId) {
+        const chosen = (state.selected[section.key] || []).slice();
+        if (section.type === "single") {
+            state.selected[section.key] = [cardId];
+        } else if (chosen.includes(cardId)) {
+            state.selected[section.key] = chosen.filter(id => id !== cardId);
+        } else if (chosen.length < section.max) {
+            state.selected[section.key] = chosen.concat([cardId]);
+        }
+    }
+
+    function validate() {
+        for (const section of state.sections) {
+            if (!(state.selected[section.key] || []).length) {
+                return section.key.startsWith("demo:") ? state.messages.demo_missing : state.messages.questions_missing;
+            }
+        }
+        return null;
+    }
+
+    function onTap(event) {
+        const key = event.currentTarget.dataset.section;
+        const cardId = event.currentTarget.dataset.card;
+        const section = state.sections.find(s => s.key === key);
+        if (!section) return;
+        applyTap(section, cardId);
+        if (state.mode === "client") {
+            // Nothing leaves the browser until submit
+            state.error = null;
+            saveSelection();
+            render();
+            return;
+        }
+        // Redraw immediately; the server's next render confirms the selection
+        render();
+        emit({event: "tap", section: key, option: cardId});
+    }
+
+    function onSubmit() {
+        if (state.submitting) return;
+        state.error = validate();
+        if (!state.error) {
+            state.submitting = true;
+            emit({event: "submit", selected: state.selected});
+        }
+        render();
+    }
+
+    function update(args) {
+        if (args.cards) {
+            state.cards = args.cards;
+            state.cardsVersion = args.version;
+        } else if (state.cardsVersion !== args.version) {
+            // Remounted or new ballot version without card HTML: ask for it
+            state.cards = state.cards || {};
+            emit({event: "resync"});
+        }
+        state.version = args.version;
+        state.sections = args.sections || [];
+        state.mode = args.mode || "tap";
+        state.messages = args.messages || {};
+        state.submitting = false;
+        state.error = args.error || null;
+        if (state.mode === "client") {
+            if (state.resetToken !== args.reset_token) {
+                // First render, or the server accepted a submission: start from storage / empty
+                state.resetToken = args.reset_token;
+                state.selected = loadSelection();
+            }
+        } else {
+            state.selected = args.selected || {};
+        }
+        render();
+    }
+
+    return {update: update};
+}
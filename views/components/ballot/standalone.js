@@ -0,0 +1,246 @@
+// Standalone ballot page (voter_service.py and static exports), built on ballot.js.
+//
+// mountStandalone(config)
+//   config.args       ballot args (client mode), see views/ballot_page.py
+//   config.submitUrl  single submit, {"selected", "device", "key"} -> {"ok", "error"}
+//   config.batchUrl   offline-first collection: every ballot goes to the outbox
+//                     and is synced in batches (voter_service.ingest)
+//   config.queue      without batchUrl: keep ballots that failed to send and retry
+//   config.messages   queued / saved / pending / sync_now / network_error texts
+//
+// Every ballot gets an idempotency key when it is submitted, so a retry after
+// a lost response is stored once. Queued ballots are retried on load, when the
+// browser comes back online and every RETRY_MS. A 4xx other than 429 means the
+// server will never accept the ballot (closed poll, invalid), so it is dropped
+// instead of retried forever.
+
+const OUTBOX_KEY = "superpoll:outbox";
+const DEVICE_KEY = "superpoll:device";
+const RETRY_MS = 30000;
+const BATCH_SIZE = 50;
+// Smaller bodies are not worth gzipping
+const GZIP_MIN_BYTES = 1024;
+
+function mountStandalone(config) {
+    const args = config.args;
+    const messages = config.messages;
+    const root = document.getElementById("root");
+    const done = document.getElementById("done");
+    const note = document.getElementById("done-note");
+    const sync = document.getElementById("sync");
+    let flushing = false;
+
+    function randomHex() {
+        return Array.from(crypto.getRandomValues(new Uint8Array(16)), b => b.toString(16).padStart(2, "0")).join("");
+    }
+
+    // Cookies do not reach a cross-origin ingest endpoint, so the device token travels in the body
+    function deviceToken() {
+        try {
+            let token = localStorage.getItem(DEVICE_KEY);
+            if (!token) {
+                token = randomHex();
+                localStorage.setItem(DEVICE_KEY, token);
+            }
+            return token;
+        } catch (e) {
+            return null;
+        }
+    }
+
+    function loadOutbox() {
+        try {
+            return JSON.parse(localStorage.getItem(OUTBOX_KEY) || "[]");
+        } catch (e) {
+            return [];
+        }
+    }
+
+    function saveOutbox(items) {
+        try {
+            localStorage.setItem(OUTBOX_KEY, JSON.stringify(items));
+            return true;
+        } catch (e) {
+            return false;
+        }
+    }
+
+    function removeFromOutbox(keys) {
+        saveOutbox(loadOutbox().filter(i => !keys.has(i.key)));
+        showPending();
+    }
+
+    async function encode(body) {
+        const text = JSON.stringify(body);
+        // text/plain keeps small submits "simple" CORS requests: no preflight round trip
+        const headers = {"Content-Type": "text/plain;charset=UTF-8"};
+        if (text.length < GZIP_MIN_BYTES || typeof CompressionStream === "undefined") {
+            return {headers: headers, body: text};
+        }
+        const stream = new Blob([text]).stream().pipeThrough(new CompressionStream("gzip"));
+        headers["Content-Encoding"] = "gzip";
+        return {headers: headers, body: await new Response(stream).arrayBuffer()};
+    }
+
+    async function post(url, body) {
+        const request = await encode(body);
+        const r = await fetch(url, {
+            method: "POST",
+            headers: request.headers,
+            body: request.body,
+            credentials: "same-origin",
+        });
+        const result = await r.json().catch(() => ({ok: false}));
+        return {status: r.status, result: result};
+    }
+
+    // Sync statuses after which a queued ballot can be dropped
+    const FINISHED = new Set(["accepted", "duplicate", "invalid"]);
+
+    function retryable(status) {
+        return status === 429 || status >= 500;
+    }
+
+    function showPending() {
+        if (!sync) return;
+        const count = loadOutbox().length;
+        sync.hidden = !config.batchUrl && count === 0;
+        sync.querySelector("span").textContent = messages.pending.replace("{n}", count);
+    }
+
+    function showDone(text) {
+        args.reset_token += 1;
+        args.error = null;
+        root.hidden = true;
+        done.hidden = false;
+        note.textContent = text || "";
+        ballot.update(args);
+    }
+
+    function showError(text) {
+        args.error = text;
+        ballot.update(args);
+    }
+
+    // One batch request; returns false when the rest should wait for the next flush
+    async function flushBatch(url, items) {
+        let response;
+        try {
+            response = await post(url, {
+                device: deviceToken(),
+                items: items.map(i => ({key: i.key, selected: i.selected, collected_at: i.collected_at})),
+            });
+        } catch (e) {
+            return false;  // still offline
+        }
+        // Closed or unknown poll, proxy error...: keep every ballot and try again on the next flush
+        if (response.status !== 200 || !response.result.ok) return false;
+        const finished = new Set();
+        let retry = false;
+        for (const r of response.result.results || []) {
+            // Only what the server stored or marked invalid leaves the phone
+            if (FINISHED.has(r.status)) finished.add(r.key);
+            else retry = true;
+        }
+        removeFromOutbox(finished);
+        return !retry;
+    }
+
+    async function flushOne(item) {
+        let response;
+        try {
+            response = await post(item.url, {selected: item.selected, device: item.device, key: item.key});
+        } catch (e) {
+            return false;
+        }
+        if (!response.result.ok && response.result.status !== "invalid") return false;
+        removeFromOutbox(new Set([item.key]));
+        return true;
+    }
+
+    async function flush() {
+        if (flushing) return;
+        flushing = true;
+        try {
+            // Oldest first; batches resume where the last sync stopped
+            let items;
+            while ((items = loadOutbox()).length) {
+                const first = items[0];
+                const ok = first.batchUrl
+                    ? await flushBatch(first.batchUrl, items.filter(i => i.batchUrl === first.batchUrl).slice(0, BATCH_SIZE))
+                    : await flushOne(first);
+                if (!ok) break;
+            }
+        } finally {
+            flushing = false;
+            showPending();
+        }
+    }
+
+    function enqueue(item) {
+        const items = loadOutbox();
+        items.push(item);
+        const saved = saveOutbox(items);
+        showPending();
+        return saved;
+    }
+
+    function submit(selected) {
+        const item = {
+            key: randomHex(),
+            url: config.submitUrl,
+            batchUrl: config.batchUrl || null,
+            selected: selected,
+            device: deviceToken(),
+            collected_at: Date.now(),
+        };
+        if (config.batchUrl) {
+            // Offline-first: the phone is the source of truth until a sync acknowledges it
+            if (enqueue(item)) {
+                showDone(messages.saved);
+                flush();
+            } else {
+                showError(messages.network_error);
+            }
+            return;
+        }
+        post(item.url, {selected: item.selected, device: item.device, key: item.key}).then(response => {
+            if (response.result.ok) {
+                showDone();
+            } else if (config.queue && retryable(response.status) && enqueue(item)) {
+                showDone(messages.queued);
+            } else {
+                showError(response.result.error || messages.network_error);
+            }
+        }).catch(() => {
+            if (config.queue && enqueue(item)) {
+                showDone(messages.queued);
+            } else {
+                showError(messages.network_error);
+            }
+        });
+    }
+
+    const ballot = createBallot(root, {
+        resize: () => {},
+        emit: (value) => {
+            if (value.event === "submit") submit(value.selected);
+        },
+    });
+
+    done.querySelector("button").addEventListener("click", () => {
+        done.hidden = true;
+        root.hidden = false;
+    });
+
+    if (sync) {
+        sync.querySelector("button").textContent = messages.sync_now;
+        sync.querySelector("button").addEventListener("click", flush);
+    }
+    if (config.queue || config.batchUrl) {
+        window.addEventListener("online", flush);
+        setInterval(flush, RETRY_MS);
+        flush();
+    }
+    ballot.update(args);
+}
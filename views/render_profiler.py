@@ -0,0 +1,143 @@
+"""
+Per-rerun render profiler for the Streamlit views.
+
+Enable with ?profile=1 on any URL or SUPERPOLL_PROFILE=1 for every session.
+Wrap work in `section(category, name)` where category is one of
+db / network / html / chart / widget. Sections nest; each one is charged only its own
+(exclusive) time. At the end of a rerun the breakdown is shown together
+with rolling percentiles over the last ROLLING_WINDOW reruns per page.
+"""
+
+import contextlib
+import os
+import threading
+import time
+from collections import deque
+
+import pandas as pd
+import streamlit as st
+
+CATEGORIES = ("db", "network", "html", "chart", "widget")
+ROLLING_WINDOW = 200
+
+_local = threading.local()
+_rolling_lock = threading.Lock()
+_rolling = {}  # (page, category) -> deque of ms
+_NULL = contextlib.nullcontext()
+
+
+class RerunProfile:
+    def __init__(self, page):
+        self.page = page
+        self.started = time.perf_counter()
+        self.stack = []   # [name_key, start, child_seconds]
+        self.totals = {}  # (category, name) -> [calls, seconds]
+
+    def push(self, key):
+        self.stack.append([key, time.perf_counter(), 0.0])
+
+    def pop(self):
+        key, start, children = self.stack.pop()
+        elapsed = time.perf_counter() - start
+        if self.stack:
+            self.stack[-1][2] += elapsed
+        entry = self.totals.setdefault(key, [0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed - children
+
+    def by_category(self):
+        out = {c: 0.0 for c in CATEGORIES}
+        for (category, _), (_, seconds) in self.totals.items():
+            out[category] = out.get(category, 0.0) + seconds
+        return out
+
+
+def is_requested():
+    if os.environ.get('SUPERPOLL_PROFILE', '0') == '1':
+        return True
+    try:
+        return st.query_params.get('profile') == '1'
+    except Exception:
+        return False
+
+
+def begin(page):
+    """Start profiling this rerun (no-op unless requested)"""
+    _local.profile = RerunProfile(page) if is_requested() else None
+
+
+def section(category, name=None):
+    """Context manager timing one piece of a rerun"""
+    profile = getattr(_local, 'profile', None)
+    if profile is None:
+        return _NULL
+    return _Section(profile, (category, name or category))
+
+
+class _Section:
+    __slots__ = ("profile", "key")
+
+    def __init__(self, profile, key):
+        self.profile = profile
+        self.key = key
+
+    def __enter__(self):
+        self.profile.push(self.key)
+
+    def __exit__(self, *exc):
+        self.profile.pop()
+        return False
+
+
+def _record(profile, total_ms):
+    with _rolling_lock:
+        for category, seconds in profile.by_category().items():
+            _rolling.setdefault((profile.page, category), deque(maxlen=ROLLING_WINDOW)).append(seconds * 1000)
+        _rolling.setdefault((profile.page, "total"), deque(maxlen=ROLLING_WINDOW)).append(total_ms)
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def rolling_stats(page):
+    with _rolling_lock:
+        series = {cat: list(values) for (p, cat), values in _rolling.items() if p == page}
+    return [{
+        "section": cat,
+        "reruns": len(values),
+        "p50_ms": round(_percentile(values, 50), 2),
+        "p95_ms": round(_percentile(values, 95), 2),
+        "max_ms": round(max(values), 2) if values else 0,
+    } for cat, values in sorted(series.items())]
+
+
+def finish(render=True):
+    """Record this rerun; optionally show the breakdown at the bottom of the page"""
+    profile = getattr(_local, 'profile', None)
+    if profile is None:
+        return
+    _local.profile = None
+    total_ms = (time.perf_counter() - profile.started) * 1000
+    _record(profile, total_ms)
+    if not render:
+        return
+
+    with st.expander(f"⏱️ Render profile — {total_ms:.1f} ms", expanded=False):
+        categories = profile.by_category()
+        cols = st.columns(len(CATEGORIES) + 1)
+        for col, cat in zip(cols, CATEGORIES):
+            col.metric(cat, f"{categories[cat] * 1000:.1f} ms")
+        accounted = sum(categories.values()) * 1000
+        cols[-1].metric("other", f"{max(0.0, total_ms - accounted):.1f} ms")
+
+        rows = [{"category": cat, "section": name, "calls": calls, "ms": round(seconds * 1000, 2)}
+                for (cat, name), (calls, seconds) in profile.totals.items()]
+        rows.sort(key=lambda r: r["ms"], reverse=True)
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+
+        st.caption(f"Rolling percentiles (last {ROLLING_WINDOW} reruns, page: {profile.page})")
+        st.dataframe(pd.DataFrame(rolling_stats(profile.page)), use_container_width=True, hide_index=True)
@@ -0,0 +1,126 @@
+"""
+Export a campaign's ballot as a static bundle for a CDN or offline use.
+
+    python -m views.static_export 1 --ingest-url https://vote.example.com --out dist/poll-1
+
+The bundle is index.html (cards and layout inlined, candidate photos
+downscaled to JPEG data URIs), ballot.css, ballot.js, standalone.js and
+manifest.json. Any static host can serve it; only submissions reach
+Python, as POSTs to <ingest-url>/poll/<id>/submit on voter_service.py.
+While the phone is offline, ballots wait in localStorage and are sent
+when it reconnects. With --collect the bundle is offline-first for
+enumerators: every ballot is queued and synced in batches to
+<ingest-url>/ingest/<id>.
+
+The bundle is a snapshot of one ballot_version: re-export after editing
+questions (the ingest endpoint drops options it no longer knows).
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import zipfile
+from datetime import datetime
+
+from core import database
+from views.ballot_cache import build_layout, get_img_base64, render_fragments
+from views.ballot_page import ASSETS, render_page
+
+ASSET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "ballot")
+# Cards show photos as a 70px circle; 160px covers 2x screens
+IMAGE_SIZE = 160
+IMAGE_QUALITY = 75
+
+
+def compress_image(path, size=IMAGE_SIZE, quality=IMAGE_QUALITY):
+    """Downscaled JPEG data URI of a local image (original bytes if Pillow cannot read it)"""
+    if not os.path.exists(path): return ""
+    try:
+        from PIL import Image
+        with Image.open(path) as img:
+            img.thumbnail((size, size))
+            if img.mode in ("RGBA", "LA", "P"):
+                img = img.convert("RGBA")
+                flat = Image.new("RGB", img.size, "white")
+                flat.paste(img, mask=img.split()[-1])
+                img = flat
+            elif img.mode != "RGB":
+                img = img.convert("RGB")
+            buf = io.BytesIO()
+            img.save(buf, "JPEG", quality=quality, optimize=True)
+    except Exception:
+        return get_img_base64(path)
+    return "data:image/jpeg;base64," + base64.b64encode(buf.getvalue()).decode()
+
+
+def export_bundle(campaign_id, ingest_url, collect=False):
+    """{file name: bytes} of the static bundle, or None if the campaign does not exist"""
+    campaign = database.get_campaign(campaign_id)
+    if not campaign:
+        return None
+    questions = database.get_questions(campaign_id)
+    sections, cards = build_layout(questions, render_fragments(questions, image_loader=compress_image))
+    submit_url = f"{ingest_url.rstrip('/')}/poll/{campaign_id}/submit"
+    batch_url = f"{ingest_url.rstrip('/')}/ingest/{campaign_id}" if collect else None
+
+    files = {"index.html": render_page(campaign, sections, cards, submit_url, asset_prefix="", queue=True,
+                                       batch_url=batch_url)}
+    for name in ASSETS:
+        with open(os.path.join(ASSET_DIR, name), 'rb') as f:
+            files[name] = f.read()
+    files["manifest.json"] = json.dumps({
+        "campaign_id": campaign_id,
+        "title": campaign['title'],
+        "ballot_version": campaign.get('ballot_version') or 0,
+        "submit_url": submit_url,
+        "batch_url": batch_url,
+        "exported_at": datetime.now().isoformat(timespec='seconds'),
+    }, ensure_ascii=False, indent=2).encode('utf-8')
+    return files
+
+
+def export_zip(campaign_id, ingest_url, collect=False):
+    """The bundle as zip bytes (for download), or None"""
+    files = export_bundle(campaign_id, ingest_url, collect)
+    if files is None:
+        return None
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in files.items():
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+
+def write_bundle(campaign_id, out_dir, ingest_url, collect=False):
+    """Write the bundle into out_dir; returns {file name: size} or None"""
+    files = export_bundle(campaign_id, ingest_url, collect)
+    if files is None:
+        return None
+    os.makedirs(out_dir, exist_ok=True)
+    for name, data in files.items():
+        with open(os.path.join(out_dir, name), 'wb') as f:
+            f.write(data)
+    return {name: len(data) for name, data in files.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a campaign ballot as a static bundle")
+    parser.add_argument("campaign_id", type=int)
+    parser.add_argument("--ingest-url", required=True, help="Base URL of voter_service.py")
+    parser.add_argument("--out", default=None, help="Output directory (default dist/poll-<id>)")
+    parser.add_argument("--collect", action="store_true", help="Offline-first enumerator bundle (batch sync)")
+    args = parser.parse_args()
+
+    out_dir = args.out or os.path.join("dist", f"poll-{args.campaign_id}")
+    sizes = write_bundle(args.campaign_id, out_dir, args.ingest_url, args.collect)
+    if sizes is None:
+        parser.error(f"campaign {args.campaign_id} not found")
+    for name, size in sizes.items():
+        print(f"{name:15} {size / 1024:8.1f} KB")
+    print(f"Bundle written to {out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,55 @@
 import streamlit as st
+import streamlit.components.v1 as components
+import functools
 import time
-import base64
-import os
+import uuid
 from core.database import get_campaign, get_questions, submit_response
+from core.ratelimit import limiter
+from core import geoip
+from core.config import load_config, VOTER_MODES
+from core.ballot import (DEMO_SECTIONS, MESSAGES, client_ip, demo_card_id, demo_section_key, demo_value,
+                         question_section_key, parse_selection, validate, location_info)
+from views.render_profiler import section
+from views.ballot_cache import ballot_layout
+from views.ballot_component import ballot, forget_cards
+
+DEVICE_COOKIE = "superpoll_device"
 
 def load_css():
     with open('assets/styles.css') as f:
         st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
 
-def get_img_base64(path):
-    """Convert local image to base64 string for embedding"""
-    if not os.path.exists(path): return ""
-    with open(path, "rb") as image_file:
-        encoded_string = base64.b64encode(image_file.read()).decode()
-    
-    # Determine mime type
-    ext = path.split('.')[-1].lower()
-    mime = "image/jpeg" if ext in ['jpg', 'jpeg'] else "image/png"
-    return f"data:{mime};base64,{encoded_string}"
+def get_device_token():
+    """Per-device token: browser cookie if present, else a new one (stored by emit_device_cookie)"""
+    if 'device_token' not in st.session_state:
+        token = None
+        try:
+            token = st.context.cookies.get(DEVICE_COOKIE)
+        except:
+            pass
+        st.session_state.device_token_is_new = not token
+        st.session_state.device_token = token or uuid.uuid4().hex
+    return st.session_state.device_token
+
+def emit_device_cookie():
+    """
+    Store a new token as cookie, on every render of the voter page while the
+    session's token is new (the same element each rerun, so the iframe stays).
+    Emitting it only at submit loses it to the rerun that follows.
+    """
+    token = get_device_token()
+    if st.session_state.get('device_token_is_new'):
+        # Persist for one year so later sessions on this phone share the token
+        components.html(f"""<script>
+            window.parent.document.cookie = "{DEVICE_COOKIE}={token}; max-age=31536000; path=/; SameSite=Lax";
+        </script>""", height=0)
+
+def get_client_ip():
+    """Client IP as seen by Streamlit (core.ballot.client_ip: proxy header only from a trusted proxy)"""
+    try:
+        return client_ip(st.context.headers.get("X-Forwarded-For"), st.context.ip_address)
+    except:
+        return None
 
 def render_finished():
     st.balloons()
@@ -26,104 +58,112 @@ def render_finished():
     if st.button("<< โหวตใหม่อีกครั้ง"):
         st.rerun()
 
-def render_card_html(opt, is_selected, q_type):
-    """Render HTML for Option Card"""
+def apply_ballot_event(questions):
+    """on_change callback of the ballot component: apply one tap to session state"""
+    event = st.session_state.get("ballot")
+    if not event:
+        return
+    if event.get("event") == "resync":
+        forget_cards()
+        return
+    if event.get("event") == "submit":
+        apply_client_ballot(questions, event.get("selected") or {})
+        st.session_state.pending_submit = True
+        return
+    section_key, card_id = event.get("section", ""), event.get("option", "")
+    try:
+        if section_key.startswith("demo:"):
+            key = section_key[len("demo:"):]
+            value = demo_value(key, card_id)
+            if value is not None:
+                st.session_state.demo_data[key] = value
+        elif section_key.startswith("q:"):
+            q = next(q for q in questions if question_section_key(q['id']) == section_key)
+            opt_id = int(card_id)
+            if opt_id not in [o['id'] for o in q['options']]:
+                return
+            # Toggle Logic
+            selected_opts = st.session_state.responses.get(q['id'], [])
+            if not isinstance(selected_opts, list): selected_opts = [selected_opts]
+            if q['question_type'] == 'single':
+                st.session_state.responses[q['id']] = [opt_id]
+            else:
+                if opt_id in selected_opts:
+                    selected_opts.remove(opt_id)
+                elif len(selected_opts) < q['max_selections']:
+                    selected_opts.append(opt_id)
+                st.session_state.responses[q['id']] = selected_opts
+    except (StopIteration, ValueError):
+        pass  # stale or malformed event
+
+def apply_client_ballot(questions, selected):
+    """Copy a client-mode selection ({section key: [card ids]}) into session state, dropping anything invalid"""
+    st.session_state.demo_data, st.session_state.responses = parse_selection(questions, selected)
+
+def submit_ballot(campaign_id, questions):
+    """Validate and store the ballot in session state. Returns an error message, or None on success."""
+    error = validate(questions, st.session_state.demo_data, st.session_state.responses)
+    if error:
+        return error
+    if not limiter.allow(campaign_id, client_ip := get_client_ip()):
+        # Rejected before any GeoIP call or DB write
+        return MESSAGES["rate_limited"]
+
+    # --- BACKGROUND DATA COLLECTION ---
+    # 1. Get IP and Location Data (GeoIP lookup of the voter's IP, cached per IP)
+    with section("network", "geoip"):
+        ip_data = geoip.lookup(client_ip)
     
-    # Styles config
-    border = "3px solid #22c55e" if is_selected else "1px solid #e2e8f0"
-    shadow = "0 10px 15px -3px rgba(0,0,0,0.1)" if is_selected else "0 1px 3px 0 rgba(0,0,0,0.1)"
-    transform = "transform: scale(1.02);" if is_selected else ""
+    ip_addr = client_ip or ip_data.get('query', 'Unknown')
     
-    # Check if candidate card (has image)
-    raw_img = opt.get('image_url')
-    has_image = bool(raw_img)
-    bg_style = f"background: {opt.get('bg_color', '#ffffff')};" if opt.get('bg_color') else "background: white;"
+    # 2. Get Browser Info (User Agent)
+    # Try to get from st.context.headers (Streamlit 1.37+) or fallback
+    user_agent = "Unknown"
+    try:
+        # Newer Streamlit
+        user_agent = st.context.headers.get("User-Agent", "Unknown")
+    except:
+        try:
+            # Alternative for some versions
+            from streamlit.web.server.websocket_headers import _get_websocket_headers
+            headers = _get_websocket_headers()
+            user_agent = headers.get("User-Agent", "Unknown")
+        except:
+            pass
     
-    # Check text color (simple logic: dark bg -> white text)
-    is_dark_bg = (opt.get('bg_color') or '').startswith('#') and opt.get('bg_color') != '#ffffff'
-    text_color = "white" if is_dark_bg else "#0f172a"
-    sub_text_color = "rgba(255,255,255,0.8)" if is_dark_bg else "#64748b"
-
-    # Convert Image to Base64
-    img_src = ""
-    if has_image:
-        img_src = get_img_base64(raw_img)
-
-    # Prepare Indicator
-    indicator = ""
-    if is_selected:
-        indicator = f"""
-        <div style="
-            background: #22c55e; color: white; width: 28px; height: 28px; 
-            border-radius: 50%; display: flex; align-items: center; justify-content: center;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.2);
-        ">✓</div>
-        """
-
-    html_content = ""
-    card_key = ""
-
-    if has_image and img_src:
-        # --- CANDIDATE CARD (LARGE) ---
-        html_content = f"""
-        <div style="
-            {bg_style} border-radius: 16px; padding: 16px; margin-bottom: 0px;
-            display: flex; align-items: center; gap: 16px; position: relative;
-            border: {border}; box-shadow: {shadow}; {transform} transition: all 0.2s;
-            height: 100px;
-        ">
-            <div style="
-                width: 70px; height: 70px; border-radius: 50%; 
-                background-image: url('{img_src}'); background-size: cover; background-position: center;
-                border: 2px solid white; box-shadow: 0 2px 4px rgba(0,0,0,0.1); flex-shrink: 0;
-            "></div>
-            
-            <div style="flex: 1; min-width: 0;">
-                <div style="
-                    font-weight: 700; font-size: 1rem; color: {text_color}; 
-                    line-height: 1.3;
-                    display: -webkit-box; -webkit-line-clamp: 3; -webkit-box-orient: vertical;
-                    overflow: hidden; white-space: normal;
-                ">{opt['option_text']}</div>
-            </div>
-            
-            <div style="flex-shrink: 0;">{indicator}</div>
-        </div>
-        """
-        card_key = "large"
-    else:
-        # --- SIMPLE CARD (SMALL) ---
-        html_content = f"""
-        <div style="
-            background: white; border-radius: 12px; padding: 12px 16px; margin-bottom: 0px;
-            display: flex; align-items: center; gap: 12px; position: relative;
-            border: {border}; box-shadow: {shadow}; {transform} transition: all 0.2s;
-            min-height: 48px; /* Changed to min-height */
-        ">
-            <div style="
-                flex: 1; font-weight: 500; color: #334155;
-                font-size: 1rem; line-height: 1.3;
-                word-wrap: break-word;
-            ">{opt['option_text']}</div>
-            <div style="flex-shrink: 0;">{indicator}</div>
-        </div>
-        """
-        card_key = "small"
-
-    # CRITICAL: Minify HTML to prevent Markdown code block interpretation
-    return html_content.replace('\n', ' ').replace('    ', ' ').strip(), card_key
+    # 3. Submit (fraud screen may reject bursts from one device)
+    with section("db", "submit_response"):
+        accepted = submit_response(
+            campaign_id, 
+            st.session_state.demo_data, 
+            st.session_state.responses, 
+            ip_address=ip_addr, 
+            user_agent=user_agent,
+            location_data=location_info(ip_data),
+            device_token=get_device_token()
+        )
+    
+    if not accepted:
+        return MESSAGES["device_rejected"]
+    st.session_state.responses = {} # Reset
+    st.session_state.finished = True
+    st.session_state.ballot_reset = st.session_state.get('ballot_reset', 0) + 1
+    return None
 
 def render_voter_app(campaign_id):
-    load_css()
+    with section("widget", "load_css"):
+        load_css()
     
     # State management
     if 'responses' not in st.session_state: st.session_state.responses = {}
     if 'current_step' not in st.session_state: st.session_state.current_step = 0
     
-    campaign = get_campaign(campaign_id)
+    with section("db", "get_campaign"):
+        campaign = get_campaign(campaign_id)
     if not campaign or not campaign['is_active']:
-        st.error("⚠️ ไม่พบแบบสอบถาม หรือ ปิดรับความคิดเห็นแล้ว")
+        st.error(MESSAGES["closed"])
         return
+    emit_device_cookie()
 
     # Header
     st.markdown(f"""
@@ -133,164 +173,46 @@ def render_voter_app(campaign_id):
     </div>
     """, unsafe_allow_html=True)
     
-    # --- DEMOGRAPHIC SECTION (Styled as Cards) ---
-    with st.container():
-        st.markdown("#### 📝 ข้อมูลทั่วไปก่อนเริ่มโหวต")
-        
-        # Helper for Demo Cards (Standardized Style)
-        def render_demo_cards(label, key, options):
-            st.markdown(f"#### {label}")
-            current_val = st.session_state.demo_data.get(key)
-            
-            for i, opt_text in enumerate(options):
-                is_selected = (current_val == opt_text)
-                
-                # EXACT SAME STYLE AS VOTING CARDS
-                border = "3px solid #22c55e" if is_selected else "1px solid #e2e8f0"
-                shadow = "0 10px 15px -3px rgba(0,0,0,0.1)" if is_selected else "0 1px 3px 0 rgba(0,0,0,0.1)"
-                transform = "transform: scale(1.02);" if is_selected else ""
-                
-                indicator = ""
-                if is_selected:
-                    indicator = f"""
-                    <div style="background: #22c55e; color: white; width: 24px; height: 24px; 
-                        border-radius: 50%; display: flex; align-items: center; justify-content: center;
-                        box-shadow: 0 2px 4px rgba(0,0,0,0.2); font-size: 14px;">✓</div>
-                    """
-                
-                # Render Card (Small Style)
-                st.markdown(f"""
-                <div style="
-                    background: white; border-radius: 12px; padding: 12px 16px; margin-bottom: 0px;
-                    display: flex; align-items: center; gap: 12px; position: relative;
-                    border: {border}; box-shadow: {shadow}; {transform} transition: all 0.2s;
-                    min-height: 48px;
-                ">
-                    <div style="flex: 1; font-weight: 500; color: #334155; font-size: 1rem;">{opt_text}</div>
-                    <div style="flex-shrink: 0;">{indicator}</div>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                # Marker for Overlay
-                st.markdown('<div class="btn-marker-mini"></div>', unsafe_allow_html=True)
-                
-                # Invisible Button
-                if st.button(f"S_{key}_{i}", key=f"demo_{key}_{i}", use_container_width=True):
-                    st.session_state.demo_data[key] = opt_text
-                    st.rerun()
-
-        if 'demo_data' not in st.session_state:
-            st.session_state.demo_data = {"อำเภอ": None, "พื้นที่": None, "Gen": None}
-
-        render_demo_cards("1. อำเภอหลักที่ท่านมีสิทธิเลือกตั้ง", "อำเภอ", ["ตะกั่วป่า", "ท้ายเหมือง", "คุระบุรี", "กะปง"])
-        render_demo_cards("2. พื้นที่อยู่อาศัย", "พื้นที่", ["ในเขตเทศบาล", "นอกเขตเทศบาล"])
-        render_demo_cards("3. ช่วงอายุ (Generation)", "Gen", ["Gen Z (18-25)", "Gen Y (26-45)", "Gen X (46-60)", "Baby Boomer (60+)"])
+    if 'demo_data' not in st.session_state:
+        st.session_state.demo_data = {key: None for _, key, _ in DEMO_SECTIONS}
+    
+    st.markdown("#### 📝 ข้อมูลทั่วไปก่อนเริ่มโหวต")
+    
+    with section("db", "get_questions"):
+        questions = get_questions(campaign_id)
+    with section("html", "ballot_cache"):
+        sections, cards = ballot_layout(campaign, questions)
     
-    st.markdown("---")
+    voter_mode = st.query_params.get("mode") or load_config()['voter_mode']
+    if voter_mode not in VOTER_MODES: voter_mode = "tap"
     
-    questions = get_questions(campaign_id)
+    # Client mode: the component's submit event (applied by the callback) is stored here
+    feedback = None
+    if st.session_state.pop('pending_submit', False):
+        feedback = submit_ballot(campaign_id, questions)
     
-    # Process Questions
-    # REMOVED FORM - Interactive Mode
+    # --- BALLOT (demographic cards + questions in one component) ---
+    selected = {}
+    for _, key, options in DEMO_SECTIONS:
+        if st.session_state.demo_data.get(key) in options:
+            selected[demo_section_key(key)] = [demo_card_id(key, options.index(st.session_state.demo_data[key]))]
     for q in questions:
-        st.markdown(f"#### {q['question_text']}")
-        if q['question_type'] == 'multi':
-            st.caption(f"(เลือกได้สูงสุด {q['max_selections']} ข้อ)")
-        
-        selected_opts = st.session_state.responses.get(q['id'], [])
-        if not isinstance(selected_opts, list): selected_opts = [selected_opts]
-
-        for opt in q['options']:
-            is_selected = opt['id'] in selected_opts
-            
-            # HTML Card
-            html, card_type = render_card_html(opt, is_selected, q['question_type'])
-            st.markdown(html, unsafe_allow_html=True)
-            
-            # Invisible Button Overlay - MARKER METHOD
-            # 1. Place a marker div that CSS can target as "Next Sibling is my Button"
-            marker_class = "btn-marker-large" if card_type == "large" else "btn-marker-small"
-            st.markdown(f'<div class="{marker_class}"></div>', unsafe_allow_html=True)
-            
-            # 2. The Button (Will be moved UP by CSS to cover the card above)
-            if st.button("Select", key=f"btn_{opt['id']}", use_container_width=True):
-                # Toggle Logic
-                if q['question_type'] == 'single':
-                        st.session_state.responses[q['id']] = [opt['id']]
-                else:
-                        if opt['id'] in selected_opts:
-                            selected_opts.remove(opt['id'])
-                        else:
-                            if len(selected_opts) < q['max_selections']:
-                                selected_opts.append(opt['id'])
-                        st.session_state.responses[q['id']] = selected_opts
-                st.rerun()
-            
-        st.markdown("---")
+        chosen = st.session_state.responses.get(q['id'], [])
+        if not isinstance(chosen, list): chosen = [chosen]
+        selected[question_section_key(q['id'])] = [str(opt_id) for opt_id in chosen]
     
-    # Submit Button (Standard button now)
-    if st.button("ส่งคำตอบ", type="primary", use_container_width=True):
-        # Validate Demographics
-        demo_complete = all(v is not None for v in st.session_state.demo_data.values())
-        
-        # Validate Questions
-        questions_complete = len(st.session_state.responses) >= len(questions)
-
-        if not demo_complete:
-            st.error("กรุณากรอกข้อมูลทั่วไป (อำเภอ/พื้นที่/ช่วงอายุ) ให้ครบถ้วน")
-        elif not questions_complete:
-            st.error("กรุณาตอบคำถามให้ครบทุกข้อ")
-        else:
-            # --- BACKGROUND DATA COLLECTION ---
-            import requests
-            
-            # 1. Get IP and Location Data (from Public API)
-            ip_data = {}
-            try:
-                res = requests.get('http://ip-api.com/json/', timeout=5)
-                if res.status_code == 200:
-                    ip_data = res.json()
-            except:
-                pass
-            
-            ip_addr = ip_data.get('query', 'Unknown')
-            location_info = {
-                "city": ip_data.get('city'),
-                "region": ip_data.get('regionName'),
-                "country": ip_data.get('country'),
-                "isp": ip_data.get('isp'),
-                "lat": ip_data.get('lat'),
-                "lon": ip_data.get('lon')
-            }
-
-            # 2. Get Browser Info (User Agent)
-            # Try to get from st.context.headers (Streamlit 1.37+) or fallback
-            user_agent = "Unknown"
-            try:
-                # Newer Streamlit
-                user_agent = st.context.headers.get("User-Agent", "Unknown")
-            except:
-                try:
-                    # Alternative for some versions
-                    from streamlit.web.server.websocket_headers import _get_websocket_headers
-                    headers = _get_websocket_headers()
-                    user_agent = headers.get("User-Agent", "Unknown")
-                except:
-                    pass
-
-            # 3. Submit
-            submit_response(
-                campaign_id, 
-                st.session_state.demo_data, 
-                st.session_state.responses, 
-                ip_address=ip_addr, 
-                user_agent=user_agent,
-                location_data=location_info
-            )
-            
-            st.session_state.responses = {} # Reset
-            st.session_state.finished = True
+    with section("widget", "ballot"):
+        ballot(sections, cards, selected, version=f"{campaign_id}:{campaign.get('ballot_version') or 0}",
+               mode=voter_mode, reset_token=st.session_state.get('ballot_reset', 0),
+               on_change=functools.partial(apply_ballot_event, questions))
+    
+    # Submit Button (Standard button now; client mode submits from inside the component)
+    if voter_mode == "tap" and st.button(MESSAGES["submit"], type="primary", use_container_width=True):
+        feedback = submit_ballot(campaign_id, questions)
+        if feedback is None:
             st.rerun()
+    if feedback:
+        st.error(feedback)
 
     if st.session_state.get('finished'):
         render_finished()
@@ -0,0 +1,385 @@
+"""
+Standalone voter service: the ballot as plain HTTP, without Streamlit.
+
+    python voter_service.py --port 8502
+    gunicorn -w 4 --threads 16 -b 0.0.0.0:8502 voter_service:application
+
+Streamlit keeps a websocket and a script thread per voter. Here a voter
+costs one GET (a cached page) and one POST (the submit), so the Streamlit
+app can stay the admin console while phones hit this service. Both read
+and write the same SQLite DB through core.database.
+
+Routes:
+    GET  /?poll=<id>, /poll/<id>   ballot page (client mode of ballot.js)
+    POST /poll/<id>/submit         {"selected": {<section key>: [<card id>]},
+                                    "device": <token, used without a cookie>,
+                                    "key": <idempotency key, optional>}
+                                   -> {"ok": true} or {"ok": false, "error": ...}
+                                   ("status": "invalid" when resending cannot help)
+    GET  /collect/<id>             offline-first page for enumerators: every
+                                   ballot is queued on the phone and synced
+    POST /ingest/<id>              batch sync, see ingest()
+    GET  /static/<asset>           ballot.js/css (shared with the Streamlit
+                                   component) and standalone.js
+    GET  /healthz                  same report as the metrics exporter
+
+POST routes accept gzip bodies (Content-Encoding: gzip) and answer CORS,
+so static exports on another origin can use them.
+
+Point Settings > Base URL at this service and the QR links work as-is.
+"""
+
+import argparse
+import gzip
+import html
+import io
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from http.cookies import SimpleCookie
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core import ballot, ballot_defs, database, geoip, metrics, metrics_server
+from core.ballot import MESSAGES, location_info, parse_collected_at, parse_selection, valid_key, validate
+from core.ratelimit import limiter
+from views.ballot_cache import ballot_layout
+from views.ballot_page import ASSETS, render_page
+
+DEVICE_COOKIE = "superpoll_device"
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "views", "components", "ballot")
+CONTENT_TYPES = {".js": "application/javascript; charset=utf-8", ".css": "text/css; charset=utf-8"}
+MAX_BODY = 64 * 1024
+# Batch sync: items per request, and body size after gzip decoding
+MAX_BATCH_ITEMS = 200
+MAX_BATCH_BODY = 4 * 1024 * 1024
+
+_lock = threading.Lock()
+_pages = {}      # (campaign_id, collect) -> (ballot_version, etag, page bytes)
+_static = {}     # file name -> bytes
+
+
+def ballot_page(campaign, collect=False):
+    """(etag, page bytes) for the campaign's current ballot_version"""
+    campaign_id = campaign['id']
+    version = campaign.get('ballot_version') or 0
+    with _lock:
+        cached = _pages.get((campaign_id, collect))
+    if cached and cached[0] == version:
+        metrics.inc("superpoll_cache_requests_total", cache="voter_page", result="hit")
+        return cached[1:]
+
+    metrics.inc("superpoll_cache_requests_total", cache="voter_page", result="miss")
+    sections, cards = ballot_layout(campaign, ballot_defs.get_questions(campaign))
+    if collect:
+        page = render_page(campaign, sections, cards, submit_url=f"/poll/{campaign_id}/submit",
+                           batch_url=f"/ingest/{campaign_id}")
+    else:
+        page = render_page(campaign, sections, cards, submit_url=f"/poll/{campaign_id}/submit")
+    etag = f'"{campaign_id}-{version}{"-collect" if collect else ""}"'
+    with _lock:
+        _pages[(campaign_id, collect)] = (version, etag, page)
+    return etag, page
+
+
+def static_file(name):
+    data = _static.get(name)
+    if data is None:
+        with open(os.path.join(STATIC_DIR, name), 'rb') as f:
+            data = f.read()
+        _static[name] = data
+    return data
+
+
+def client_ip(environ):
+    """As on the Streamlit voter page (core.ballot.client_ip)"""
+    return ballot.client_ip(environ.get('HTTP_X_FORWARDED_FOR'), environ.get('REMOTE_ADDR'))
+
+
+def device_token(environ, body_token=None):
+    """
+    (token, is_new) from the superpoll_device cookie, else the token the
+    page sent in the body (static exports post cross-origin, without cookies)
+    """
+    cookie = SimpleCookie()
+    try:
+        cookie.load(environ.get('HTTP_COOKIE', ''))
+    except Exception:
+        pass
+    if DEVICE_COOKIE in cookie and cookie[DEVICE_COOKIE].value:
+        return cookie[DEVICE_COOKIE].value, False
+    if isinstance(body_token, str) and DEVICE_TOKEN.match(body_token):
+        return body_token, False
+    return uuid.uuid4().hex, True
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+def read_json(environ, limit):
+    """Request body as a JSON object, gunzipped if Content-Encoding says so"""
+    size = int(environ.get('CONTENT_LENGTH') or 0)
+    if size > limit:
+        raise BodyTooLarge()
+    raw = environ['wsgi.input'].read(size)
+    if environ.get('HTTP_CONTENT_ENCODING', '').lower() == 'gzip':
+        try:
+            with gzip.GzipFile(fileobj=io.BytesIO(raw)) as f:
+                raw = f.read(limit + 1)
+        except (OSError, EOFError) as e:
+            raise ValueError(str(e))
+        if len(raw) > limit:
+            raise BodyTooLarge()
+    body = json.loads(raw or b'{}')
+    if not isinstance(body, dict):
+        raise ValueError("expected a JSON object")
+    return body
+
+
+def submit(campaign, environ):
+    """(status, result dict, device token if a cookie must be set)"""
+    try:
+        body = read_json(environ, MAX_BODY)
+        selected = body.get('selected') or {}
+        if not isinstance(selected, dict):
+            raise ValueError
+    except BodyTooLarge:
+        return 413, {"ok": False, "status": "invalid", "error": "request too large"}, None
+    except ValueError:
+        return 400, {"ok": False, "status": "invalid", "error": "invalid request"}, None
+
+    questions = ballot_defs.get_questions(campaign)
+    demo_data, answers = parse_selection(questions, selected)
+    error = validate(questions, demo_data, answers)
+    if error:
+        return 400, {"ok": False, "status": "invalid", "error": error}, None
+
+    ip = client_ip(environ)
+    if not limiter.allow(campaign['id'], ip):
+        # Rejected before any GeoIP call or DB write
+        return 429, {"ok": False, "error": MESSAGES["rate_limited"]}, None
+
+    ip_data = geoip.lookup(ip)
+    token, is_new = device_token(environ, body.get('device'))
+    accepted = database.submit_response(
+        campaign['id'],
+        demo_data,
+        answers,
+        ip_address=ip or ip_data.get('query', 'Unknown'),
+        user_agent=environ.get('HTTP_USER_AGENT', 'Unknown'),
+        location_data=location_info(ip_data),
+        device_token=token,
+        idempotency_key=body.get('key') if valid_key(body.get('key')) else None
+    )
+    if not accepted:
+        return 429, {"ok": False, "error": MESSAGES["device_rejected"]}, None
+    return 200, {"ok": True}, token if is_new else None
+
+
+def ingest(campaign, environ):
+    """
+    Batch sync of ballots collected offline.
+
+    Request:  {"device": <token>, "items": [{"key": <idempotency key>,
+               "selected": {...}, "collected_at": <epoch ms>}, ...]}
+    Response: {"ok": true, "results": [{"key", "status", "error"?}, ...]}
+
+    status is 'accepted' or 'duplicate' (stored, drop it from the queue),
+    'invalid' (will never be accepted, drop it) or 'retry' (rate limited,
+    over database.BATCH_DEVICE_LIMIT or the campaign is archived, keep it). New ballots of a batch are
+    stored in one transaction, so a dropped connection leaves all or none
+    of them; resending is safe because stored keys come back as 'duplicate'.
+    """
+    try:
+        body = read_json(environ, MAX_BATCH_BODY)
+        items = body.get('items')
+        if not isinstance(items, list) or len(items) > MAX_BATCH_ITEMS:
+            raise ValueError
+    except BodyTooLarge:
+        return 413, {"ok": False, "error": "request too large"}
+    except ValueError:
+        return 400, {"ok": False, "error": "invalid request"}
+
+    questions = ballot_defs.get_questions(campaign)
+    ip = client_ip(environ)
+    now = time.time()
+    # Resent ballots are acknowledged without spending rate-limit tokens
+    stored = database.get_stored_keys(campaign['id'], {i.get('key') for i in items
+                                                       if isinstance(i, dict) and valid_key(i.get('key'))})
+    results, batch = [], []
+    limited = False
+    for item in items:
+        key = item.get('key') if isinstance(item, dict) else None
+        selected = item.get('selected') if isinstance(item, dict) else None
+        if not valid_key(key) or not isinstance(selected, dict):
+            results.append({"key": key, "status": "invalid", "error": "invalid item"})
+            continue
+        if key in stored:
+            results.append({"key": key, "status": "duplicate"})
+            continue
+        demo_data, answers = parse_selection(questions, selected)
+        error = validate(questions, demo_data, answers)
+        if error:
+            results.append({"key": key, "status": "invalid", "error": error})
+            continue
+        # Every ballot spends a rate-limit token; the rest of the batch waits for the next sync
+        if limited or not limiter.allow(campaign['id'], ip):
+            limited = True
+            results.append({"key": key, "status": "retry", "error": MESSAGES["rate_limited"]})
+            continue
+        batch.append({"key": key, "demographic_data": demo_data, "answers": answers,
+                      "collected_at": parse_collected_at(item.get('collected_at'), now)})
+        results.append({"key": key, "status": None})
+
+    if batch:
+        ip_data = geoip.lookup(ip)
+        token, _ = device_token(environ, body.get('device'))
+        outcome = database.submit_batch(
+            campaign['id'],
+            batch,
+            ip_address=ip or ip_data.get('query', 'Unknown'),
+            user_agent=environ.get('HTTP_USER_AGENT', 'Unknown'),
+            location_data=location_info(ip_data),
+            device_token=token
+        )
+        for result in results:
+            if result["status"] is None:
+                result["status"] = outcome[result["key"]]
+                # The fraud screen refused it: it will never be accepted, the phone can drop it
+                if result["status"] == "rejected":
+                    result.update(status="invalid", error=MESSAGES["device_rejected"])
+                elif result["status"] == "retry":
+                    result["error"] = MESSAGES["rate_limited"]
+                # Archived: kept on the phone, a restored campaign takes it later
+                elif result["status"] == "closed":
+                    result.update(status="retry", error=MESSAGES["closed"])
+    for result in results:
+        metrics.inc("superpoll_ingest_items_total", campaign=campaign['id'], result=result["status"])
+    return 200, {"ok": True, "results": results}
+
+
+STATUS = {200: "200 OK", 204: "204 No Content", 304: "304 Not Modified", 400: "400 Bad Request", 404: "404 Not Found",
+          405: "405 Method Not Allowed", 413: "413 Payload Too Large", 429: "429 Too Many Requests",
+          503: "503 Service Unavailable"}
+ROUTES = [(re.compile(r"^/poll/(\d+)/?$"), 'poll'),
+          (re.compile(r"^/poll/(\d+)/submit/?$"), 'submit'),
+          (re.compile(r"^/collect/(\d+)/?$"), 'collect'),
+          (re.compile(r"^/ingest/(\d+)/?$"), 'ingest')]
+DEVICE_TOKEN = re.compile(r"^[0-9a-f]{32}$")
+# Static exports (views/static_export.py) are served from another origin
+CORS_HEADERS = [("Access-Control-Allow-Origin", "*"),
+                ("Access-Control-Allow-Methods", "POST, OPTIONS"),
+                ("Access-Control-Allow-Headers", "Content-Type, Content-Encoding"),
+                ("Access-Control-Max-Age", "86400")]
+
+
+def application(environ, start_response):
+    method = environ['REQUEST_METHOD']
+    path = environ.get('PATH_INFO') or '/'
+
+    def respond(status, body, content_type, headers=()):
+        start_response(STATUS[status], [("Content-Type", content_type), ("Content-Length", str(len(body)))]
+                       + list(headers))
+        return [body]
+
+    def respond_json(status, data, headers=()):
+        return respond(status, json.dumps(data, ensure_ascii=False).encode('utf-8'),
+                       "application/json; charset=utf-8", headers)
+
+    if path == '/healthz':
+        ok, report = metrics_server.health()
+        return respond_json(200 if ok else 503, report)
+
+    if path.startswith('/static/'):
+        name = path[len('/static/'):]
+        if name not in ASSETS:
+            return respond(404, b"not found\n", "text/plain")
+        return respond(200, static_file(name), CONTENT_TYPES[os.path.splitext(name)[1]],
+                       [("Cache-Control", "public, max-age=300")])
+
+    kind, campaign_id = None, None
+    for pattern, name in ROUTES:
+        match = pattern.match(path)
+        if match:
+            kind, campaign_id = name, int(match.group(1))
+            break
+    if kind is None:
+        poll = parse_qs(environ.get('QUERY_STRING', '')).get('poll', [''])[0]
+        if path != '/' or not poll.isdigit():
+            return respond(404, b"not found\n", "text/plain")
+        kind, campaign_id = 'poll', int(poll)
+    is_post = kind in ('submit', 'ingest')
+
+    if is_post and method == 'OPTIONS':
+        start_response(STATUS[204], CORS_HEADERS)
+        return [b""]
+
+    campaign = ballot_defs.get_campaign(campaign_id)
+    if not campaign or not campaign['is_active']:
+        if is_post:
+            return respond_json(404, {"ok": False, "error": MESSAGES["closed"]}, CORS_HEADERS)
+        return respond(404, html.escape(MESSAGES["closed"]).encode('utf-8'), "text/html; charset=utf-8")
+
+    if is_post:
+        if method != 'POST':
+            return respond(405, b"method not allowed\n", "text/plain", [("Allow", "POST")])
+        headers = list(CORS_HEADERS)
+        if kind == 'ingest':
+            status, result = ingest(campaign, environ)
+            return respond_json(status, result, headers)
+        status, result, new_token = submit(campaign, environ)
+        if new_token:
+            # Same cookie the Streamlit page sets, so both front ends share the fraud screen
+            headers.append(("Set-Cookie", f"{DEVICE_COOKIE}={new_token}; Max-Age=31536000; Path=/; SameSite=Lax"))
+        return respond_json(status, result, headers)
+
+    if method not in ('GET', 'HEAD'):
+        return respond(405, b"method not allowed\n", "text/plain", [("Allow", "GET")])
+    etag, page = ballot_page(campaign, collect=(kind == 'collect'))
+    headers = [("ETag", etag), ("Cache-Control", "no-cache")]
+    if environ.get('HTTP_IF_NONE_MATCH') == etag:
+        start_response(STATUS[304], headers)
+        return [b""]
+    return respond(200, page, "text/html; charset=utf-8", headers)
+
+
+def clear():
+    with _lock:
+        _pages.clear()
+    ballot_defs.clear()
+    _static.clear()
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass  # one line per voter request would drown everything else
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Standalone SuperPoll voter service")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8502)
+    args = parser.parse_args()
+
+    database.init_db()
+    metrics_server.ensure_started()
+    server = make_server(args.host, args.port, application,
+                         server_class=ThreadingWSGIServer, handler_class=QuietHandler)
+    print(f"Voter service on http://{args.host}:{args.port}/poll/<id>")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()